@@ -0,0 +1,163 @@
+from benchmark_tools import *
+import os
+import signal
+import sys
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Interest-based routing of the channel lines between servers (see MainWorker.rpc_input__channel_string()). Each server
+has one sender and one receiver per channel present on it. Local channels have subscribers on one server only,
+global channels - on all servers; locality is the share of the local channels. Each sender writes lines into all
+channels of its server. Shows the number of line copies sent between servers per chat line (each non-channel line is
+sent to all other servers) and that every subscriber got all lines of its channel.
+Usage: "benchmark__channel_routing.py [number_of_servers] [number_of_channels] [number_of_lines_per_channel]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+LOCALITIES = (0, 0.5, 0.75, 1)
+RECEIVE_TIMEOUT = 10
+
+
+def run_server(server, channel_strings_to_servers, index):
+    def on_terminate(signal_number, frame):
+        channel_strings_to_servers[index] = server.global_data.number_of_channel_strings_to_servers
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, on_terminate)
+    with contextlib.redirect_stdout(std_io.StringIO()):
+        server.run()
+
+
+def receiver(server_address, channel, number_of_lines, ready_barrier, results, index):
+    conn = connect_as_a_client(server_address)
+    conn.sendall(pack_rpc({FieldName.name: RPCName.join_channel, FieldName.channel: channel}))
+    conn.settimeout(RECEIVE_TIMEOUT)
+    ready_barrier.wait()
+    number_of_received_lines = 0
+    try:
+        for message in read_rpc_messages(conn):
+            if RPCName.print_channel_string == message[FieldName.name]:
+                number_of_received_lines += 1
+                if number_of_received_lines >= number_of_lines:
+                    break
+    except socket.timeout:
+        pass
+    results[index] = number_of_received_lines
+    conn.close()
+
+
+def sender(server_address, channels, number_of_lines_per_channel, ready_barrier):
+    conn = connect_as_a_client(server_address)
+    data = b''.join(pack_rpc({FieldName.name: RPCName.channel_string, FieldName.channel: channel,
+                              FieldName.string: 'x' * 64})
+                    for channel in channels) * number_of_lines_per_channel
+    ready_barrier.wait()
+    # Channels should be gossiped to the other servers before the first line
+    time.sleep(0.5)
+    conn.sendall(data)
+    conn.settimeout(RECEIVE_TIMEOUT)
+    try:
+        while conn.recv(65536):
+            pass
+    except socket.timeout:
+        pass
+    conn.close()
+
+
+def get_channels_per_server(number_of_servers, number_of_channels, locality)->list:
+    '''
+    :return: list of channel lists: one per server
+    '''
+    number_of_local_channels = round(number_of_channels * locality)
+    channels_per_server = [list() for index in range(number_of_servers)]
+    for channel_index in range(number_of_channels):
+        channel = 'channel_{}'.format(channel_index)
+        if channel_index < number_of_local_channels:
+            channels_per_server[channel_index % number_of_servers].append(channel)
+        else:
+            for channels in channels_per_server:
+                channels.append(channel)
+    return channels_per_server
+
+
+def run_benchmark(server_list, number_of_channels, locality, number_of_lines_per_channel):
+    '''
+    :return: tuple of (number of sent lines, number of line copies sent between servers, share of delivered lines)
+    '''
+    context = multiprocessing.get_context('fork')
+    channel_strings_to_servers = context.Array('i', len(server_list), lock=False)
+    # Receivers should get every chat line: output queues are unbounded
+    servers = [context.Process(target=run_server, args=(Server(address, server_list, output_high_watermark=None),
+                                                        channel_strings_to_servers, index))
+               for index, address in enumerate(server_list)]
+    for server in servers:
+        server.start()
+    for address in server_list:
+        connect_as_a_client(address).close()
+    time.sleep(0.5)
+
+    channels_per_server = get_channels_per_server(len(server_list), number_of_channels, locality)
+    senders_per_channel = dict()
+    for channels in channels_per_server:
+        for channel in channels:
+            senders_per_channel[channel] = senders_per_channel.get(channel, 0) + 1
+    receivers = list()
+    for address, channels in zip(server_list, channels_per_server):
+        for channel in channels:
+            receivers.append((address, channel, senders_per_channel[channel] * number_of_lines_per_channel))
+    number_of_sent_lines = sum(len(channels) for channels in channels_per_server) * number_of_lines_per_channel
+
+    ready_barrier = context.Barrier(len(receivers) + len(server_list) + 1)
+    results = context.Array('i', len(receivers), lock=False)
+    processes = [context.Process(target=receiver, args=(address, channel, number_of_lines, ready_barrier, results,
+                                                        index))
+                 for index, (address, channel, number_of_lines) in enumerate(receivers)]
+    sender_processes = [context.Process(target=sender, args=(address, channels, number_of_lines_per_channel,
+                                                             ready_barrier))
+                        for address, channels in zip(server_list, channels_per_server)]
+    for process in processes + sender_processes:
+        process.start()
+    ready_barrier.wait()
+    for process in processes:
+        process.join()
+    for process in sender_processes + servers:
+        process.terminate()
+        process.join()
+
+    delivered = sum(results) / sum(number_of_lines for address, channel, number_of_lines in receivers)
+    return number_of_sent_lines, sum(channel_strings_to_servers), delivered
+
+
+def main():
+    number_of_servers = 4
+    if len(sys.argv) > 1:
+        number_of_servers = int(sys.argv[1])
+    number_of_channels = 8
+    if len(sys.argv) > 2:
+        number_of_channels = int(sys.argv[2])
+    number_of_lines_per_channel = 500
+    if len(sys.argv) > 3:
+        number_of_lines_per_channel = int(sys.argv[3])
+
+    print('SERVERS: {}; CHANNELS: {}; LINES PER CHANNEL PER SENDER: {}'.format(
+        number_of_servers, number_of_channels, number_of_lines_per_channel))
+    rows = list()
+    port = 9930
+    for locality in LOCALITIES:
+        server_list = [('localhost', port + index) for index in range(number_of_servers)]
+        port += number_of_servers
+        number_of_sent_lines, number_of_copies, delivered = run_benchmark(server_list, number_of_channels, locality,
+                                                                          number_of_lines_per_channel)
+        rows.append(('{:.0%}'.format(locality), number_of_sent_lines, number_of_copies,
+                     '{:.2f}'.format(number_of_copies / number_of_sent_lines), number_of_servers - 1,
+                     '{:.1%}'.format(delivered)))
+    print_table(('local channels', 'sent lines', 'copies to servers', 'copies per line',
+                 'copies per line without channels', 'delivered'), rows)
+
+if __name__ == '__main__':
+    main()
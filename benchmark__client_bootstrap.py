@@ -0,0 +1,161 @@
+from benchmark_tools import *
+from load_balancing import *
+import random
+import sys
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Join of the new clients to the unbalanced cluster: first server already has many clients, others have none. Compares
+the old join (get the numbers of clients of all servers from the random server, then reconnect to the chosen one) with
+the bootstrap (see MainWorker.rpc_input__client_bootstrap() on the server side): the random server accepts the client
+or redirects it, and with the bootstrap from the cached numbers of clients (see
+client.load_cached_clients_per_server()).
+Shows connections, round trips and received bytes per join, join time and the numbers of clients after the joins.
+Usage: "benchmark__client_bootstrap.py [number_of_joins] [number_of_servers]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+NUMBER_OF_PRELOADED_CLIENTS = 200  # clients of the first server
+SETTLE_TIME = 0.5
+
+
+def get_size(message: dict)->int:
+    return len(pack_rpc(message))
+
+
+def join__old(server_list, clients_per_server, random_generator)->tuple:
+    '''
+    :return: tuple of (connected socket, connections made, round trips, received bytes)
+    '''
+    address = random_generator.choice(server_list)
+    conn = connect_to_the_server(address)
+    conn.sendall(pack_rpc({FieldName.name: RPCName.give_me_clients_per_server}))
+    message = wait_for_rpc(conn, RPCName.clients_per_server)
+    received = get_size(message)
+    connections = 1
+    best_address = choose_server(message[FieldName.clients_per_server], address, random_generator=random_generator)
+    if best_address != address:
+        conn.close()
+        conn = connect_to_the_server(best_address)
+        connections += 1
+    conn.sendall(pack_rpc({FieldName.name: RPCName.client_arrived}))
+    return conn, connections, 1, received
+
+
+def join__bootstrap(address, random_generator)->tuple:
+    '''
+    :return: tuple of (connected socket, connections made, round trips, received bytes)
+    '''
+    connections = 0
+    received = 0
+    number_of_redirects = 0
+    while True:
+        conn = connect_to_the_server(address)
+        connections += 1
+        conn.sendall(pack_rpc({FieldName.name: RPCName.client_bootstrap,
+                               FieldName.number_of_redirects: number_of_redirects}))
+        for message in read_rpc_messages(conn):
+            if message[FieldName.name] in {RPCName.client_accepted, RPCName.best_server}:
+                break
+        received += get_size(message)
+        if RPCName.client_accepted == message[FieldName.name]:
+            return conn, connections, connections, received
+        conn.close()
+        address = message[FieldName.address]
+        number_of_redirects += 1
+
+
+def join__bootstrap_random(server_list, clients_per_server, random_generator)->tuple:
+    return join__bootstrap(random_generator.choice(server_list), random_generator)
+
+
+def join__bootstrap_cached(server_list, clients_per_server, random_generator)->tuple:
+    return join__bootstrap(choose_server(clients_per_server, random_generator=random_generator), random_generator)
+
+
+JOINS = (
+    # (name, join function(server_list, cached clients_per_server, random_generator))
+    ('numbers of clients + reconnect', join__old),
+    ('bootstrap', join__bootstrap_random),
+    ('bootstrap from cache', join__bootstrap_cached),
+)
+
+
+def get_clients_per_server(server_address)->dict:
+    conn = connect_to_the_server(server_address)
+    conn.sendall(pack_rpc({FieldName.name: RPCName.give_me_clients_per_server}))
+    clients_per_server = wait_for_rpc(conn, RPCName.clients_per_server)[FieldName.clients_per_server]
+    conn.close()
+    return clients_per_server
+
+
+def run_server(server):
+    with contextlib.redirect_stdout(std_io.StringIO()):
+        server.run()
+
+
+def run_benchmark(server_list, join, number_of_joins)->list:
+    context = multiprocessing.get_context('fork')
+    servers = [context.Process(target=run_server, args=(Server(address, server_list),)) for address in server_list]
+    for server in servers:
+        server.start()
+    for address in server_list:
+        connect_to_the_server(address).close()
+    time.sleep(SETTLE_TIME)
+    preloaded = [connect_as_a_client(server_list[0]) for index in range(NUMBER_OF_PRELOADED_CLIENTS)]
+    time.sleep(SETTLE_TIME)
+
+    # Cached numbers of clients were saved before the joins and are not refreshed
+    cached_clients_per_server = get_clients_per_server(server_list[-1])
+    random_generator = random.Random(42)
+    joined = list()
+    connections = round_trips = received = 0
+    start_time = time.perf_counter()
+    for index in range(number_of_joins):
+        conn, join_connections, join_round_trips, join_received = join(server_list, cached_clients_per_server,
+                                                                       random_generator)
+        joined.append(conn)
+        connections += join_connections
+        round_trips += join_round_trips
+        received += join_received
+    join_time = time.perf_counter() - start_time
+    time.sleep(SETTLE_TIME)
+    clients_per_server = get_clients_per_server(server_list[-1])
+
+    for server in servers:
+        server.terminate()
+        server.join()
+    for conn in preloaded + joined:
+        conn.close()
+    return ['{:.2f}'.format(connections / number_of_joins), '{:.2f}'.format(round_trips / number_of_joins),
+            '{:.0f}'.format(received / number_of_joins), '{:.0f}'.format(join_time * 1e6 / number_of_joins),
+            ' / '.join(str(clients_per_server.get(address)) for address in server_list)]
+
+
+def main():
+    number_of_joins = 200
+    if len(sys.argv) > 1:
+        number_of_joins = int(sys.argv[1])
+    number_of_servers = 3
+    if len(sys.argv) > 2:
+        number_of_servers = int(sys.argv[2])
+
+    print('JOINS: {}; SERVERS: {}; CLIENTS OF THE FIRST SERVER: {}; BOOTSTRAP LOAD TOLERANCE: {:.0%} + {}'.format(
+        number_of_joins, number_of_servers, NUMBER_OF_PRELOADED_CLIENTS, DEFAULT_BOOTSTRAP_LOAD_TOLERANCE,
+        BOOTSTRAP_LOAD_SLACK))
+    rows = list()
+    port = 10370
+    for name, join in JOINS:
+        server_list = [('localhost', port + index) for index in range(number_of_servers)]
+        port += number_of_servers
+        rows.append([name] + run_benchmark(server_list, join, number_of_joins))
+    print_table(('join', 'connections per join', 'round trips per join', 'received bytes per join',
+                 'us per join', 'clients per server after joins'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+from benchmark_tools import *
+import os
+import signal
+import sys
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Coalescing of the number of clients updates (see Server.client_count_gossip_interval) during the simulated mass
+reconnect: clients connect to the first server, then all of them disconnect at once and reconnect to the second one
+(as after the fault of the first server). Shows the number of messages with the number of clients sent between
+servers, the number of updates printed to the console and the numbers of clients as the third server sees them
+after the storm.
+Usage: "benchmark__client_count_gossip.py [number_of_clients] [number_of_servers]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+SETTINGS = (
+    # (name, gossip interval)
+    ('every change', None),
+    ('coalesced', DEFAULT_CLIENT_COUNT_GOSSIP_INTERVAL),
+)
+SETTLE_TIME = 0.5
+
+
+def run_server(server, stats, index):
+    def on_terminate(signal_number, frame):
+        stats[2 * index] = server.global_data.number_of_client_count_messages
+        stats[2 * index + 1] = server.global_data.number_of_client_count_updates
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, on_terminate)
+    with contextlib.redirect_stdout(std_io.StringIO()):
+        server.run()
+
+
+def connect_clients(server_address, number_of_clients)->list:
+    connections = list()
+    for index in range(number_of_clients):
+        conn = connect_to_the_server(server_address)
+        conn.sendall(pack_rpc({FieldName.name: RPCName.client_arrived}) +
+                     pack_rpc({FieldName.name: RPCName.give_me_clients_per_server}))
+        connections.append(conn)
+    # All clients are sent at once: replies are awaited after that
+    for conn in connections:
+        wait_for_rpc(conn, RPCName.clients_per_server)
+    return connections
+
+
+def get_clients_per_server(server_address)->dict:
+    conn = connect_to_the_server(server_address)
+    conn.sendall(pack_rpc({FieldName.name: RPCName.give_me_clients_per_server}))
+    clients_per_server = wait_for_rpc(conn, RPCName.clients_per_server)[FieldName.clients_per_server]
+    conn.close()
+    return clients_per_server
+
+
+def run_benchmark(server_list, gossip_interval, number_of_clients):
+    '''
+    :return: tuple of (messages between servers, console updates, clients per server as the last server sees them)
+    '''
+    context = multiprocessing.get_context('fork')
+    stats = context.Array('i', 2 * len(server_list), lock=False)
+    servers = [context.Process(target=run_server,
+                               args=(Server(address, server_list, client_count_gossip_interval=gossip_interval),
+                                     stats, index))
+               for index, address in enumerate(server_list)]
+    for server in servers:
+        server.start()
+    for address in server_list:
+        connect_to_the_server(address).close()
+    time.sleep(SETTLE_TIME)
+    # Startup messages are not counted
+    for index in range(len(stats)):
+        stats[index] = 0
+
+    connections = connect_clients(server_list[0], number_of_clients)
+    for conn in connections:
+        conn.close()
+    connections = connect_clients(server_list[1], number_of_clients)
+    time.sleep(SETTLE_TIME)
+    clients_per_server = get_clients_per_server(server_list[-1])
+    for server in servers:
+        server.terminate()
+        server.join()
+    messages = sum(stats[0::2])
+    updates = sum(stats[1::2])
+    # Statistics are collected: clients may be disconnected
+    for conn in connections:
+        conn.close()
+    return messages, updates, clients_per_server
+
+
+def main():
+    number_of_clients = 2000
+    if len(sys.argv) > 1:
+        number_of_clients = int(sys.argv[1])
+    number_of_servers = 3
+    if len(sys.argv) > 2:
+        number_of_servers = int(sys.argv[2])
+
+    print('CLIENTS: {}; SERVERS: {}; CLIENT COUNT GOSSIP CHANGE: {:.0%}'.format(
+        number_of_clients, number_of_servers, DEFAULT_CLIENT_COUNT_GOSSIP_CHANGE))
+    rows = list()
+    port = 9970
+    for name, gossip_interval in SETTINGS:
+        server_list = [('localhost', port + index) for index in range(number_of_servers)]
+        port += number_of_servers
+        messages, updates, clients_per_server = run_benchmark(server_list, gossip_interval, number_of_clients)
+        rows.append((name, 2 * number_of_clients, messages, updates, clients_per_server.get(server_list[0]),
+                     clients_per_server.get(server_list[1])))
+    print_table(('updates', 'connects and disconnects', 'messages to servers', 'console updates',
+                 'seen clients of failed server', 'seen clients of new server'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+from benchmark_tools import *
+import sys
+import types
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Microbenchmark: selection of the chat line recipients (MainWorker.get_connections_to_own_clients()) by the index of
+the client connections versus the previous scan of all IO connections. Server has some number of clients and some
+number of other connections (server links and accepted sockets that have not sent client_arrived yet), which were
+checked on each chat line by the scan.
+Usage: "benchmark__client_fan_out.py [number_of_clients] [number_of_chat_lines]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+NUMBERS_OF_OTHER_CONNECTIONS = (0, 100, 1000, 10000)
+
+
+def get_connections_to_own_clients__by_scan(worker_obj)->list:
+    # The previous implementation
+    result = list()
+    for connection in worker_obj.api.all_connections:
+        if ConnectionState.connected != connection.connection_state:
+            continue
+        other_worker_obj = connection.worker_obj
+        if other_worker_obj.is_connection_to_the_server or other_worker_obj.is_connection_from_the_server or \
+                other_worker_obj.is_connection_to_the_sibling:
+            continue
+        if connection == worker_obj.connection:
+            continue
+        result.append(connection)
+    return result
+
+
+def make_connection(global_data, connection_id, connection_state=ConnectionState.connected)->Connection:
+    worker_obj = MainWorker(global_data)
+    connection_info = ConnectionInfo(worker_obj, ConnectionType.active_accepted, socket_family=socket.AF_INET)
+    connection = Connection(connection_id, connection_info, (None, None), connection_state)
+    worker_obj.connection = connection
+    return connection
+
+
+def make_server(number_of_clients, number_of_other_connections)->MainWorker:
+    '''
+    :return: worker of the sender (one of the clients)
+    '''
+    global_data = GlobalDataForAllWorkers()
+    api = types.SimpleNamespace(all_connections=set())
+    for index in range(number_of_clients):
+        connection = make_connection(global_data, index)
+        connection.worker_obj.unknown__client_or_server_connection = False
+        global_data.client_connections.add(connection)
+        api.all_connections.add(connection)
+    for index in range(number_of_other_connections):
+        if index % 2:
+            # Server link
+            connection = make_connection(global_data, ('server', index))
+            connection.worker_obj.is_connection_from_the_server = True
+        else:
+            # Pending: accepted, but not identified yet (or is being closed)
+            connection = make_connection(global_data, ('pending', index), ConnectionState.waiting_for_disconnection)
+        api.all_connections.add(connection)
+    for connection in api.all_connections:
+        connection.worker_obj.api = api
+    return next(iter(global_data.client_connections)).worker_obj
+
+
+def measure(function, worker_obj, number_of_chat_lines, repeat=3):
+    best_time = None
+    for index in range(repeat):
+        start_time = time.perf_counter()
+        for line_index in range(number_of_chat_lines):
+            function(worker_obj)
+        elapsed = time.perf_counter() - start_time
+        if (best_time is None) or (elapsed < best_time):
+            best_time = elapsed
+    return best_time
+
+
+def main():
+    number_of_clients = 100
+    if len(sys.argv) > 1:
+        number_of_clients = int(sys.argv[1])
+    number_of_chat_lines = 2000
+    if len(sys.argv) > 2:
+        number_of_chat_lines = int(sys.argv[2])
+
+    print('CLIENTS: {}; CHAT LINES: {}'.format(number_of_clients, number_of_chat_lines))
+    rows = list()
+    for number_of_other_connections in NUMBERS_OF_OTHER_CONNECTIONS:
+        worker_obj = make_server(number_of_clients, number_of_other_connections)
+        assert set(get_connections_to_own_clients__by_scan(worker_obj)) == \
+            set(worker_obj.get_connections_to_own_clients())
+        scan_time = measure(get_connections_to_own_clients__by_scan, worker_obj, number_of_chat_lines)
+        index_time = measure(MainWorker.get_connections_to_own_clients, worker_obj, number_of_chat_lines)
+        rows.append((number_of_other_connections,
+                     '{:.1f}'.format(scan_time * 1e6 / number_of_chat_lines),
+                     '{:.1f}'.format(index_time * 1e6 / number_of_chat_lines),
+                     '{:.1f}'.format(scan_time / index_time)))
+    print_table(('other connections', 'scan, us/line', 'index, us/line', 'speedup'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+from benchmark_tools import *
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Compares IOMethodEpollLT and IOMethodEpollET on a loopback cluster node: one client sends chat lines, all other
+clients receive them. Reports delivered messages per second and IO syscalls per chat line.
+Usage: "benchmark__epoll_et_vs_lt.py [number_of_chat_lines] [number_of_receivers]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+CHAT_LINE = 'x' * 64
+
+
+def receiver(server_address, number_of_chat_lines, ready_barrier):
+    conn = connect_as_a_client(server_address)
+    ready_barrier.wait()
+    number_of_received_lines = 0
+    for message in read_rpc_messages(conn):
+        if RPCName.print_string == message[FieldName.name]:
+            number_of_received_lines += 1
+            if number_of_received_lines >= number_of_chat_lines:
+                break
+    conn.close()
+
+
+def sender(server_address, number_of_chat_lines, ready_barrier):
+    conn = connect_as_a_client(server_address)
+    ready_barrier.wait()
+    packed_line = pack_rpc({FieldName.name: RPCName.client_string, FieldName.string: CHAT_LINE})
+    lines_per_portion = 100
+    portion = packed_line * lines_per_portion
+    for index in range(number_of_chat_lines // lines_per_portion):
+        conn.sendall(portion)
+    conn.sendall(packed_line * (number_of_chat_lines % lines_per_portion))
+    conn.close()
+
+
+def run_benchmark(server_address, transport, number_of_chat_lines, number_of_receivers):
+    ready_barrier = multiprocessing.get_context('fork').Barrier(number_of_receivers + 1)
+    clients = [(receiver, (server_address, number_of_chat_lines, ready_barrier))] * number_of_receivers
+    clients.append((sender, (server_address, number_of_chat_lines, ready_barrier)))
+    io, global_data, stats_before, finish_time = run_server_in_this_process(server_address, clients, transport)
+
+    stats = io.stats
+    elapsed = finish_time - global_data.first_chat_line_time
+    number_of_delivered_messages = number_of_chat_lines * number_of_receivers
+    syscalls = stats.get_number_of_syscalls() - stats_before.get_number_of_syscalls()
+    wakeups = stats.epoll_wait_calls - stats_before.epoll_wait_calls
+    return (transport.__name__,
+            '{:.0f}'.format(number_of_delivered_messages / elapsed),
+            '{:.3f}'.format(syscalls / number_of_chat_lines),
+            '{:.3f}'.format(wakeups / number_of_chat_lines),
+            '{:.3f}'.format(elapsed))
+
+
+def main():
+    number_of_chat_lines = 20000
+    if len(sys.argv) > 1:
+        number_of_chat_lines = int(sys.argv[1])
+    number_of_receivers = 4
+    if len(sys.argv) > 2:
+        number_of_receivers = int(sys.argv[2])
+
+    print('CHAT LINES: {}; RECEIVERS: {}'.format(number_of_chat_lines, number_of_receivers))
+    rows = list()
+    port = 9970
+    for transport in (IOMethodEpollLT, IOMethodEpollET):
+        rows.append(run_benchmark(('localhost', port), transport, number_of_chat_lines, number_of_receivers))
+        port += 1
+    print_table(('IOMethod', 'delivered msg/s', 'syscalls/line', 'epoll_wait/line', 'seconds'), rows)
+
+if __name__ == '__main__':
+    main()
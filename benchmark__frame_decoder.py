@@ -0,0 +1,74 @@
+from transport_protocol import *
+from benchmark_tools import print_table
+import sys
+import time
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Microbenchmark: decoding of N queued framed messages by the get_message() loop versus FrameDecoder.
+Usage: "benchmark__frame_decoder.py [number_of_messages]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+def decode_by_get_message(data: bytes):
+    number_of_messages = 0
+    try:
+        while True:
+            message, data = get_message(data)
+            number_of_messages += 1
+    except ThereIsNoMessages:
+        pass
+    return number_of_messages
+
+
+def decode_by_frame_decoder(data: bytes, portion_size=None):
+    number_of_messages = 0
+    decoder = FrameDecoder()
+    if portion_size is None:
+        for message in decoder.feed(data):
+            number_of_messages += 1
+    else:
+        data = memoryview(data)
+        for offset in range(0, len(data), portion_size):
+            for message in decoder.feed(data[offset:offset + portion_size]):
+                number_of_messages += 1
+    return number_of_messages
+
+
+def measure(function, *args, repeat=3):
+    best_time = None
+    for index in range(repeat):
+        start_time = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start_time
+        if (best_time is None) or (elapsed < best_time):
+            best_time = elapsed
+    return best_time
+
+
+def main():
+    number_of_messages = 10000
+    if len(sys.argv) > 1:
+        number_of_messages = int(sys.argv[1])
+
+    rows = list()
+    for message_size in (32, 256, 4096):
+        data = pack_message(b'x' * message_size) * number_of_messages
+        get_message_time = measure(decode_by_get_message, data)
+        frame_decoder_time = measure(decode_by_frame_decoder, data)
+        frame_decoder_by_portions_time = measure(decode_by_frame_decoder, data, 1500)
+        for name, elapsed in (('get_message() loop', get_message_time),
+                              ('FrameDecoder, whole data', frame_decoder_time),
+                              ('FrameDecoder, 1500 B portions', frame_decoder_by_portions_time)):
+            rows.append((message_size, name, '{:.1f}'.format(elapsed * 1e9 / number_of_messages),
+                         '{:.1f}x'.format(get_message_time / elapsed)))
+    print('MESSAGES: {}'.format(number_of_messages))
+    print_table(('message size', 'decoder', 'ns/message', 'speedup'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+from benchmark_tools import *
+import sys
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Coalescing of the inter-server broadcast_string messages (see Server.inter_server_batch_deadline). Two servers:
+senders are connected to the first one and receivers to the second one, so each chat line goes through the
+inter-server link once.
+1) Throughput: senders write all their chat lines at once.
+2) Latency: single sender writes timestamped chat lines one by one with a pause - the worst case for the batching,
+    since most batches will be flushed by the deadline.
+Usage: "benchmark__inter_server_batching.py [number_of_receivers] [number_of_chat_lines] [number_of_paced_lines]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+NUMBER_OF_SENDERS = 2
+RECEIVE_TIMEOUT = 60
+INTERVAL_BETWEEN_LINES = 0.001
+
+SETTINGS = (
+    # (deadline, size threshold)
+    (None, 0),
+    (0.0005, 4 * 1024),
+    (0.001, 16 * 1024),
+    (0.005, 64 * 1024),
+)
+
+
+def run_server(server):
+    with contextlib.redirect_stdout(std_io.StringIO()):
+        server.run()
+
+
+def receiver(server_address, number_of_lines, ready_barrier, finish_times, latencies, index):
+    conn = connect_as_a_client(server_address)
+    conn.settimeout(RECEIVE_TIMEOUT)
+    ready_barrier.wait()
+    number_of_received_lines = 0
+    for message in read_rpc_messages(conn):
+        if RPCName.print_string == message[FieldName.name]:
+            if latencies is not None:
+                latencies[number_of_received_lines] = time.perf_counter() - float(message[FieldName.string])
+            number_of_received_lines += 1
+            if number_of_received_lines >= number_of_lines:
+                finish_times[index] = time.perf_counter()
+                break
+    conn.close()
+
+
+def sender(server_address, number_of_chat_lines, ready_barrier):
+    conn = connect_as_a_client(server_address)
+    data = pack_rpc({FieldName.name: RPCName.client_string, FieldName.string: 'x' * 64}) * number_of_chat_lines
+    ready_barrier.wait()
+    conn.sendall(data)
+    conn.settimeout(RECEIVE_TIMEOUT)
+    try:
+        while conn.recv(65536):
+            pass
+    except socket.timeout:
+        pass
+    conn.close()
+
+
+def paced_sender(server_address, number_of_chat_lines, ready_barrier):
+    conn = connect_as_a_client(server_address)
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    ready_barrier.wait()
+    for index in range(number_of_chat_lines):
+        conn.sendall(pack_rpc({FieldName.name: RPCName.client_string, FieldName.string: repr(time.perf_counter())}))
+        time.sleep(INTERVAL_BETWEEN_LINES)
+    conn.settimeout(RECEIVE_TIMEOUT)
+    try:
+        while conn.recv(65536):
+            pass
+    except socket.timeout:
+        pass
+    conn.close()
+
+
+def get_percentile(sorted_values: list, percentile):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))
+    return sorted_values[index]
+
+
+def run_cluster(server_list, deadline, size, number_of_receivers, number_of_lines, senders: list, measure_latency):
+    '''
+    :return: tuple of (elapsed_time or None if some receiver failed, sorted latencies or None)
+    '''
+    context = multiprocessing.get_context('fork')
+    # Receivers should get every chat line: output queues are unbounded
+    servers = [context.Process(target=run_server, args=(Server(address, server_list,
+                                                                inter_server_batch_deadline=deadline,
+                                                                inter_server_batch_size=size,
+                                                                output_high_watermark=None),))
+               for address in server_list]
+    for server in servers:
+        server.start()
+    # Both servers should exchange server_arrived messages before the start
+    for address in server_list:
+        connect_as_a_client(address).close()
+    time.sleep(0.5)
+
+    ready_barrier = context.Barrier(number_of_receivers + len(senders) + 1)
+    finish_times = context.Array('d', number_of_receivers, lock=False)
+    all_latencies = [context.Array('d', number_of_lines, lock=False) if measure_latency else None
+                     for index in range(number_of_receivers)]
+    receivers = [context.Process(target=receiver, args=(server_list[1], number_of_lines, ready_barrier,
+                                                        finish_times, all_latencies[index], index))
+                 for index in range(number_of_receivers)]
+    sender_processes = [context.Process(target=function, args=(server_list[0],) + args + (ready_barrier,))
+                        for function, args in senders]
+    for process in receivers + sender_processes:
+        process.start()
+    ready_barrier.wait()
+    start_time = time.perf_counter()
+    for process in receivers:
+        process.join()
+    for process in sender_processes + servers:
+        process.terminate()
+        process.join()
+
+    if not all(finish_times):
+        return None, None
+    latencies = None
+    if measure_latency:
+        latencies = sorted(latency for latencies in all_latencies for latency in latencies)
+    return max(finish_times) - start_time, latencies
+
+
+def main():
+    number_of_receivers = 8
+    if len(sys.argv) > 1:
+        number_of_receivers = int(sys.argv[1])
+    number_of_chat_lines = 20000
+    if len(sys.argv) > 2:
+        number_of_chat_lines = int(sys.argv[2])
+    number_of_paced_lines = 1000
+    if len(sys.argv) > 3:
+        number_of_paced_lines = int(sys.argv[3])
+
+    print('SENDERS: {}; RECEIVERS: {}; CHAT LINES PER SENDER: {}; PACED LINES: {} (one per {} ms)'.format(
+        NUMBER_OF_SENDERS, number_of_receivers, number_of_chat_lines, number_of_paced_lines,
+        INTERVAL_BETWEEN_LINES * 1000))
+    rows = list()
+    port = 9962
+    for deadline, size in SETTINGS:
+        number_of_lines = number_of_chat_lines * NUMBER_OF_SENDERS
+        senders = [(sender, (number_of_chat_lines,))] * NUMBER_OF_SENDERS
+        elapsed, latencies = run_cluster([('localhost', port), ('localhost', port + 1)], deadline, size,
+                                         number_of_receivers, number_of_lines, senders, False)
+        port += 2
+        throughput = 'FAILED' if elapsed is None else '{:.0f}'.format(number_of_lines / elapsed)
+
+        senders = [(paced_sender, (number_of_paced_lines,))]
+        elapsed, latencies = run_cluster([('localhost', port), ('localhost', port + 1)], deadline, size,
+                                         number_of_receivers, number_of_paced_lines, senders, True)
+        port += 2
+        if latencies is None:
+            latency_columns = ('FAILED', '-', '-')
+        else:
+            latency_columns = tuple('{:.0f}'.format(get_percentile(latencies, percentile) * 1e6)
+                                    for percentile in (50, 99, 99.9))
+
+        setting = 'off' if deadline is None else '{} ms / {} KB'.format(deadline * 1000, size // 1024)
+        rows.append((setting, throughput) + latency_columns)
+    print_table(('batching (deadline / size)', 'inter-server lines/s', 'p50, us', 'p99, us', 'p99.9, us'), rows)
+
+if __name__ == '__main__':
+    main()
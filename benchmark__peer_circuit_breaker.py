@@ -0,0 +1,141 @@
+from benchmark_tools import *
+import os
+import signal
+import sys
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Chat lines while one of the servers is down: client of the first server sends lines at a steady pace, client of the
+second server receives them, the third server is not running. Compares the server without circuit breakers (each
+broadcast makes a new connect attempt to the dead server) with the circuit breakers (see
+Server.circuit_breaker_failure_threshold). Shows connect attempts to other servers made and avoided by the first
+server, its CPU time (including the startup), the delivery to the alive server, and the time it took the line to reach
+the client of the third server after it was started.
+Usage: "benchmark__peer_circuit_breaker.py [number_of_chat_lines] [lines_per_second]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+SETTINGS = (
+    # (name, circuit_breaker_failure_threshold)
+    ('no circuit breaker', None),
+    ('circuit breaker', DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD),
+)
+SETTLE_TIME = 0.5
+RECOVERY_POLL_INTERVAL = 0.01
+STATS = ('number_of_server_connect_attempts', 'number_of_avoided_connect_attempts', 'number_of_opened_circuits')
+
+
+def run_server(server, stats):
+    def on_terminate(signal_number, frame):
+        for index, name in enumerate(STATS):
+            stats[index] = getattr(server.global_data, name)
+        stats[len(STATS)] = time.process_time()
+        os._exit(0)
+
+    if stats is not None:
+        signal.signal(signal.SIGTERM, on_terminate)
+    with contextlib.redirect_stdout(std_io.StringIO()):
+        server.run()
+
+
+def receive_lines(conn: socket.socket, number_of_lines, timeout)->int:
+    '''
+    :return: number of the received chat lines
+    '''
+    number_of_received_lines = 0
+    conn.settimeout(timeout)
+    try:
+        for message in read_rpc_messages(conn):
+            if RPCName.print_string == message[FieldName.name]:
+                number_of_received_lines += 1
+                if number_of_received_lines >= number_of_lines:
+                    break
+    except socket.timeout:
+        pass
+    conn.settimeout(None)
+    return number_of_received_lines
+
+
+def wait_for_recovery(sender: socket.socket, server_address)->float:
+    '''
+    :return: time until the line sent to the first server will reach the client of the just started server, seconds
+    '''
+    receiver = connect_as_a_client(server_address)
+    start_time = time.perf_counter()
+    while True:
+        sender.sendall(pack_rpc({FieldName.name: RPCName.client_string, FieldName.string: 'recovery'}))
+        if receive_lines(receiver, 1, RECOVERY_POLL_INTERVAL):
+            break
+    receiver.close()
+    return time.perf_counter() - start_time
+
+
+def run_benchmark(server_list, failure_threshold, number_of_chat_lines, lines_per_second)->list:
+    context = multiprocessing.get_context('fork')
+    stats = context.Array('d', len(STATS) + 1, lock=False)
+    servers = list()
+    for index, address in enumerate(server_list[:2]):
+        server = Server(address, server_list, circuit_breaker_failure_threshold=failure_threshold)
+        servers.append(context.Process(target=run_server, args=(server, stats if 0 == index else None)))
+    for server in servers:
+        server.start()
+    for address in server_list[:2]:
+        connect_to_the_server(address).close()
+    time.sleep(SETTLE_TIME)
+    sender = connect_as_a_client(server_list[0])
+    receiver = connect_as_a_client(server_list[1])
+    time.sleep(SETTLE_TIME)
+
+    line = pack_rpc({FieldName.name: RPCName.client_string, FieldName.string: 'x' * 64})
+    start_time = time.perf_counter()
+    for index in range(number_of_chat_lines):
+        delay = start_time + index / lines_per_second - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        sender.sendall(line)
+    number_of_received_lines = receive_lines(receiver, number_of_chat_lines, 1)
+    outage_time = time.perf_counter() - start_time
+
+    servers.append(context.Process(target=run_server, args=(
+        Server(server_list[2], server_list, circuit_breaker_failure_threshold=failure_threshold), None)))
+    servers[-1].start()
+    recovery_time = wait_for_recovery(sender, server_list[2])
+
+    for server in servers:
+        server.terminate()
+        server.join()
+    connect_attempts, avoided_attempts, opened_circuits, cpu_time = stats
+    sender.close()
+    receiver.close()
+    return ['{:.0f}'.format(connect_attempts), '{:.0f}'.format(avoided_attempts), '{:.0f}'.format(opened_circuits),
+            '{:.2f}'.format(cpu_time), '{:.2f}'.format(outage_time),
+            '{:.2%}'.format(number_of_received_lines / number_of_chat_lines),
+            '{:.3f}'.format(recovery_time)]
+
+
+def main():
+    number_of_chat_lines = 5000
+    if len(sys.argv) > 1:
+        number_of_chat_lines = int(sys.argv[1])
+    lines_per_second = 1000
+    if len(sys.argv) > 2:
+        lines_per_second = float(sys.argv[2])
+
+    print('CHAT LINES: {}; LINES PER SECOND: {}; ONE OF 3 SERVERS IS DOWN'.format(number_of_chat_lines,
+                                                                                 lines_per_second))
+    rows = list()
+    port = 10670
+    for name, failure_threshold in SETTINGS:
+        server_list = [('localhost', port + index) for index in range(3)]
+        port += 3
+        rows.append([name] + run_benchmark(server_list, failure_threshold, number_of_chat_lines, lines_per_second))
+    print_table(('peers', 'connect attempts to servers', 'avoided attempts', 'opened circuits', 'server CPU time',
+                 'outage time', 'delivered to the alive server', 'seconds to reach the started server'), rows)
+
+if __name__ == '__main__':
+    main()
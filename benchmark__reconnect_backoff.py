@@ -0,0 +1,111 @@
+from benchmark_tools import *
+from client import Client
+from reconnect_backoff import *
+import os
+import signal
+import sys
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Client during the outage of the whole cluster: none of the servers is listening, then one of them is started. Compares
+the immediate reconnection with the reconnection delayed by the DecorrelatedJitterBackoff and ConnectAttemptLimiter
+(see Client.reconnect_max_delay). Shows the number of the connect attempts (each of them is a SYN sent to the cluster)
+and the CPU time of the client process during the outage, and the time it took the client to connect after the server
+was started.
+Usage: "benchmark__reconnect_backoff.py [outage_time]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+SETTINGS = (
+    # (name, Client kwargs)
+    ('immediate', {'reconnect_max_delay': 0, 'max_connect_attempts_per_second': None}),
+    ('backoff + rate limit', {}),
+)
+NUMBER_OF_SERVERS = 3
+RECOVERY_POLL_INTERVAL = 0.01
+
+
+def run_client(client, stats):
+    def on_terminate(signal_number, frame):
+        stats[0] = client.global_data.number_of_connect_attempts
+        stats[1] = time.process_time()
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, on_terminate)
+    # Console input would never come
+    read_fd, write_fd = os.pipe()
+    sys.stdin = os.fdopen(read_fd)
+    with contextlib.redirect_stdout(std_io.StringIO()):
+        client.run()
+
+
+def run_server(server):
+    with contextlib.redirect_stdout(std_io.StringIO()):
+        server.run()
+
+
+def get_number_of_own_clients(server_address):
+    conn = connect_to_the_server(server_address)
+    conn.sendall(pack_rpc({FieldName.name: RPCName.give_me_clients_per_server}))
+    clients_per_server = wait_for_rpc(conn, RPCName.clients_per_server)[FieldName.clients_per_server]
+    conn.close()
+    return clients_per_server.get(server_address)
+
+
+def run_benchmark(server_list, client_kwargs, outage_time)->tuple:
+    '''
+    :return: tuple of (connect attempts during the outage, CPU time during the outage, time to connect after it)
+    '''
+    context = multiprocessing.get_context('fork')
+    stats = context.Array('d', 2, lock=False)
+    client = context.Process(target=run_client,
+                             args=(Client(server_list, load_map_cache_file=None, **client_kwargs), stats))
+    client.start()
+    time.sleep(outage_time)
+    client.terminate()
+    client.join()
+    connect_attempts, cpu_time = stats[0], stats[1]
+
+    # Second run of the same length: server is started at the end of the outage
+    client = context.Process(target=run_client,
+                             args=(Client(server_list, load_map_cache_file=None, **client_kwargs), stats))
+    client.start()
+    time.sleep(outage_time)
+    server = context.Process(target=run_server, args=(Server(server_list[0], server_list),))
+    server.start()
+    start_time = time.perf_counter()
+    while not get_number_of_own_clients(server_list[0]):
+        time.sleep(RECOVERY_POLL_INTERVAL)
+    recovery_time = time.perf_counter() - start_time
+    client.terminate()
+    client.join()
+    server.terminate()
+    server.join()
+    return connect_attempts, cpu_time, recovery_time
+
+
+def main():
+    outage_time = 5.0
+    if len(sys.argv) > 1:
+        outage_time = float(sys.argv[1])
+
+    print('OUTAGE OF THE WHOLE CLUSTER: {} SECONDS; SERVERS: {}; MAX RECONNECT DELAY: {} SECONDS'.format(
+        outage_time, NUMBER_OF_SERVERS, DEFAULT_RECONNECT_MAX_DELAY))
+    rows = list()
+    port = 10470
+    for name, client_kwargs in SETTINGS:
+        server_list = [('localhost', port + index) for index in range(NUMBER_OF_SERVERS)]
+        port += NUMBER_OF_SERVERS
+        connect_attempts, cpu_time, recovery_time = run_benchmark(server_list, client_kwargs, outage_time)
+        rows.append((name, '{:.0f}'.format(connect_attempts), '{:.0f}'.format(connect_attempts / outage_time),
+                     '{:.1%}'.format(cpu_time / outage_time), '{:.2f}'.format(recovery_time)))
+    print_table(('reconnection', 'connect attempts (SYNs)', 'SYNs per second', 'client CPU',
+                 'seconds to connect after the outage'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+from benchmark_tools import *
+import selectors
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Reconnect storm: thousands of clients are connecting to the server at once (as it happens after the other server's
+fault). Measures time until all of them are accepted and served (got clients_per_server response) for the different
+listen backlog and accept batch settings. Dropped SYNs are visible as a ~1 s (SYN retransmission timeout) tail.
+The first row (old hardcoded backlog=10, one accept per event) may take minutes: SYN retransmission timeouts are
+growing exponentially.
+Usage: "benchmark__reconnect_storm.py [number_of_clients]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+def reconnect_storm(server_address, number_of_clients, results):
+    request = pack_rpc({FieldName.name: RPCName.client_arrived}) + \
+        pack_rpc({FieldName.name: RPCName.give_me_clients_per_server})
+    selector = selectors.DefaultSelector()
+    connection_times = list()
+    number_of_retries = 0
+
+    def connect():
+        conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        conn.setblocking(False)
+        conn.connect_ex(server_address)
+        selector.register(conn, selectors.EVENT_WRITE, FrameDecoder())
+
+    start_time = time.perf_counter()
+    for index in range(number_of_clients):
+        connect()
+
+    all_connections = list()
+    while len(connection_times) < number_of_clients:
+        for key, events in selector.select(timeout=1):
+            conn = key.fileobj
+            if events & selectors.EVENT_WRITE:
+                if conn.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                    selector.unregister(conn)
+                    conn.close()
+                    number_of_retries += 1
+                    connect()
+                else:
+                    conn.send(request)
+                    selector.modify(conn, selectors.EVENT_READ, key.data)
+            elif events & selectors.EVENT_READ:
+                try:
+                    data = conn.recv(65536)
+                except ConnectionError:
+                    data = b''
+                if not data:
+                    selector.unregister(conn)
+                    conn.close()
+                    number_of_retries += 1
+                    connect()
+                elif any(True for message in key.data.feed(data)):
+                    selector.unregister(conn)
+                    all_connections.append(conn)
+                    connection_times.append(time.perf_counter() - start_time)
+
+    connection_times.sort()
+    results[0] = connection_times[len(connection_times) // 2]
+    results[1] = connection_times[int(len(connection_times) * 0.99)]
+    results[2] = connection_times[-1]
+    results[3] = number_of_retries
+    for conn in all_connections:
+        conn.close()
+
+
+def run_benchmark(server_address, transport, backlog, accept_batch_size, number_of_clients):
+    results = multiprocessing.get_context('fork').Array('d', 4, lock=False)
+
+    def prepare_io(io):
+        io.accept_batch_size = accept_batch_size
+
+    io, global_data, stats_before, finish_time = run_server_in_this_process(
+        server_address, [(reconnect_storm, (server_address, number_of_clients, results))], transport, prepare_io,
+        BenchmarkGlobalData(number_of_clients), backlog)
+    accept_calls = io.stats.accept_calls - stats_before.accept_calls
+    wakeups = io.stats.epoll_wait_calls - stats_before.epoll_wait_calls
+    return (transport.__name__, backlog, accept_batch_size,
+            '{:.3f}'.format(results[0]), '{:.3f}'.format(results[1]), '{:.3f}'.format(results[2]),
+            int(results[3]), accept_calls, wakeups)
+
+
+def main():
+    number_of_clients = 1000
+    if len(sys.argv) > 1:
+        number_of_clients = int(sys.argv[1])
+
+    print('CLIENTS: {}'.format(number_of_clients))
+    rows = list()
+    port = 9980
+    for transport, backlog, accept_batch_size in ((IOMethodEpollLT, 10, 1),
+                                                  (IOMethodEpollLT, socket.SOMAXCONN, 1),
+                                                  (IOMethodEpollLT, socket.SOMAXCONN, DEFAULT_ACCEPT_BATCH_SIZE),
+                                                  (IOMethodEpollET, socket.SOMAXCONN, DEFAULT_ACCEPT_BATCH_SIZE)):
+        rows.append(run_benchmark(('localhost', port), transport, backlog, accept_batch_size, number_of_clients))
+        port += 1
+    print_table(('IOMethod', 'backlog', 'accept batch', 'p50, s', 'p99, s', 'all reconnected, s', 'retries',
+                 'accept calls', 'epoll_wait calls'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+from relay_topology import *
+from benchmark_tools import print_table
+import collections
+import random
+import sys
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Simulation of the relay topology (see Server.use_relay_topology) versus the full mesh for the big clusters: each
+server sends one message to all others. Servers are simulated by their RelayTopology and DuplicateFilter objects,
+forwarding is done the same way as MainWorker.forward_relay_message() does it: server that fails to send to the dead
+server marks it dead and reroutes the message (see MainWorker.reroute_relay_messages()).
+Shows the copies sent per message (by all servers, by the origin and by the busiest one), the number of hops, the
+number of connections between servers, and the delivery after some servers (including hubs) are killed: first round is
+sent when only the servers themselves know they are dead, second one - after the topology was rebuilt.
+Usage: "benchmark__relay_topology.py [share_of_killed_servers]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+NUMBERS_OF_SERVERS = (50, 100, 200)
+
+
+class SimulatedCluster:
+    def __init__(self, number_of_servers):
+        self.number_of_servers = number_of_servers
+        self.topologies = [RelayTopology(number_of_servers, index) for index in range(number_of_servers)]
+        self.duplicate_filters = [DuplicateFilter() for index in range(number_of_servers)]
+        self.dead_servers = set()
+        self.links = set()  # (sender, receiver)
+        self.copies_per_server = collections.Counter()
+        self.number_of_copies = 0
+        self.number_of_duplicates = 0
+        self.max_hops = 0
+
+    def send(self, origin, sequence)->set:
+        '''
+        :return: indexes of the servers that got the message
+        '''
+        delivered = set()
+        queue = collections.deque()
+        queue.extend((origin, index, stage, 1) for index, stage in
+                     self.topologies[origin].get_destinations(origin, RelayStage.own))
+        while queue:
+            sender, receiver, stage, hops = queue.popleft()
+            topology = self.topologies[sender]
+            if receiver in self.dead_servers:
+                # Connection fails: sender rebuilds its topology and reroutes the message
+                topology.mark_dead(receiver)
+                if RelayStage.to_hub == stage:
+                    queue.extend((sender, index, next_stage, hops) for index, next_stage in
+                                 topology.get_destinations(origin, RelayStage.own))
+                elif RelayStage.between_hubs == stage:
+                    hub = topology.hubs[receiver // topology.group_size]
+                    if hub is not None:
+                        queue.append((sender, hub, stage, hops))
+                continue
+
+            self.links.add((sender, receiver))
+            self.copies_per_server[sender] += 1
+            self.number_of_copies += 1
+            if not self.duplicate_filters[receiver].is_new(origin, sequence):
+                self.number_of_duplicates += 1
+                continue
+            delivered.add(receiver)
+            self.max_hops = max(self.max_hops, hops)
+            queue.extend((receiver, index, next_stage, hops + 1) for index, next_stage in
+                         self.topologies[receiver].get_destinations(origin, stage))
+        return delivered
+
+    def send_from_all(self, sequence)->float:
+        '''
+        :return: share of the alive servers that got each message
+        '''
+        alive_servers = [index for index in range(self.number_of_servers) if index not in self.dead_servers]
+        number_of_deliveries = 0
+        for origin in alive_servers:
+            number_of_deliveries += len(self.send(origin, sequence) - self.dead_servers - {origin})
+        return number_of_deliveries / (len(alive_servers) * (len(alive_servers) - 1))
+
+    def reset_stats(self):
+        self.links = set()
+        self.copies_per_server = collections.Counter()
+        self.number_of_copies = 0
+        self.number_of_duplicates = 0
+        self.max_hops = 0
+
+
+def run_simulation(number_of_servers, share_of_killed_servers, random_generator):
+    cluster = SimulatedCluster(number_of_servers)
+    cluster.send_from_all(1)
+    number_of_links_per_server = collections.Counter(sender for sender, receiver in cluster.links)
+    max_copies_by_origin = max(len(topology.get_destinations(topology.own_index, RelayStage.own))
+                               for topology in cluster.topologies)
+    result = [number_of_servers, 'relay (groups of {})'.format(cluster.topologies[0].group_size),
+              '{:.1f}'.format(cluster.number_of_copies / number_of_servers), max_copies_by_origin,
+              '{:.1f}'.format(max(cluster.copies_per_server.values()) / number_of_servers),
+              cluster.max_hops, len(cluster.links), max(number_of_links_per_server.values())]
+
+    # First server is a hub: it is always killed
+    killed = {0} | set(random_generator.sample(range(1, number_of_servers),
+                                               round(number_of_servers * share_of_killed_servers) - 1))
+    cluster.dead_servers = killed
+    cluster.reset_stats()
+    first_round = cluster.send_from_all(2)
+    second_round = cluster.send_from_all(3)
+    result.extend(('{:.2%}'.format(first_round), '{:.2%}'.format(second_round), cluster.number_of_duplicates))
+    return result
+
+
+def get_full_mesh_row(number_of_servers):
+    return [number_of_servers, 'full mesh', number_of_servers - 1, number_of_servers - 1, number_of_servers - 1, 1,
+            number_of_servers * (number_of_servers - 1), number_of_servers - 1, '100.00%', '100.00%', 0]
+
+
+def main():
+    share_of_killed_servers = 0.1
+    if len(sys.argv) > 1:
+        share_of_killed_servers = float(sys.argv[1])
+
+    print('KILLED SERVERS: {:.0%}'.format(share_of_killed_servers))
+    random_generator = random.Random(42)
+    rows = list()
+    for number_of_servers in NUMBERS_OF_SERVERS:
+        rows.append(get_full_mesh_row(number_of_servers))
+        rows.append(run_simulation(number_of_servers, share_of_killed_servers, random_generator))
+    print_table(('servers', 'topology', 'copies per message', 'max copies by origin',
+                 'copies by busiest server per message', 'max hops',
+                 'links', 'max links per server', 'delivered after kill', 'delivered after rebuild',
+                 'duplicates'), rows)
+
+if __name__ == '__main__':
+    main()
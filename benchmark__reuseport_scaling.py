@@ -0,0 +1,116 @@
+from benchmark_tools import *
+import os
+import sys
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Fan-out throughput of a single cluster node run as 1..N SO_REUSEPORT processes (see Server.number_of_processes).
+Senders and receivers are connected to the node address, so the kernel spreads them between the server processes,
+and each chat line should be delivered to all receivers through the sibling connections.
+Usage: "benchmark__reuseport_scaling.py [max_number_of_processes] [number_of_receivers] [number_of_chat_lines]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+NUMBER_OF_SENDERS = 4
+RECEIVE_TIMEOUT = 60
+
+
+def run_server(server):
+    with contextlib.redirect_stdout(std_io.StringIO()):
+        server.run()
+
+
+def receiver(server_address, number_of_lines, ready_barrier, finish_times, index):
+    conn = connect_as_a_client(server_address)
+    conn.settimeout(RECEIVE_TIMEOUT)
+    ready_barrier.wait()
+    number_of_received_lines = 0
+    for message in read_rpc_messages(conn):
+        if RPCName.print_string == message[FieldName.name]:
+            number_of_received_lines += 1
+            if number_of_received_lines >= number_of_lines:
+                finish_times[index] = time.perf_counter()
+                break
+    conn.close()
+
+
+def sender(server_address, number_of_chat_lines, ready_barrier):
+    conn = connect_as_a_client(server_address)
+    data = pack_rpc({FieldName.name: RPCName.client_string, FieldName.string: 'x' * 64}) * number_of_chat_lines
+    ready_barrier.wait()
+    conn.sendall(data)
+    # Senders are chat clients too: strings of other senders should be read
+    conn.settimeout(RECEIVE_TIMEOUT)
+    number_of_lines = number_of_chat_lines * (NUMBER_OF_SENDERS - 1)
+    number_of_received_lines = 0
+    for message in read_rpc_messages(conn):
+        if RPCName.print_string == message[FieldName.name]:
+            number_of_received_lines += 1
+            if number_of_received_lines >= number_of_lines:
+                break
+    conn.close()
+
+
+def run_benchmark(server_address, number_of_processes, number_of_receivers, number_of_chat_lines):
+    context = multiprocessing.get_context('fork')
+    # Receivers should get every chat line: output queues are unbounded
+    server = Server(server_address, [server_address], number_of_processes=number_of_processes,
+                    output_high_watermark=None)
+    server_process = context.Process(target=run_server, args=(server,))
+    server_process.start()
+
+    ready_barrier = context.Barrier(number_of_receivers + NUMBER_OF_SENDERS + 1)
+    finish_times = context.Array('d', number_of_receivers, lock=False)
+    number_of_lines = number_of_chat_lines * NUMBER_OF_SENDERS
+    clients = [context.Process(target=receiver,
+                               args=(server_address, number_of_lines, ready_barrier, finish_times, index))
+               for index in range(number_of_receivers)]
+    clients.extend(context.Process(target=sender, args=(server_address, number_of_chat_lines, ready_barrier))
+                   for index in range(NUMBER_OF_SENDERS))
+    for process in clients:
+        process.start()
+    ready_barrier.wait()
+    start_time = time.perf_counter()
+    for process in clients:
+        process.join()
+
+    server_process.terminate()  # other server processes will stop after the first one
+    server_process.join()
+
+    delivered_lines = number_of_lines * number_of_receivers
+    if not all(finish_times):
+        return number_of_processes, 'FAILED', '-'
+    elapsed = max(finish_times) - start_time
+    return number_of_processes, '{:.3f}'.format(elapsed), '{:.0f}'.format(delivered_lines / elapsed)
+
+
+def main():
+    max_number_of_processes = os.cpu_count() or 1
+    if len(sys.argv) > 1:
+        max_number_of_processes = int(sys.argv[1])
+    number_of_receivers = 32
+    if len(sys.argv) > 2:
+        number_of_receivers = int(sys.argv[2])
+    number_of_chat_lines = 2000
+    if len(sys.argv) > 3:
+        number_of_chat_lines = int(sys.argv[3])
+
+    print('CPU: {}; SENDERS: {}; RECEIVERS: {}; CHAT LINES PER SENDER: {}'.format(
+        os.cpu_count(), NUMBER_OF_SENDERS, number_of_receivers, number_of_chat_lines))
+    rows = list()
+    port = 9982
+    number_of_processes = 1
+    while number_of_processes <= max_number_of_processes:
+        rows.append(run_benchmark(('localhost', port), number_of_processes, number_of_receivers,
+                                  number_of_chat_lines))
+        port += 1
+        number_of_processes *= 2
+    print_table(('processes', 'time, s', 'delivered lines/s'), rows)
+
+if __name__ == '__main__':
+    main()
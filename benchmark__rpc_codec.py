@@ -0,0 +1,95 @@
+from transport_protocol import *
+from transport_protocol_constants import *
+from benchmark_tools import print_table
+import marshal
+import sys
+import time
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Microbenchmark: serialization of the RPC messages by the binary codec (see encode_rpc() and decode_rpc()) versus
+marshal dicts (the previous wire format). Decoding includes the dispatch-ready result: (rpc_name, fields) tuple or
+the dict with its name lookup.
+Usage: "benchmark__rpc_codec.py [number_of_messages]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+def get_test_messages()->list:
+    clients_per_server = {('localhost', 9990 + index): index for index in range(5)}
+    return [
+        ('client_string', RPCName.client_string, ('x' * 64,)),
+        ('broadcast_string 1KB', RPCName.broadcast_string, ('x' * 1024,)),
+        ('number_of_clients_changed', RPCName.number_of_clients_changed, (1000,)),
+        ('versioned_number_of_clients', RPCName.versioned_number_of_clients, (1000, time.monotonic_ns() // 1000)),
+        ('client_arrived', RPCName.client_arrived, ()),
+        ('server_arrived', RPCName.server_arrived, (('localhost', 9990), ('host/boot', 'chat_inbox_localhost_9990'),
+                                                           ['lz4', 'zlib'])),
+        ('clients_per_server (5)', RPCName.clients_per_server, (clients_per_server,)),
+    ]
+
+
+def encode_by_marshal(rpc_name, fields, number_of_messages):
+    field_names = RPC_FIELDS[rpc_name]
+    for index in range(number_of_messages):
+        message = {FieldName.name: rpc_name}
+        for field_name, field in zip(field_names, fields):
+            message[field_name] = field
+        marshal.dumps(message)
+
+
+def decode_by_marshal(bin_message, number_of_messages):
+    for index in range(number_of_messages):
+        message = marshal.loads(bin_message)
+        message[FieldName.name]
+
+
+def encode_by_codec(rpc_name, fields, number_of_messages):
+    for index in range(number_of_messages):
+        encode_rpc(rpc_name, *fields)
+
+
+def decode_by_codec(bin_message, number_of_messages):
+    bin_message = memoryview(bin_message)  # as FrameDecoder yields
+    for index in range(number_of_messages):
+        decode_rpc(bin_message)
+
+
+def measure(function, *args, repeat=3):
+    best_time = None
+    for index in range(repeat):
+        start_time = time.perf_counter()
+        function(*args)
+        elapsed = time.perf_counter() - start_time
+        if (best_time is None) or (elapsed < best_time):
+            best_time = elapsed
+    return best_time
+
+
+def main():
+    number_of_messages = 100000
+    if len(sys.argv) > 1:
+        number_of_messages = int(sys.argv[1])
+
+    print('MESSAGES: {}'.format(number_of_messages))
+    rows = list()
+    for name, rpc_name, fields in get_test_messages():
+        marshal_message = marshal.dumps(dict(zip((FieldName.name,) + RPC_FIELDS[rpc_name], (rpc_name,) + fields)))
+        codec_message = encode_rpc(rpc_name, *fields)
+        assert decode_rpc(codec_message) == (rpc_name, fields)
+        for codec_name, encode, decode, bin_message in (
+                ('marshal', encode_by_marshal, decode_by_marshal, marshal_message),
+                ('binary', encode_by_codec, decode_by_codec, codec_message)):
+            encode_time = measure(encode, rpc_name, fields, number_of_messages)
+            decode_time = measure(decode, bin_message, number_of_messages)
+            rows.append((name, codec_name, len(bin_message),
+                         '{:.0f}'.format(encode_time * 1e9 / number_of_messages),
+                         '{:.0f}'.format(decode_time * 1e9 / number_of_messages)))
+    print_table(('RPC', 'codec', 'size, bytes', 'encode, ns/message', 'decode, ns/message'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+from load_balancing import *
+from benchmark_tools import print_table
+import random
+import sys
+import time
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Choice of the server by the clients of the failed server (see load_balancing.py). All clients of one server reconnect
+at once, each of them chooses a server by the numbers of clients it got from the cluster. Numbers of clients are
+gossiped with a delay (see Server.client_count_gossip_interval), so clients see the same stale numbers until the next
+refresh. Shows how many of them went to the busiest server and the load spread after the reconnection for the least
+loaded server choice, "power of d choices" with jitter and the random choice.
+Also compares the least loaded server lookup by min() and by the ServerLoads heap on the server side.
+Usage: "benchmark__server_choice.py [number_of_servers] [clients_per_server]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+REFRESH_INTERVALS = (None, 100)  # reconnections between the refreshes of the numbers seen by clients. None: never
+STRATEGIES = (
+    # (name, function(clients_per_server, random_generator))
+    ('least loaded', lambda clients_per_server, random_generator: min(clients_per_server, key=clients_per_server.get)),
+    ('random', lambda clients_per_server, random_generator: random_generator.choice(list(clients_per_server))),
+    ('2 choices + jitter', lambda clients_per_server, random_generator: choose_server(
+        clients_per_server, number_of_choices=2, random_generator=random_generator)),
+    ('3 choices + jitter', lambda clients_per_server, random_generator: choose_server(
+        clients_per_server, number_of_choices=3, random_generator=random_generator)),
+)
+NUMBERS_OF_SERVERS_FOR_LOOKUP = (10, 100, 1000)
+NUMBER_OF_LOOKUPS = 20000
+
+
+def simulate_failure(number_of_servers, clients_per_server, choose, refresh_interval, random_generator):
+    '''
+    :return: tuple of (max number of the reconnected clients got by one server, max load / mean load)
+    '''
+    loads = {('server', index): clients_per_server + random_generator.randint(-clients_per_server // 10,
+                                                                               clients_per_server // 10)
+             for index in range(number_of_servers)}
+    failed_server = ('server', 0)
+    number_of_reconnecting_clients = loads.pop(failed_server)
+    seen_loads = dict(loads)
+    new_clients = dict.fromkeys(loads, 0)
+    for index in range(number_of_reconnecting_clients):
+        if refresh_interval and index and (0 == index % refresh_interval):
+            seen_loads = dict(loads)
+        address = choose(seen_loads, random_generator)
+        loads[address] += 1
+        new_clients[address] += 1
+    mean_load = sum(loads.values()) / len(loads)
+    return max(new_clients.values()), max(loads.values()) / mean_load
+
+
+def measure_lookup(number_of_servers, random_generator):
+    '''
+    :return: tuple of (min() time, ServerLoads time) per lookup, microseconds. Each lookup follows one load change
+    '''
+    addresses = [('server', index) for index in range(number_of_servers)]
+    changes = [(random_generator.choice(addresses), random_generator.randint(0, 10000))
+               for index in range(NUMBER_OF_LOOKUPS)]
+    results = list()
+    for loads in (dict(), ServerLoads()):
+        for address in addresses:
+            loads[address] = random_generator.randint(0, 10000)
+        if isinstance(loads, ServerLoads):
+            get_least_loaded = loads.get_least_loaded
+        else:
+            def get_least_loaded(loads=loads):
+                return min(loads, key=loads.get)
+        start_time = time.perf_counter()
+        for address, load in changes:
+            loads[address] = load
+            get_least_loaded()
+        results.append((time.perf_counter() - start_time) * 1e6 / NUMBER_OF_LOOKUPS)
+    return tuple(results)
+
+
+def main():
+    number_of_servers = 10
+    if len(sys.argv) > 1:
+        number_of_servers = int(sys.argv[1])
+    clients_per_server = 1000
+    if len(sys.argv) > 2:
+        clients_per_server = int(sys.argv[2])
+
+    print('SERVERS: {}; CLIENTS PER SERVER: {} +- 10%; ONE SERVER FAILS'.format(number_of_servers,
+                                                                               clients_per_server))
+    rows = list()
+    for refresh_interval in REFRESH_INTERVALS:
+        for name, choose in STRATEGIES:
+            random_generator = random.Random(42)
+            max_new_clients, max_to_mean = simulate_failure(number_of_servers, clients_per_server, choose,
+                                                            refresh_interval, random_generator)
+            rows.append((refresh_interval or 'never', name, max_new_clients,
+                         '{:.0f}'.format(clients_per_server / (number_of_servers - 1)), '{:.3f}'.format(max_to_mean)))
+    print_table(('numbers refreshed every N clients', 'choice', 'max clients got by one server',
+                 'fair share', 'max load / mean load'), rows)
+
+    print()
+    rows = list()
+    random_generator = random.Random(42)
+    for number_of_servers in NUMBERS_OF_SERVERS_FOR_LOOKUP:
+        min_time, heap_time = measure_lookup(number_of_servers, random_generator)
+        rows.append((number_of_servers, '{:.2f}'.format(min_time), '{:.2f}'.format(heap_time)))
+    print_table(('servers', 'min(), us/lookup', 'ServerLoads, us/lookup'), rows)
+
+if __name__ == '__main__':
+    main()
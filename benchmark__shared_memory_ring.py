@@ -0,0 +1,199 @@
+from benchmark_tools import *
+import os
+import signal
+import sys
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Inter-server fan-out through the shared memory inboxes versus loopback TCP (see Server.use_shared_memory).
+1) Raw transport: cost of passing one serialized broadcast_string message between two processes.
+2) Cluster: two co-located servers. Senders are connected to the first one and receivers to the second one, so
+    each chat line goes through the inter-server transport once.
+Usage: "benchmark__shared_memory_ring.py [number_of_messages] [number_of_receivers] [number_of_chat_lines]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+NUMBER_OF_SENDERS = 2
+RECEIVE_TIMEOUT = 60
+
+
+def get_test_message():
+    return encode_rpc(RPCName.broadcast_string, 'x' * 64)
+
+
+def ring_consumer(inbox_name, number_of_messages, ready_event):
+    inbox = SharedMemoryInbox(inbox_name, 1)
+    ready_event.set()
+    number_of_received_messages = 0
+    while number_of_received_messages < number_of_messages:
+        select.select([inbox.doorbell_fd], [], [], SHARED_MEMORY_INBOX_POLL_INTERVAL)
+        inbox.drain_doorbell()
+        for producer_index, record in inbox.get_records():
+            record.release()
+            number_of_received_messages += 1
+    inbox.destroy()
+
+
+def measure_ring(number_of_messages):
+    context = multiprocessing.get_context('fork')
+    inbox_name = 'chat_inbox_benchmark_{}'.format(os.getpid())
+    ready_event = context.Event()
+    consumer = context.Process(target=ring_consumer, args=(inbox_name, number_of_messages, ready_event))
+    consumer.start()
+    ready_event.wait()
+    outbox = SharedMemoryOutbox(inbox_name, 0)
+    message = get_test_message()
+    start_time = time.perf_counter()
+    for index in range(number_of_messages):
+        while not outbox.put(message):
+            time.sleep(0)  # ring is full
+    consumer.join()
+    elapsed = time.perf_counter() - start_time
+    outbox.close()
+    return 'shared memory ring', elapsed, outbox.number_of_doorbells
+
+
+def socket_consumer(conn, number_of_messages):
+    decoder = FrameDecoder()
+    number_of_received_messages = 0
+    while number_of_received_messages < number_of_messages:
+        data = conn.recv(65536)
+        for message in decoder.feed(data):
+            number_of_received_messages += 1
+    conn.close()
+
+
+def measure_tcp(number_of_messages):
+    context = multiprocessing.get_context('fork')
+    passive_socket = socket.socket()
+    passive_socket.bind(('localhost', 0))
+    passive_socket.listen(1)
+    conn = socket.create_connection(passive_socket.getsockname())
+    peer_conn, address = passive_socket.accept()
+    passive_socket.close()
+    consumer = context.Process(target=socket_consumer, args=(peer_conn, number_of_messages))
+    consumer.start()
+    peer_conn.close()
+    message = pack_message(get_test_message())
+    start_time = time.perf_counter()
+    for index in range(number_of_messages):
+        conn.sendall(message)  # one send per message: as NetIO.broadcast() with the write-through mode
+    consumer.join()
+    elapsed = time.perf_counter() - start_time
+    conn.close()
+    return 'loopback TCP', elapsed, number_of_messages
+
+
+def run_server(server):
+    # Server.terminate() should not leave the inbox: it is removed by Server.run_sibling() on exit
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: sys.exit())
+    with contextlib.redirect_stdout(std_io.StringIO()):
+        server.run()
+
+
+def receiver(server_address, number_of_lines, ready_barrier, finish_times, index):
+    conn = connect_as_a_client(server_address)
+    conn.settimeout(RECEIVE_TIMEOUT)
+    ready_barrier.wait()
+    number_of_received_lines = 0
+    for message in read_rpc_messages(conn):
+        if RPCName.print_string == message[FieldName.name]:
+            number_of_received_lines += 1
+            if number_of_received_lines >= number_of_lines:
+                finish_times[index] = time.perf_counter()
+                break
+    conn.close()
+
+
+def sender(server_address, number_of_chat_lines, ready_barrier):
+    conn = connect_as_a_client(server_address)
+    data = pack_rpc({FieldName.name: RPCName.client_string, FieldName.string: 'x' * 64}) * number_of_chat_lines
+    ready_barrier.wait()
+    conn.sendall(data)
+    conn.settimeout(RECEIVE_TIMEOUT)
+    try:
+        while conn.recv(65536):
+            pass
+    except socket.timeout:
+        pass
+    conn.close()
+
+
+def run_cluster_benchmark(server_list, use_shared_memory, number_of_receivers, number_of_chat_lines):
+    context = multiprocessing.get_context('fork')
+    # Receivers should get every chat line: output queues are unbounded
+    servers = [context.Process(target=run_server, args=(Server(address, server_list,
+                                                                use_shared_memory=use_shared_memory,
+                                                                output_high_watermark=None),))
+               for address in server_list]
+    for server in servers:
+        server.start()
+    # Both servers should exchange server_arrived messages before the start
+    for address in server_list:
+        connect_as_a_client(address).close()
+    time.sleep(0.5)
+
+    ready_barrier = context.Barrier(number_of_receivers + NUMBER_OF_SENDERS + 1)
+    finish_times = context.Array('d', number_of_receivers, lock=False)
+    number_of_lines = number_of_chat_lines * NUMBER_OF_SENDERS
+    receivers = [context.Process(target=receiver,
+                                 args=(server_list[1], number_of_lines, ready_barrier, finish_times, index))
+                 for index in range(number_of_receivers)]
+    senders = [context.Process(target=sender, args=(server_list[0], number_of_chat_lines, ready_barrier))
+               for index in range(NUMBER_OF_SENDERS)]
+    for process in receivers + senders:
+        process.start()
+    ready_barrier.wait()
+    start_time = time.perf_counter()
+    for process in receivers:
+        process.join()
+    for process in senders:
+        process.terminate()
+        process.join()
+    for server in servers:
+        server.terminate()
+        server.join()
+
+    if not all(finish_times):
+        return use_shared_memory, 'FAILED', '-'
+    elapsed = max(finish_times) - start_time
+    return use_shared_memory, '{:.3f}'.format(elapsed), '{:.0f}'.format(number_of_lines / elapsed)
+
+
+def main():
+    number_of_messages = 200000
+    if len(sys.argv) > 1:
+        number_of_messages = int(sys.argv[1])
+    number_of_receivers = 8
+    if len(sys.argv) > 2:
+        number_of_receivers = int(sys.argv[2])
+    number_of_chat_lines = 20000
+    if len(sys.argv) > 3:
+        number_of_chat_lines = int(sys.argv[3])
+
+    print('MESSAGES: {}'.format(number_of_messages))
+    rows = list()
+    for function in (measure_tcp, measure_ring):
+        name, elapsed, number_of_wakeups = function(number_of_messages)
+        rows.append((name, '{:.0f}'.format(elapsed * 1e9 / number_of_messages),
+                     '{:.0f}'.format(number_of_messages / elapsed), number_of_wakeups))
+    print_table(('transport', 'ns/message', 'messages/s', 'send syscalls or doorbells'), rows)
+
+    print()
+    print('SENDERS: {}; RECEIVERS: {}; CHAT LINES PER SENDER: {}'.format(NUMBER_OF_SENDERS, number_of_receivers,
+                                                                        number_of_chat_lines))
+    rows = list()
+    port = 9992
+    for use_shared_memory in (False, True):
+        server_list = [('localhost', port), ('localhost', port + 1)]
+        rows.append(run_cluster_benchmark(server_list, use_shared_memory, number_of_receivers, number_of_chat_lines))
+        port += 2
+    print_table(('shared memory', 'time, s', 'inter-server lines/s'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+from benchmark_tools import *
+import sys
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Bounded output queues (see Server.output_high_watermark): one sender writes all its chat lines at once, fast
+receivers read everything and one slow receiver (small receive buffer, reads a little and sleeps) falls behind.
+Shows the peak size of the server output queue, what each overflow policy did to the slow receiver and that the fast
+receivers are not affected.
+Usage: "benchmark__slow_consumer.py [number_of_chat_lines] [number_of_fast_receivers]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+LINE_LENGTH = 100
+HIGH_WATERMARK = DEFAULT_OUTPUT_HIGH_WATERMARK
+LOW_WATERMARK = DEFAULT_OUTPUT_LOW_WATERMARK
+SLOW_READ_SIZE = 4 * 1024
+SLOW_READ_INTERVAL = 0.02
+SLOW_RECEIVE_BUFFER_SIZE = 16 * 1024
+RECEIVE_TIMEOUT = 2
+QUEUE_SAMPLING_INTERVAL = 0.005
+LINES_PER_SEND = 100
+SEND_INTERVAL = 0.01
+
+SETTINGS = (
+    # (name, high watermark, policy)
+    ('unbounded', None, OutputOverflowPolicy.drop_oldest),
+    ('drop oldest', HIGH_WATERMARK, OutputOverflowPolicy.drop_oldest),
+    ('drop newest', HIGH_WATERMARK, OutputOverflowPolicy.drop_newest),
+    ('disconnect', HIGH_WATERMARK, OutputOverflowPolicy.disconnect),
+)
+
+
+def count_chat_lines(conn: socket.socket, number_of_chat_lines, read_size, read_interval):
+    '''
+    :return: tuple of (number of received chat lines, is connection was closed by the server)
+    '''
+    frame_decoder = FrameDecoder()
+    number_of_received_lines = 0
+    try:
+        while number_of_received_lines < number_of_chat_lines:
+            data = conn.recv(read_size)
+            if not data:
+                return number_of_received_lines, True
+            for message in frame_decoder.feed(data):
+                if RPCName.print_string == decode_rpc(message)[0]:
+                    number_of_received_lines += 1
+            if read_interval is not None:
+                time.sleep(read_interval)
+    except socket.timeout:
+        pass
+    except ConnectionResetError:
+        return number_of_received_lines, True
+    return number_of_received_lines, False
+
+
+def fast_receiver(server_address, number_of_chat_lines, ready_barrier, results, index):
+    # Counts bytes instead of decoding messages: it should read faster than the server writes
+    frame_size = len(pack_rpc({FieldName.name: RPCName.print_string, FieldName.string: 'x' * LINE_LENGTH}))
+    conn = connect_as_a_client(server_address)
+    conn.settimeout(RECEIVE_TIMEOUT)
+    ready_barrier.wait()
+    number_of_bytes = 0
+    try:
+        while number_of_bytes < number_of_chat_lines * frame_size:
+            data = conn.recv(262144)
+            if not data:
+                break
+            number_of_bytes += len(data)
+    except (socket.timeout, ConnectionResetError):
+        pass
+    results[index] = number_of_bytes // frame_size
+    conn.close()
+
+
+def slow_receiver(server_address, number_of_chat_lines, ready_barrier, results, index):
+    conn = socket.socket(get_socket_family(server_address), socket.SOCK_STREAM)
+    conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SLOW_RECEIVE_BUFFER_SIZE)
+    conn.connect(server_address)
+    conn.sendall(pack_rpc({FieldName.name: RPCName.client_arrived}) +
+                 pack_rpc({FieldName.name: RPCName.give_me_clients_per_server}))
+    wait_for_rpc(conn, RPCName.clients_per_server)
+    conn.settimeout(RECEIVE_TIMEOUT)
+    ready_barrier.wait()
+    results[index], is_disconnected = count_chat_lines(conn, number_of_chat_lines, SLOW_READ_SIZE,
+                                                       SLOW_READ_INTERVAL)
+    results[index + 1] = is_disconnected
+    conn.close()
+
+
+def sender(server_address, number_of_chat_lines, ready_barrier):
+    # Paced: the fast receivers (and the server) should be able to keep up with it even on a single CPU
+    conn = connect_as_a_client(server_address)
+    data = pack_rpc({FieldName.name: RPCName.client_string, FieldName.string: 'x' * LINE_LENGTH}) * \
+        LINES_PER_SEND
+    ready_barrier.wait()
+    for index in range(0, number_of_chat_lines, LINES_PER_SEND):
+        conn.sendall(data)
+        time.sleep(SEND_INTERVAL)
+    # Connection is kept open: on EOF server would read (and fan out) all the remaining data at once
+    conn.settimeout(RECEIVE_TIMEOUT)
+    try:
+        while conn.recv(65536):
+            pass
+    except socket.timeout:
+        pass
+    conn.close()
+
+
+def run_benchmark(server_address, high_watermark, policy, number_of_chat_lines, number_of_fast_receivers):
+    context = multiprocessing.get_context('fork')
+    ready_barrier = context.Barrier(number_of_fast_receivers + 2)
+    # received lines of each fast receiver, received lines of the slow receiver, is it was disconnected
+    results = context.Array('d', number_of_fast_receivers + 2, lock=False)
+    clients = [(fast_receiver, (server_address, number_of_chat_lines, ready_barrier, results, index))
+               for index in range(number_of_fast_receivers)]
+    clients.append((slow_receiver, (server_address, number_of_chat_lines, ready_barrier, results,
+                                    number_of_fast_receivers)))
+    clients.append((sender, (server_address, number_of_chat_lines, ready_barrier)))
+    peak_queue_size = [0]
+
+    def prepare_io(io):
+        def sample_output_queues():
+            for connection in io.all_connections:
+                peak_queue_size[0] = max(peak_queue_size[0], len(connection.output_buffer))
+            io.call_later(QUEUE_SAMPLING_INTERVAL, sample_output_queues)
+
+        io.call_later(QUEUE_SAMPLING_INTERVAL, sample_output_queues)
+
+    io, global_data, stats_before, finish_time = run_server_in_this_process(
+        server_address, clients, prepare_io=prepare_io, output_high_watermark=high_watermark,
+        output_low_watermark=LOW_WATERMARK, output_overflow_policy=policy)
+    fast_lines = sum(results[:number_of_fast_receivers])
+    return (peak_queue_size[0], fast_lines / (number_of_fast_receivers * number_of_chat_lines),
+            int(results[number_of_fast_receivers]), bool(results[number_of_fast_receivers + 1]),
+            global_data.dropped_output_messages, global_data.dropped_output_bytes)
+
+
+def main():
+    number_of_chat_lines = 50000
+    if len(sys.argv) > 1:
+        number_of_chat_lines = int(sys.argv[1])
+    number_of_fast_receivers = 4
+    if len(sys.argv) > 2:
+        number_of_fast_receivers = int(sys.argv[2])
+
+    print('CHAT LINES: {} ({} KB per receiver); FAST RECEIVERS: {}; HIGH/LOW WATERMARKS: {}/{} KB'.format(
+        number_of_chat_lines, number_of_chat_lines * (LINE_LENGTH + 10) // 1024, number_of_fast_receivers,
+        HIGH_WATERMARK // 1024, LOW_WATERMARK // 1024))
+    rows = list()
+    port = 9952
+    for name, high_watermark, policy in SETTINGS:
+        peak_queue_size, fast_delivered, slow_lines, is_disconnected, dropped_messages, dropped_bytes = \
+            run_benchmark(('localhost', port), high_watermark, policy, number_of_chat_lines,
+                          number_of_fast_receivers)
+        port += 1
+        rows.append((name, peak_queue_size // 1024, '{:.1%}'.format(fast_delivered), slow_lines,
+                     'yes' if is_disconnected else 'no', dropped_messages, dropped_bytes // 1024))
+    print_table(('output queues', 'peak queue, KB', 'fast receivers got', 'slow receiver got', 'disconnected',
+                 'dropped lines', 'dropped KB'), rows)
+
+if __name__ == '__main__':
+    main()
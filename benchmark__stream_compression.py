@@ -0,0 +1,98 @@
+from transport_protocol import *
+from stream_compression import *
+from benchmark_tools import print_table
+import random
+import sys
+import zlib
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Compression of the inter-server stream (see Server.use_compression): compression ratio and CPU cost per MB for the
+different compressors and batch sizes. Stream is made of the framed broadcast_string (single line) or broadcast_batch
+messages with the generated chat lines, exactly as MainWorker.broadcast_to_all_servers() sends it.
+Usage: "benchmark__stream_compression.py [number_of_chat_lines]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+VOCABULARY_SIZE = 3000
+BATCH_SIZES = (1, 16, 256)  # chat lines per batch
+
+
+def get_chat_lines(number_of_chat_lines)->list:
+    random_generator = random.Random(42)
+    letters = 'etaoinshrdlucmfwypvbgkjqxz'
+    vocabulary = list()
+    for index in range(VOCABULARY_SIZE):
+        length = random_generator.randint(2, 10)
+        vocabulary.append(''.join(letters[min(int(random_generator.expovariate(0.25)), len(letters) - 1)]
+                                  for letter_index in range(length)))
+    # Zipf-like frequencies of words
+    weights = [1 / (rank + 1) for rank in range(VOCABULARY_SIZE)]
+    chat_lines = list()
+    for index in range(number_of_chat_lines):
+        number_of_words = random_generator.randint(3, 20)
+        chat_lines.append(' '.join(random_generator.choices(vocabulary, weights, k=number_of_words)))
+    return chat_lines
+
+
+def get_stream_portions(chat_lines: list, batch_size)->list:
+    portions = list()
+    for index in range(0, len(chat_lines), batch_size):
+        batch = chat_lines[index:index + batch_size]
+        if 1 == len(batch):
+            bin_message = encode_rpc(RPCName.broadcast_string, batch[0])
+        else:
+            bin_message = encode_rpc(RPCName.broadcast_batch, batch)
+        portions.append(pack_message(bin_message))
+    return portions
+
+
+def measure(compressor, decompressor, portions: list):
+    stats = compressor.stats
+    wire_bytes = 0
+    for portion in portions:
+        chunk = compressor.compress(portion)
+        # framed "compressed" message
+        wire_bytes += len(pack_message(encode_rpc(RPCName.compressed, chunk)))
+        assert decompressor.decompress(chunk) == portion
+    return stats, wire_bytes
+
+
+def main():
+    number_of_chat_lines = 50000
+    if len(sys.argv) > 1:
+        number_of_chat_lines = int(sys.argv[1])
+
+    chat_lines = get_chat_lines(number_of_chat_lines)
+    compressors = list()
+    if lz4_block is not None:
+        compressors.append(('lz4', lambda stats: StreamCompressorLZ4(stats), StreamDecompressorLZ4))
+    else:
+        print('python-lz4 is not installed: LZ4 is skipped')
+    for level in (1, 6):
+        compressors.append(('zlib {}'.format(level), lambda stats, level=level: StreamCompressorZlib(stats, level),
+                            StreamDecompressorZlib))
+
+    print('CHAT LINES: {}; MEAN LINE LENGTH: {:.0f}'.format(
+        number_of_chat_lines, sum(len(line) for line in chat_lines) / number_of_chat_lines))
+    rows = list()
+    for batch_size in BATCH_SIZES:
+        portions = get_stream_portions(chat_lines, batch_size)
+        uncompressed_bytes = sum(len(portion) for portion in portions)
+        rows.append((batch_size, 'off', uncompressed_bytes, '1.00', '-', '-'))
+        for name, make_compressor, decompressor_class in compressors:
+            stats = CompressionStats()
+            stats, wire_bytes = measure(make_compressor(stats), decompressor_class(stats), portions)
+            rows.append((batch_size, name, wire_bytes, '{:.2f}'.format(uncompressed_bytes / wire_bytes),
+                         '{:.1f}'.format(stats.get_compression_time_per_mb() * 1000),
+                         '{:.1f}'.format(stats.get_decompression_time_per_mb() * 1000)))
+    print_table(('lines per batch', 'compression', 'wire bytes', 'ratio', 'compress CPU, ms/MB',
+                 'decompress CPU, ms/MB'), rows)
+
+if __name__ == '__main__':
+    main()
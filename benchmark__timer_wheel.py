@@ -0,0 +1,59 @@
+from net_io_timer_wheel import *
+from benchmark_tools import print_table
+import random
+import sys
+import time
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Microbenchmark: cost of the TimerWheel schedule and cancel operations depending on the number of pending timers.
+Usage: "benchmark__timer_wheel.py [number_of_operations]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+def callback():
+    pass
+
+
+def measure(number_of_pending_timers, number_of_operations):
+    wheel = TimerWheel(time.monotonic)
+    for index in range(number_of_pending_timers):
+        wheel.call_later(random.uniform(0, 3600), callback)
+
+    delays = [random.uniform(0, 3600) for index in range(number_of_operations)]
+    start_time = time.perf_counter()
+    handles = [wheel.call_later(delay, callback) for delay in delays]
+    schedule_time = time.perf_counter() - start_time
+
+    random.shuffle(handles)
+    start_time = time.perf_counter()
+    for handle in handles:
+        handle.cancel()
+    cancel_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    wheel.get_timeout(1)
+    get_timeout_time = time.perf_counter() - start_time
+    return (number_of_pending_timers,
+            '{:.0f}'.format(schedule_time * 1e9 / number_of_operations),
+            '{:.0f}'.format(cancel_time * 1e9 / number_of_operations),
+            '{:.0f}'.format(get_timeout_time * 1e9))
+
+
+def main():
+    number_of_operations = 100000
+    if len(sys.argv) > 1:
+        number_of_operations = int(sys.argv[1])
+
+    rows = [measure(number_of_pending_timers, number_of_operations)
+            for number_of_pending_timers in (0, 1000, 10000, 100000, 1000000)]
+    print('OPERATIONS: {}'.format(number_of_operations))
+    print_table(('pending timers', 'schedule, ns', 'cancel, ns', 'get_timeout(), ns'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+from benchmark_tools import *
+import os
+import sys
+import tempfile
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Loopback TCP versus AF_UNIX sockets for the co-located clients and servers.
+1) Raw transport: ping-pong round trip of one 64 bytes message between two processes.
+2) Server: fan-out throughput of a single server for the same client load on its TCP and AF_UNIX addresses.
+Usage: "benchmark__unix_sockets.py [number_of_round_trips] [number_of_receivers] [number_of_chat_lines]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+MESSAGE_SIZE = 64
+
+
+def get_unix_socket_address(name):
+    return os.path.join(tempfile.gettempdir(), 'chat_benchmark_{}_{}.sock'.format(name, os.getpid()))
+
+
+def echo_server(passive_socket, number_of_round_trips):
+    conn, address = passive_socket.accept()
+    passive_socket.close()
+    for index in range(number_of_round_trips):
+        data = conn.recv(MESSAGE_SIZE)
+        while len(data) < MESSAGE_SIZE:
+            data += conn.recv(MESSAGE_SIZE - len(data))
+        conn.sendall(data)
+    conn.close()
+
+
+def measure_round_trip(address, number_of_round_trips):
+    context = multiprocessing.get_context('fork')
+    passive_socket = socket.socket(get_socket_family(address), socket.SOCK_STREAM)
+    passive_socket.bind(address)
+    passive_socket.listen(1)
+    process = context.Process(target=echo_server, args=(passive_socket, number_of_round_trips))
+    process.start()
+    passive_socket.close()
+    conn = connect_to_the_server(address)
+    if socket.AF_UNIX != conn.family:
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    message = b'x' * MESSAGE_SIZE
+    start_time = time.perf_counter()
+    for index in range(number_of_round_trips):
+        conn.sendall(message)
+        data = conn.recv(MESSAGE_SIZE)
+        while len(data) < MESSAGE_SIZE:
+            data += conn.recv(MESSAGE_SIZE - len(data))
+    elapsed = time.perf_counter() - start_time
+    conn.close()
+    process.join()
+    if socket.AF_UNIX == get_socket_family(address):
+        os.unlink(address)
+    return elapsed
+
+
+def receiver(server_address, number_of_chat_lines):
+    conn = connect_as_a_client(server_address)
+    number_of_received_lines = 0
+    for message in read_rpc_messages(conn):
+        if RPCName.print_string == message[FieldName.name]:
+            number_of_received_lines += 1
+            if number_of_received_lines >= number_of_chat_lines:
+                break
+    conn.close()
+
+
+def sender(server_address, number_of_chat_lines, number_of_receivers):
+    conn = connect_as_a_client(server_address)
+    # Wait for all receivers
+    while True:
+        conn.sendall(pack_rpc({FieldName.name: RPCName.give_me_clients_per_server}))
+        message = wait_for_rpc(conn, RPCName.clients_per_server)
+        if message[FieldName.clients_per_server][server_address] > number_of_receivers:
+            break
+        time.sleep(0.01)
+    conn.sendall(pack_rpc({FieldName.name: RPCName.client_string, FieldName.string: 'x' * 64}) * number_of_chat_lines)
+    conn.close()
+
+
+def measure_server(server_address, number_of_receivers, number_of_chat_lines):
+    clients = [(receiver, (server_address, number_of_chat_lines)) for index in range(number_of_receivers)]
+    clients.append((sender, (server_address, number_of_chat_lines, number_of_receivers)))
+    io, global_data, stats_before, finish_time = run_server_in_this_process(server_address, clients)
+    return (finish_time - global_data.first_chat_line_time), io.stats.recv_calls - stats_before.recv_calls
+
+
+def main():
+    number_of_round_trips = 20000
+    if len(sys.argv) > 1:
+        number_of_round_trips = int(sys.argv[1])
+    number_of_receivers = 16
+    if len(sys.argv) > 2:
+        number_of_receivers = int(sys.argv[2])
+    number_of_chat_lines = 5000
+    if len(sys.argv) > 3:
+        number_of_chat_lines = int(sys.argv[3])
+
+    addresses = (('TCP', ('localhost', 9996)), ('AF_UNIX', get_unix_socket_address('round_trip')))
+    print('ROUND TRIPS: {}'.format(number_of_round_trips))
+    rows = list()
+    for name, address in addresses:
+        elapsed = measure_round_trip(address, number_of_round_trips)
+        rows.append((name, '{:.1f}'.format(elapsed * 1e6 / number_of_round_trips),
+                     '{:.0f}'.format(number_of_round_trips / elapsed)))
+    print_table(('transport', 'round trip, us', 'round trips/s'), rows)
+
+    print()
+    print('RECEIVERS: {}; CHAT LINES: {}'.format(number_of_receivers, number_of_chat_lines))
+    addresses = (('TCP', ('localhost', 9997)), ('AF_UNIX', get_unix_socket_address('server')))
+    rows = list()
+    for name, address in addresses:
+        elapsed, recv_calls = measure_server(address, number_of_receivers, number_of_chat_lines)
+        delivered_lines = number_of_receivers * number_of_chat_lines
+        rows.append((name, '{:.3f}'.format(elapsed), '{:.0f}'.format(delivered_lines / elapsed), recv_calls))
+    print_table(('transport', 'time, s', 'delivered lines/s', 'server recv calls'), rows)
+
+if __name__ == '__main__':
+    main()
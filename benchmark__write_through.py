@@ -0,0 +1,88 @@
+from benchmark_tools import *
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Measures per-hop fan-out latency (client -> server -> clients) with and without NetIO write-through mode.
+Chat lines are sent one by one, so each of them waits for the full server reaction.
+Usage: "benchmark__write_through.py [number_of_chat_lines] [number_of_receivers]"
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+INTERVAL_BETWEEN_LINES = 0.0005
+
+
+def receiver(server_address, number_of_chat_lines, ready_barrier, latencies):
+    conn = connect_as_a_client(server_address)
+    ready_barrier.wait()
+    number_of_received_lines = 0
+    for message in read_rpc_messages(conn):
+        if RPCName.print_string == message[FieldName.name]:
+            latencies[number_of_received_lines] = time.perf_counter() - float(message[FieldName.string])
+            number_of_received_lines += 1
+            if number_of_received_lines >= number_of_chat_lines:
+                break
+    conn.close()
+
+
+def sender(server_address, number_of_chat_lines, ready_barrier):
+    conn = connect_as_a_client(server_address)
+    ready_barrier.wait()
+    for index in range(number_of_chat_lines):
+        conn.sendall(pack_rpc({FieldName.name: RPCName.client_string, FieldName.string: repr(time.perf_counter())}))
+        time.sleep(INTERVAL_BETWEEN_LINES)
+    conn.close()
+
+
+def get_percentile(sorted_values: list, percentile):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percentile / 100))
+    return sorted_values[index]
+
+
+def run_benchmark(server_address, transport, write_through, number_of_chat_lines, number_of_receivers):
+    context = multiprocessing.get_context('fork')
+    ready_barrier = context.Barrier(number_of_receivers + 1)
+    all_latencies = [context.Array('d', number_of_chat_lines, lock=False) for index in range(number_of_receivers)]
+    clients = [(receiver, (server_address, number_of_chat_lines, ready_barrier, latencies))
+               for latencies in all_latencies]
+    clients.append((sender, (server_address, number_of_chat_lines, ready_barrier)))
+
+    def prepare_io(io):
+        io.write_through = write_through
+
+    io, global_data, stats_before, finish_time = run_server_in_this_process(server_address, clients, transport,
+                                                                            prepare_io)
+
+    latencies = sorted(latency for latencies in all_latencies for latency in latencies)
+    epoll_ctl_calls = io.stats.epoll_ctl_calls - stats_before.epoll_ctl_calls
+    return (transport.__name__, write_through,
+            '{:.1f}'.format(get_percentile(latencies, 50) * 1e6),
+            '{:.1f}'.format(get_percentile(latencies, 99) * 1e6),
+            '{:.1f}'.format(sum(latencies) / len(latencies) * 1e6),
+            '{:.2f}'.format(epoll_ctl_calls / number_of_chat_lines))
+
+
+def main():
+    number_of_chat_lines = 5000
+    if len(sys.argv) > 1:
+        number_of_chat_lines = int(sys.argv[1])
+    number_of_receivers = 4
+    if len(sys.argv) > 2:
+        number_of_receivers = int(sys.argv[2])
+
+    print('CHAT LINES: {}; RECEIVERS: {}'.format(number_of_chat_lines, number_of_receivers))
+    rows = list()
+    port = 9972
+    for transport in (IOMethodEpollLT, IOMethodEpollET):
+        for write_through in (False, True):
+            rows.append(run_benchmark(('localhost', port), transport, write_through, number_of_chat_lines,
+                                      number_of_receivers))
+            port += 1
+    print_table(('IOMethod', 'write-through', 'p50, us', 'p99, us', 'mean, us', 'epoll_ctl/line'), rows)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+from server import *
+import contextlib
+import io as std_io
+import multiprocessing
+import socket
+import time
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+def pack_rpc(message: dict)->bytes:
+    '''
+    Serializes and frames RPC message exactly as client.py and server.py do
+    :param message: RPC message dict (see FieldName and RPCName). Missing fields are None
+    :return: framed message
+    '''
+    rpc_name = message[FieldName.name]
+    fields = [message.get(field_name) for field_name in RPC_FIELDS[rpc_name]]
+    return pack_message(encode_rpc(rpc_name, *fields))
+
+
+def rpc_to_dict(message)->dict:
+    '''
+    :param message: serialized RPC message
+    :return: RPC message dict (see FieldName and RPCName)
+    '''
+    rpc_name, fields = decode_rpc(message)
+    result = dict(zip(RPC_FIELDS[rpc_name], fields))
+    result[FieldName.name] = rpc_name
+    return result
+
+
+def connect_to_the_server(address, timeout=10)->socket.socket:
+    '''
+    Makes blocking connection to the server. Will retry until timeout if server is not listening yet
+    :param address: server address
+    :param timeout: timeout in seconds
+    :return: connected socket
+    '''
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            if socket.AF_UNIX == get_socket_family(address):
+                conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                try:
+                    conn.connect(address)
+                except:
+                    conn.close()
+                    raise
+                return conn
+            return socket.create_connection(address)
+        except (ConnectionRefusedError, FileNotFoundError):
+            if time.perf_counter() > deadline:
+                raise
+            time.sleep(0.01)
+
+
+def read_rpc_messages(conn: socket.socket):
+    '''
+    Generator. Reads framed RPC messages from the blocking socket until EOF
+    :param conn: connected blocking socket
+    :return: decoded RPC message dicts
+    '''
+    data = b''
+    while True:
+        part = conn.recv(65536)
+        if not part:
+            return
+        data += part
+        try:
+            while True:
+                message, data = get_message(data)
+                yield rpc_to_dict(message)
+        except ThereIsNoMessages:
+            pass
+
+
+def wait_for_rpc(conn: socket.socket, rpc_name):
+    '''
+    Reads RPC messages from the blocking socket until message with the given name will be received
+    :param conn: connected blocking socket
+    :param rpc_name: one of RPCName values
+    :return: received message
+    '''
+    for message in read_rpc_messages(conn):
+        if rpc_name == message[FieldName.name]:
+            return message
+    raise ConnectionError('Connection was closed before {} RPC was received'.format(rpc_name))
+
+
+def connect_as_a_client(address)->socket.socket:
+    '''
+    Connects to the server as a chat client and waits until server will accept and process this client
+    :param address: server address
+    :return: connected blocking socket
+    '''
+    conn = connect_to_the_server(address)
+    conn.sendall(pack_rpc({FieldName.name: RPCName.client_arrived}) +
+                 pack_rpc({FieldName.name: RPCName.give_me_clients_per_server}))
+    wait_for_rpc(conn, RPCName.clients_per_server)
+    return conn
+
+
+def print_table(header: tuple, rows: list):
+    '''
+    Prints simple text table
+    :param header: tuple of column names
+    :param rows: list of tuples
+    :return:
+    '''
+    rows = [tuple(str(item) for item in row) for row in rows]
+    widths = [max([len(str(header[index]))] + [len(row[index]) for row in rows]) for index in range(len(header))]
+    print('  '.join(str(item).ljust(width) for item, width in zip(header, widths)))
+    print('  '.join('-' * width for width in widths))
+    for row in rows:
+        print('  '.join(item.ljust(width) for item, width in zip(row, widths)))
+
+
+class BenchmarkGlobalData(GlobalDataForAllWorkers):
+    def __init__(self, number_of_clients):
+        super().__init__()
+        self.number_of_clients_left = number_of_clients
+        self.first_chat_line_time = None
+
+
+class BenchmarkWorker(MainWorker):
+    '''
+    Server worker that remembers the time of the first chat line and stops the IO loop when all benchmark clients
+    are disconnected
+    '''
+    def rpc_input__client_string(self, client_string):
+        if self.global_data.first_chat_line_time is None:
+            self.global_data.first_chat_line_time = time.perf_counter()
+        super().rpc_input__client_string(client_string)
+
+    def process__on_connection_lost__as_an_active_connection(self):
+        super().process__on_connection_lost__as_an_active_connection()
+        if not self.is_connection_to_the_server:
+            self.global_data.number_of_clients_left -= 1
+            if not self.global_data.number_of_clients_left:
+                self.api.stop()
+
+
+def run_server_in_this_process(server_address, clients: list, transport=IOMethodEpollLT, prepare_io=None,
+                               global_data: BenchmarkGlobalData=None, backlog=128, output_high_watermark=None,
+                               output_low_watermark=None, output_overflow_policy=OutputOverflowPolicy.drop_oldest):
+    '''
+    Runs single cluster node (without peers) in the current process, with the benchmark client processes connected
+    to it. Server stdout is suppressed.
+    :param server_address: address of the server
+    :param clients: list of (function, args) tuples. Each of them will be run in a separate (forked) process after
+        the server will start listening. Server will be stopped after all of them will disconnect from it (one
+        connection per process is expected) or after all of them will exit
+    :param transport: IOMethod class
+    :param prepare_io: callable(io) which will be called before the loop start
+    :param global_data: already constructed BenchmarkGlobalData (if you need to use your own subclass)
+    :param backlog: listen() backlog of the server socket
+    :param output_high_watermark: see Server.output_high_watermark. Output queues are unbounded by default
+    :param output_low_watermark: see Server.output_low_watermark
+    :param output_overflow_policy: see Server.output_overflow_policy
+    :return: tuple of (io, global_data, stats_before_the_loop, finish_time)
+    '''
+    context = multiprocessing.get_context('fork')
+    if global_data is None:
+        global_data = BenchmarkGlobalData(len(clients))
+    global_data.own_address = server_address
+
+    io = NetIO(transport)
+    with contextlib.redirect_stdout(std_io.StringIO()), net_io(io) as io:
+        if prepare_io is not None:
+            prepare_io(io)
+        passive_connection_info = ConnectionInfo(BenchmarkWorker(global_data), ConnectionType.passive,
+                                                 server_address, backlog=backlog,
+                                                 output_high_watermark=output_high_watermark,
+                                                 output_low_watermark=output_low_watermark,
+                                                 output_overflow_policy=output_overflow_policy)
+        io.make_connection(passive_connection_info, 'server')
+        processes = [context.Process(target=function, args=args) for function, args in clients]
+        for process in processes:
+            process.start()
+
+        def stop_when_all_clients_exited():
+            if any(process.is_alive() for process in processes):
+                io.call_later(0.05, stop_when_all_clients_exited)
+            else:
+                io.stop()
+
+        io.call_later(0.05, stop_when_all_clients_exited)
+        stats_before = io.stats.copy()
+    finish_time = time.perf_counter()
+    for process in processes:
+        process.join()
+    return io, global_data, stats_before, finish_time
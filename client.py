@@ -3,9 +3,13 @@ from net_io_method__epoll_lt import *
 from transport_protocol import *
 from server_list_loader import load_server_list
 from transport_protocol_constants import *
-import marshal
+from load_balancing import *
+from reconnect_backoff import *
+import ast
+import os
 import sys
-from threading import Thread, Lock
+import time
+from threading import Thread
 from multiprocessing import Process
 from random import randint
 
@@ -17,16 +21,73 @@ Docstrings: http://www.python.org/dev/peps/pep-0257/
 __author__ = 'ButenkoMS <gtalk@butenkoms.space>'
 
 
+JOIN_COMMAND = '/join '
+LEAVE_COMMAND = '/leave '
+SAY_COMMAND = '/say '
+PATH_TO_CURRENT_SCRIPT = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_LOAD_MAP_CACHE_FILE = os.path.join(PATH_TO_CURRENT_SCRIPT, 'clients_per_server.cache')
+DEFAULT_LOAD_MAP_CACHE_TTL = 60.0
+
+
+def load_cached_clients_per_server(file_name, ttl)->tuple:
+    '''
+    :param file_name: cache file (see save_cached_clients_per_server())
+    :param ttl: max age of the cached numbers of clients, seconds
+    :return: tuple of (clients_per_server dict, time when it was received). Empty dict if there is no cache or it is
+        too old
+    '''
+    try:
+        with open(file_name, 'r') as file:
+            received_time, clients_per_server = ast.literal_eval(file.read())
+    except (OSError, ValueError, SyntaxError, TypeError):
+        return dict(), None
+    if not (0 <= time.time() - received_time <= ttl) or not isinstance(clients_per_server, dict):
+        return dict(), None
+    return clients_per_server, received_time
+
+
+def save_cached_clients_per_server(file_name, clients_per_server: dict, received_time):
+    '''
+    Saves numbers of clients for the next start of the client. File is replaced atomically: it may be shared by all
+    clients of this host
+    :param file_name: cache file
+    :param clients_per_server: {server address: number of clients}
+    :param received_time: time.time() when the numbers were received
+    :return:
+    '''
+    temp_file_name = '{}.{}'.format(file_name, os.getpid())
+    try:
+        with open(temp_file_name, 'w') as file:
+            file.write(repr((received_time, dict(clients_per_server))))
+        os.replace(temp_file_name, file_name)
+    except OSError as err:
+        print('CAN NOT SAVE THE CLIENTS PER SERVER CACHE: {}'.format(err))
+
+
 class GlobalDataForAllWorkers:
     def __init__(self):
         self.all_servers_list = list()
         self.clients_per_server = dict()
-
+        self.clients_per_server_time = None  # time.time() when clients_per_server was received
+
+        # Bootstrap: server accepts the client or redirects it (see MainWorker.rpc_input__best_server())
+        self.redirect_address = None
+        self.number_of_redirects = 0
+        self.load_map_cache_file = None  # see save_cached_clients_per_server()
+        self.load_map_cache_ttl = DEFAULT_LOAD_MAP_CACHE_TTL
+
+        # Reconnection after the failure is delayed (see Client.reconnect_max_delay)
+        self.reconnect_backoff = DecorrelatedJitterBackoff()
+        self.connect_attempt_limiter = ConnectAttemptLimiter()
+        self.reconnect_timer = None
+        self.number_of_connect_attempts = 0
+
+        # All fields are used from inside of the IO loop only. ConsoleInputThread passes user input to the loop by the
+        #   NetIO.call_soon_threadsafe() calls
         self.need_to_exit = False
-        self.lock_for__need_to_exit = Lock()
-
-        self.input_messages = list()
-        self.lock_for__input_messages = Lock()
+        self.input_messages = list()  # user strings waiting to be sent to the destination server
+        self.destination_server_connection = None
+        self.channels = set()  # joined channels: they are joined again after each reconnection
 
 
 class MainWorker(WorkerBase):
@@ -37,50 +98,44 @@ class MainWorker(WorkerBase):
         self.connected_to_destination_server = False
         self.is_normal_reconnection = False
 
+        # Protocol version negotiation (see choose_protocol_version())
+        self.input_protocol_version = MIN_PROTOCOL_VERSION
+        self.output_protocol_version = MIN_PROTOCOL_VERSION
+
+        self.frame_decoder = FrameDecoder()
         self.input_rpc_handlers = dict()
         self.prepare_input_rpc_handlers()
         self.is_on_connect_was_called = False
 
     def on_connect(self):
         self.is_on_connect_was_called = True
-
-        self.connection.force_write_call = True  # from this moment, on_no_more_data_to_write() will be called
-        #   continuously. So we wil be able to check 'exit' command within on_no_more_data_to_write() callback at any
-        #   time, even if we still not connected to the destination server.
-
-        if self.global_data.clients_per_server:
-            # already got clients_per_server dict. This means that we currently already connected to best server.
-            # We can start working now
-            self.process__on_connect__already_got_clients_per_server_dict()
-        else:
-            # need to get clients_per_server dict from current (random) server
-            self.process__on_connect__still_need_to_get_clients_per_server_dict()
+        self.send_request__protocol_version()
+        # Server will accept this client or will redirect it to the less loaded server: single round trip
+        self.send_request__client_bootstrap()
 
     def on_read(self):
+        read_data = self.connection.read_data
+        data = read_data.get_data()
         try:
-            while True:
-                message, remaining_data = get_message(self.connection.read_data)
-                self.connection.read_data = remaining_data
+            for message in self.frame_decoder.feed(data):
                 self.input_message_handler(message)
-        except ThereIsNoMessages:
-            return
-
-    def on_no_more_data_to_write(self):
-        self.check_for_exit()
-        if self.connected_to_destination_server:
-            # server has sent all data, so we ned to check user input for some new strings
-            self.check_and_send_user_strings_to_the_server()
+        finally:
+            read_data.consume(len(data))
 
     def on_connection_lost(self):
-        self.check_for_exit()  # we need to check it here to prevent hung: to be able to stop client even if there is
-        #   no running servers in the cluster at all (in this situation client will tend to infinitely retry the
-        #   connection to the cluster if user will not stop it).
+        if self.global_data.destination_server_connection is self.connection:
+            self.global_data.destination_server_connection = None
+        if self.check_for_exit():
+            # we need to check it here to prevent hung: to be able to stop client even if there is no running servers
+            #   in the cluster at all (in this situation client will tend to infinitely retry the connection to the
+            #   cluster if user will not stop it).
+            return
 
         self.print_an_appropriate_server_reconnection_message_to_the_console()
 
         self.check_and_maybe_remove_faulty_destination_server_from_the_clients_per_server_dict()
         self.check_whether_we_need_to_update_the_existing_clients_per_server_dict()
-        self.reconnect_to_the_new_server_from_the_cluster()
+        self.schedule_reconnection()
 
     def __copy__(self):
         return type(self)(self.global_data)
@@ -93,16 +148,61 @@ class MainWorker(WorkerBase):
                 self.server_address))
 
     def check_and_send_user_strings_to_the_server(self):
-        with self.global_data.lock_for__input_messages:
-            if self.global_data.input_messages:
-                for string in self.global_data.input_messages:
-                    self.send_request__client_string(string)
-                self.global_data.input_messages = list()
-
-    def check_for_exit(self):
-        with self.global_data.lock_for__need_to_exit:
-            if self.global_data.need_to_exit:
-                self.api.stop()
+        if self.global_data.input_messages:
+            for string in self.global_data.input_messages:
+                self.process_user_string(string)
+            self.global_data.input_messages = list()
+
+    def process_user_string(self, string: str):
+        '''
+        :param string: "/join channel", "/leave channel", "/say channel text" (line for the channel subscribers only)
+            or a text for all clients
+        :return:
+        '''
+        if string.startswith(JOIN_COMMAND):
+            channel = string[len(JOIN_COMMAND):].strip()
+            if channel:
+                self.global_data.channels.add(channel)
+                self.send_request__join_channel(channel)
+        elif string.startswith(LEAVE_COMMAND):
+            channel = string[len(LEAVE_COMMAND):].strip()
+            self.global_data.channels.discard(channel)
+            self.send_request__leave_channel(channel)
+        elif string.startswith(SAY_COMMAND) and (' ' in string[len(SAY_COMMAND):].strip()):
+            channel, text = string[len(SAY_COMMAND):].strip().split(' ', 1)
+            self.send_request__channel_string(channel, text)
+        else:
+            self.send_request__client_string(string)
+
+    def check_for_exit(self)->bool:
+        if self.global_data.need_to_exit:
+            self.api.stop()
+        return self.global_data.need_to_exit
+
+    @staticmethod
+    def on_user_string(global_data: GlobalDataForAllWorkers, string: str):
+        '''
+        Is called from inside of the IO loop (see ConsoleInputThread)
+        :param global_data: client global data
+        :param string: new user string
+        :return:
+        '''
+        global_data.input_messages.append(string)
+        connection = global_data.destination_server_connection
+        if connection is not None:
+            connection.worker_obj.check_and_send_user_strings_to_the_server()
+            connection.worker_obj.api.check_is_connection_need_to_sent_data(connection)
+
+    @staticmethod
+    def on_user_exit(global_data: GlobalDataForAllWorkers, api: NetIOUserApi):
+        '''
+        Is called from inside of the IO loop (see ConsoleInputThread)
+        :param global_data: client global data
+        :param api: IO object
+        :return:
+        '''
+        global_data.need_to_exit = True
+        api.stop()
 
     def check_and_maybe_remove_faulty_destination_server_from_the_clients_per_server_dict(self):
         if not self.is_normal_reconnection:
@@ -111,14 +211,46 @@ class MainWorker(WorkerBase):
                 del self.global_data.clients_per_server[self.server_address]
 
     def check_whether_we_need_to_update_the_existing_clients_per_server_dict(self):
-        # if there was a working session with a destination server (it could take from milliseconds up to days and
-        # years between connection to and disconnection from destination server) - we need to update clients_per_server
-        # dict before actual reconnection
-        if self.connected_to_destination_server and self.is_on_connect_was_called:
+        # it could take from milliseconds up to days and years between connection to and disconnection from
+        # destination server: old clients_per_server dict is not used for the reconnection
+        if not self.is_clients_per_server_fresh():
             self.global_data.clients_per_server = dict()
 
+    def is_clients_per_server_fresh(self)->bool:
+        global_data = self.global_data
+        return bool(global_data.clients_per_server) and (global_data.clients_per_server_time is not None) and \
+            (time.time() - global_data.clients_per_server_time <= global_data.load_map_cache_ttl)
+
+    def schedule_reconnection(self):
+        # Server is chosen when the delay is over: numbers of clients may be changed by that time
+        global_data = self.global_data
+        delay = 0.0
+        if not self.is_normal_reconnection:
+            delay = global_data.reconnect_backoff.get_next_delay()
+        delay = global_data.connect_attempt_limiter.reserve(delay)
+        if delay <= 0:
+            self.reconnect_to_the_new_server_from_the_cluster()
+            return
+
+        print('WILL RECONNECT IN {:.2f} SECONDS'.format(delay))
+        global_data.reconnect_timer = self.api.call_later(delay, self.on_reconnect_timer)
+
+    def on_reconnect_timer(self):
+        self.global_data.reconnect_timer = None
+        if not self.global_data.need_to_exit:
+            self.reconnect_to_the_new_server_from_the_cluster()
+
     def reconnect_to_the_new_server_from_the_cluster(self):
         server_address = None
+        if self.global_data.redirect_address is not None:
+            server_address = self.global_data.redirect_address
+            self.global_data.redirect_address = None
+            self.global_data.number_of_redirects += 1
+            print('REDIRECTED TO THE SERVER ({})'.format(server_address))
+            self.make_connection_to_the_server(server_address)
+            return
+
+        self.global_data.number_of_redirects = 0
         if self.global_data.clients_per_server:
             # try to reconnect to next best server from the list
             server_address = self.process__on_connection_lost__already_got_clients_per_server_dict()
@@ -127,14 +259,9 @@ class MainWorker(WorkerBase):
             server_address = self.process__on_connection_lost__still_need_to_get_clients_per_server_dict()
         self.make_connection_to_the_server(server_address)
 
-    def process__on_connect__already_got_clients_per_server_dict(self):
-        self.mark_this_connection_as_connection_to_destination_server()
-
-    def process__on_connect__still_need_to_get_clients_per_server_dict(self):
-        self.send_request__give_me_clients_per_server()
-
     def process__on_connection_lost__already_got_clients_per_server_dict(self):
-        server_address = min(self.global_data.clients_per_server, key=self.global_data.clients_per_server.get)
+        # Not just the least loaded server: all clients of the failed server would reconnect to the same one
+        server_address = choose_server(self.global_data.clients_per_server)
         print('TRYING TO RECONNECT TO THE BEST SERVER ({})'.format(server_address))
         return server_address
 
@@ -145,92 +272,165 @@ class MainWorker(WorkerBase):
         return server_address
 
     def make_connection_to_the_server(self, server_address):
-        worker_for_server_connection = MainWorker(self.global_data)
+        global_data = self.global_data
+        global_data.number_of_connect_attempts += 1
+        worker_for_server_connection = MainWorker(global_data)
         worker_for_server_connection.server_address = server_address
         main_server_connection_info = ConnectionInfo(worker_for_server_connection,
                                                      ConnectionType.active_connected,
                                                      server_address)
-        self.api.make_connection(main_server_connection_info)
+        try:
+            self.api.make_connection(main_server_connection_info)
+        except OSError as err:
+            # Socket was not created (EMFILE, etc.): this is a failed attempt too. Next one should be scheduled: there
+            #   will be no on_connection_lost() call for this connection
+            print('CAN NOT CONNECT TO THE SERVER ({}): {}'.format(server_address, err))
+            if server_address in global_data.clients_per_server:
+                del global_data.clients_per_server[server_address]
+            self.is_normal_reconnection = False
+            self.schedule_reconnection()
 
     def mark_this_connection_as_connection_to_destination_server(self):
         self.connected_to_destination_server = True
+        self.global_data.reconnect_backoff.reset()
+        self.global_data.destination_server_connection = self.connection
         print()
         print('SUCCESSFULLY CONNECTED TO THE DESTINATION SERVER ({})'.format(self.server_address))
-        self.send_request__client_arrived()
+        for channel in sorted(self.global_data.channels):
+            self.send_request__join_channel(channel)
+        self.check_and_send_user_strings_to_the_server()
 
-    def send_request__client_arrived(self):
-        message = {
-            FieldName.name: RPCName.client_arrived,
-        }
-        bin_message = marshal.dumps(message)
+    def send_request__protocol_version(self):
+        bin_message = encode_rpc__protocol_version(MIN_PROTOCOL_VERSION, PROTOCOL_VERSION)
+        packed_message = pack_message(bin_message)
+        self.connection.add_must_be_written_data(packed_message)
+
+    def send_request__client_bootstrap(self):
+        bin_message = encode_rpc(RPCName.client_bootstrap, self.global_data.number_of_redirects,
+                                 version=self.output_protocol_version)
         packed_message = pack_message(bin_message)
         self.connection.add_must_be_written_data(packed_message)
 
     def send_request__give_me_clients_per_server(self):
-        message = {
-            FieldName.name: RPCName.give_me_clients_per_server,
-        }
-        bin_message = marshal.dumps(message)
+        bin_message = encode_rpc(RPCName.give_me_clients_per_server, version=self.output_protocol_version)
         packed_message = pack_message(bin_message)
         self.connection.add_must_be_written_data(packed_message)
 
     def send_request__client_string(self, string: str):
-        message = {
-            FieldName.name: RPCName.client_string,
-            FieldName.string: string
-        }
-        bin_message = marshal.dumps(message)
+        bin_message = encode_rpc(RPCName.client_string, string, version=self.output_protocol_version)
         packed_message = pack_message(bin_message)
         self.connection.add_must_be_written_data(packed_message)
 
-    def input_message_handler(self, message: bytes):
-        message = marshal.loads(message)
-        if message[FieldName.name] in self.input_rpc_handlers:
-            self.input_rpc_handlers[message[FieldName.name]](message)
+    def send_request__join_channel(self, channel: str):
+        bin_message = encode_rpc(RPCName.join_channel, channel, version=self.output_protocol_version)
+        self.connection.add_must_be_written_data(pack_message(bin_message))
+
+    def send_request__leave_channel(self, channel: str):
+        bin_message = encode_rpc(RPCName.leave_channel, channel, version=self.output_protocol_version)
+        self.connection.add_must_be_written_data(pack_message(bin_message))
+
+    def send_request__channel_string(self, channel: str, string: str):
+        bin_message = encode_rpc(RPCName.channel_string, channel, string, version=self.output_protocol_version)
+        self.connection.add_must_be_written_data(pack_message(bin_message))
+
+    def input_message_handler(self, message):
+        try:
+            rpc_name, fields = decode_rpc(message, self.input_protocol_version)
+        except WrongRPCMessage as err:
+            print('WRONG RPC: {}'.format(err))
+            return
+
+        if rpc_name in self.input_rpc_handlers:
+            self.input_rpc_handlers[rpc_name](*fields)
         else:
-            print('WRONG RPC: {}'.format(message))
+            print('WRONG RPC: {}'.format(rpc_name))
 
     def prepare_input_rpc_handlers(self):
         self.input_rpc_handlers = {
             RPCName.clients_per_server: self.rpc_input__clients_per_server,
+            RPCName.client_accepted: self.rpc_input__client_accepted,
+            RPCName.best_server: self.rpc_input__best_server,
             RPCName.print_string: self.rpc_input__print_string,
+            RPCName.print_channel_string: self.rpc_input__print_channel_string,
+            RPCName.protocol_version: self.rpc_input__protocol_version,
         }
 
-    def rpc_input__clients_per_server(self, message):
-        self.global_data.clients_per_server = message[FieldName.clients_per_server]
-        server_address = min(self.global_data.clients_per_server, key=self.global_data.clients_per_server.get)
-        if server_address != self.server_address:
-            # if this is not the best server - reconnect to the best server
-            self.is_normal_reconnection = True
+    def rpc_input__protocol_version(self, min_version, max_version):
+        # Response to the own request: both fields are the version chosen by the server. Server will encode the rest
+        # of its messages by it
+        if not (MIN_PROTOCOL_VERSION <= max_version <= PROTOCOL_VERSION):
+            print('INCOMPATIBLE PROTOCOL VERSION OF THE SERVER: {}'.format(max_version))
             self.api.remove_connection(self.connection)
-        else:
-            # this is already the best server. We can start working now
-            self.mark_this_connection_as_connection_to_destination_server()
-
-    def rpc_input__print_string(self, message):
-        string = message[FieldName.string]
+            return
+        self.input_protocol_version = max_version
+        # Confirmation: the rest of the own messages will be encoded by the chosen version
+        bin_message = encode_rpc__protocol_version(max_version, max_version)
+        self.connection.add_must_be_written_data(pack_message(bin_message))
+        self.output_protocol_version = max_version
+
+    def rpc_input__client_accepted(self):
+        # this is already the best server (or the client was redirected here). We can start working now
+        self.global_data.number_of_redirects = 0
+        self.mark_this_connection_as_connection_to_destination_server()
+        if not self.is_clients_per_server_fresh():
+            # for the reconnection after the server fault and for the next start of the client: it is not needed to
+            #   start working
+            self.send_request__give_me_clients_per_server()
+
+    def rpc_input__best_server(self, server_address):
+        # redirect: this server is overloaded
+        self.global_data.redirect_address = server_address
+        self.is_normal_reconnection = True
+        self.api.remove_connection(self.connection)
+
+    def rpc_input__clients_per_server(self, clients_per_server):
+        global_data = self.global_data
+        global_data.clients_per_server = clients_per_server
+        global_data.clients_per_server_time = time.time()
+        if global_data.load_map_cache_file is not None:
+            save_cached_clients_per_server(global_data.load_map_cache_file, clients_per_server,
+                                           global_data.clients_per_server_time)
+
+    def rpc_input__print_string(self, string):
         print('IN: "{}"'.format(string))
 
+    def rpc_input__print_channel_string(self, channel, string):
+        print('IN #{}: "{}"'.format(channel, string))
+
 
 class ConsoleInputThread(Thread):
-    def __init__(self, global_data: GlobalDataForAllWorkers, exit_phrase):
+    def __init__(self, global_data: GlobalDataForAllWorkers, api: NetIOUserApi, exit_phrase):
         super().__init__()
         self.global_data = global_data
+        self.api = api
         self.exit_phrase = exit_phrase
 
     def run(self):
+        # User input is handed to the IO loop thread: loop is waked up only when there is a new string
         while True:
             new_string = input()
             if self.exit_phrase == new_string:
-                with self.global_data.lock_for__need_to_exit:
-                    self.global_data.need_to_exit = True
+                self.api.call_soon_threadsafe(MainWorker.on_user_exit, self.global_data, self.api)
                 break
-            with self.global_data.lock_for__input_messages:
-                self.global_data.input_messages.append(new_string)
+            self.api.call_soon_threadsafe(MainWorker.on_user_string, self.global_data, new_string)
 
 
 class Client(Process):
-    def __init__(self, all_servers_list: list=None):
+    def __init__(self, all_servers_list: list=None, load_map_cache_file=DEFAULT_LOAD_MAP_CACHE_FILE,
+                 load_map_cache_ttl=DEFAULT_LOAD_MAP_CACHE_TTL, reconnect_base_delay=DEFAULT_RECONNECT_BASE_DELAY,
+                 reconnect_max_delay=DEFAULT_RECONNECT_MAX_DELAY,
+                 max_connect_attempts_per_second=DEFAULT_MAX_CONNECT_ATTEMPTS_PER_SECOND):
+        '''
+        :param all_servers_list: addresses of all cluster servers. Will be loaded from server_list.txt if not provided
+        :param load_map_cache_file: numbers of clients of all servers are saved to this file, so the next start of
+            the client will connect to the good server right away. None: numbers are not saved
+        :param load_map_cache_ttl: cached numbers of clients older than this (seconds) are not used
+        :param reconnect_base_delay: min delay (seconds) of the reconnection after the failed or lost connection. Each
+            next failure in a row gives a bigger random delay (see DecorrelatedJitterBackoff)
+        :param reconnect_max_delay: max delay of the reconnection, seconds. 0: reconnect right away
+        :param max_connect_attempts_per_second: connect attempts of this process are delayed if they are made more
+            often (after the burst of DEFAULT_CONNECT_ATTEMPTS_BURST attempts). None: there is no limit
+        '''
         super().__init__()
         self.all_servers_list = all_servers_list
         if self.all_servers_list is None:
@@ -238,29 +438,49 @@ class Client(Process):
 
         self.global_data = GlobalDataForAllWorkers()
         self.global_data.all_servers_list = self.all_servers_list
+        self.global_data.load_map_cache_file = load_map_cache_file
+        self.global_data.load_map_cache_ttl = load_map_cache_ttl
+        self.global_data.reconnect_backoff = DecorrelatedJitterBackoff(reconnect_base_delay, reconnect_max_delay)
+        self.global_data.connect_attempt_limiter = ConnectAttemptLimiter(max_connect_attempts_per_second)
         self.exit_phrase = 'exit'
 
     def run(self):
         print('!!!!!')
         print('ENTER \'{}\' TO EXIT'.format(self.exit_phrase))
+        print('CHANNELS: \'{}channel\', \'{}channel\', \'{}channel text\''.format(
+            JOIN_COMMAND, LEAVE_COMMAND, SAY_COMMAND))
         print('!!!!!')
         print()
 
-        input_thread = ConsoleInputThread(self.global_data, self.exit_phrase)
+        io = NetIO(IOMethodEpollLT)
+
+        input_thread = ConsoleInputThread(self.global_data, io, self.exit_phrase)
         input_thread.daemon = True
         input_thread.start()
 
-        io = NetIO(IOMethodEpollLT)
         with net_io(io) as io:
-            server_number = randint(0, len(self.all_servers_list) - 1)
-            server_address = self.all_servers_list[server_number]
-            print('TRYING TO CONNECT TO THE RANDOM CLUSTER SERVER ({})'.format(server_address))
-            worker_for_server_connection = MainWorker(self.global_data)
-            worker_for_server_connection.server_address = server_address
-            main_server_connection_info = ConnectionInfo(worker_for_server_connection,
-                                                         ConnectionType.active_connected,
-                                                         server_address)
-            io.make_connection(main_server_connection_info)
+            clients_per_server = dict()
+            if self.global_data.load_map_cache_file is not None:
+                clients_per_server, received_time = load_cached_clients_per_server(
+                    self.global_data.load_map_cache_file, self.global_data.load_map_cache_ttl)
+                # Cache may be left by the client of another cluster
+                all_servers = set(self.all_servers_list)
+                clients_per_server = {address: number_of_clients for address, number_of_clients
+                                      in clients_per_server.items() if address in all_servers}
+            if clients_per_server:
+                self.global_data.clients_per_server = clients_per_server
+                self.global_data.clients_per_server_time = received_time
+                server_address = choose_server(clients_per_server)
+                print('TRYING TO CONNECT TO THE CLUSTER SERVER FROM THE CACHE ({})'.format(server_address))
+            else:
+                server_number = randint(0, len(self.all_servers_list) - 1)
+                server_address = self.all_servers_list[server_number]
+                print('TRYING TO CONNECT TO THE RANDOM CLUSTER SERVER ({})'.format(server_address))
+            self.global_data.connect_attempt_limiter.reserve()
+            # Worker without the connection: it will schedule the reconnection if the connection can not be made
+            starting_worker = MainWorker(self.global_data)
+            starting_worker.api = io
+            starting_worker.make_connection_to_the_server(server_address)
 
 
 def main():
@@ -0,0 +1,103 @@
+import heapq
+import itertools
+import random
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Choice of the server for the client. Server keeps numbers of clients of all cluster servers in the ServerLoads: least
+loaded server is found in O(log N) instead of the min() over all servers. Client uses the choose_server(): "power of
+two choices" with jitter instead of the least loaded server, so clients that reconnect at once (after the fault of
+their server) are spread over the cluster instead of all going to the same server.
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+DEFAULT_NUMBER_OF_CHOICES = 2
+DEFAULT_LOAD_JITTER = 0.1  # relative
+
+
+class ServerLoads(dict):
+    '''
+    Dict {server address: number of clients} with the heap of its items. Heap is updated lazily: changed or removed
+    item stays in the heap until it will be on the top (or until the heap will be rebuilt), so each change is O(log N).
+    Removal (del, pop()) does not touch the heap at all
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # (load, insertion counter, address) items. Counter keeps the addresses of the different kinds (tuples and
+        #   AF_UNIX paths) from being compared
+        self.heap = list()
+        self.counter = itertools.count()
+        self.rebuild_heap()
+
+    def __setitem__(self, address, load):
+        super().__setitem__(address, load)
+        heapq.heappush(self.heap, (load, next(self.counter), address))
+        if len(self.heap) > 2 * len(self) + 16:
+            self.rebuild_heap()
+
+    def setdefault(self, address, load=None):
+        if address not in self:
+            self[address] = load
+        return self[address]
+
+    def update(self, *args, **kwargs):
+        for address, load in dict(*args, **kwargs).items():
+            self[address] = load
+
+    def clear(self):
+        super().clear()
+        self.heap = list()
+
+    def rebuild_heap(self):
+        self.heap = [(load, next(self.counter), address) for address, load in self.items()]
+        heapq.heapify(self.heap)
+
+    def get_least_loaded(self):
+        '''
+        :return: address of the server with the least number of clients. None if there are no servers
+        '''
+        heap = self.heap
+        while heap:
+            load, counter, address = heap[0]
+            if (address in self) and (self[address] == load):
+                return address
+            # Stale item: server was removed or its load was changed after this item was added
+            heapq.heappop(heap)
+        return None
+
+
+def choose_server(clients_per_server: dict, current_server=None, number_of_choices=DEFAULT_NUMBER_OF_CHOICES,
+                  jitter=DEFAULT_LOAD_JITTER, random_generator=random):
+    '''
+    "Power of d choices": the least loaded of the few randomly sampled servers. Loads are compared with the random
+    jitter, so the servers with close loads are chosen with close probabilities
+    :param clients_per_server: {server address: number of clients}
+    :param current_server: server the client is connected to (if any). It is always one of the candidates
+    :param number_of_choices: number of candidates (including the current server)
+    :param jitter: relative amplitude of the random jitter added to the load of each candidate
+    :param random_generator: random.Random object (or the random module)
+    :return: chosen server address. None if there are no servers
+    '''
+    if not clients_per_server:
+        return None
+
+    candidates = list()
+    if current_server in clients_per_server:
+        candidates.append(current_server)
+    other_servers = [address for address in clients_per_server if address != current_server]
+    candidates.extend(random_generator.sample(other_servers,
+                                              min(number_of_choices - len(candidates), len(other_servers))))
+    best_server = None
+    best_load = None
+    for address in candidates:
+        load = clients_per_server[address]
+        load += random_generator.uniform(0, jitter * (load + 1))
+        if (best_load is None) or (load < best_load):
+            best_server = address
+            best_load = load
+    return best_server
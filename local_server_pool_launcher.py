@@ -16,7 +16,8 @@ def main():
     print('THERE ARE WILL BE STARTED {} SERVER PROCESSES'.format(len(all_server_list)))
 
     for server_address in all_server_list:
-        server = Server(server_address, all_server_list)
+        # All servers are on the same host: they will exchange messages through the shared memory
+        server = Server(server_address, all_server_list, use_shared_memory=True)
         processes_list.append(server)
         server.start()
 
@@ -1,5 +1,9 @@
 from net_io_abstract import *
+from net_io_timer_wheel import TimerWheel
+import os
+import stat
 import sys
+import time
 import traceback
 
 
@@ -22,8 +26,29 @@ class NetIO(NetIOBase):
 
         self.need_to_print_exceptions_info = False
 
+        self.max_read_size = DEFAULT_MAX_READ_SIZE  # cap for the adaptive read size of the connections
+        self.accept_batch_size = DEFAULT_ACCEPT_BATCH_SIZE  # max number of accept() calls per one "ready to read"
+        #   event of the passive socket (level-triggered IOMethods only)
+
+        # If True - new output data will be sent immediately (see check_is_connection_need_to_sent_data()).
+        #   Can be overridden by the Connection.write_through
+        self.write_through = False
+
+        self.timers = TimerWheel(time.monotonic)
+        self.max_poll_timeout = 1  # seconds. IO loop will wait for events not longer than this time
+
+        self._threadsafe_calls = deque()
+        self._wakeup_read_fd, self._wakeup_write_fd = self._make_wakeup_fds()
+        self.add_reader(self._wakeup_read_fd, self._on_wakeup)
+
     def destroy(self):
         self.method.destroy()
+        for connection in self.passive_connections:
+            if socket.AF_UNIX == connection.connection_info.socket_family:
+                self._remove_unix_socket_file(connection.connection_info.socket_address)
+        os.close(self._wakeup_read_fd)
+        if self._wakeup_write_fd != self._wakeup_read_fd:
+            os.close(self._wakeup_write_fd)
 
     def start(self, destroy_on_finish=True):
         if self._already_begun:
@@ -32,7 +57,8 @@ class NetIO(NetIOBase):
         self._already_begun = True
         try:
             while not self._need_to_stop:
-                self.method.loop_iteration()
+                self.method.loop_iteration(self.timers.get_timeout(self.max_poll_timeout))
+                self._run_expired_timers()
         finally:
             self._already_begun = False
             if destroy_on_finish:
@@ -40,6 +66,89 @@ class NetIO(NetIOBase):
 
     def stop(self):
         self._need_to_stop = True
+        self._wakeup()
+
+    def time(self):
+        return self.timers.time()
+
+    def call_later(self, delay, callback, *args):
+        return self.timers.call_later(delay, callback, *args)
+
+    def call_at(self, when, callback, *args):
+        return self.timers.call_at(when, callback, *args)
+
+    def cancel_timer(self, timer_handle):
+        self.timers.cancel(timer_handle)
+
+    def _run_expired_timers(self):
+        for timer_handle in self.timers.get_expired():
+            if timer_handle.cancelled:
+                continue
+            timer_handle.cancelled = True  # expired: further cancel_timer() calls should do nothing
+            try:
+                timer_handle.callback(*timer_handle.args)
+            except:
+                if __debug__: self.log_exception()
+
+    def call_soon_threadsafe(self, callback, *args):
+        self._threadsafe_calls.append((callback, args))
+        self._wakeup()
+
+    def add_reader(self, fileno, callback):
+        self.reader_by_fileno[fileno] = callback
+        self.method.add_reader(fileno)
+
+    def remove_reader(self, fileno):
+        if fileno in self.reader_by_fileno:
+            del self.reader_by_fileno[fileno]
+            self.method.remove_reader(fileno)
+
+    def on_reader_ready(self, fileno):
+        callback = self.reader_by_fileno.get(fileno)
+        if callback is None:
+            return
+        try:
+            callback()
+        except:
+            if __debug__: self.log_exception()
+
+    @staticmethod
+    def _make_wakeup_fds()->tuple:
+        # eventfd (Linux 2.6.22+, Python 3.10+) or self-pipe
+        if hasattr(os, 'eventfd'):
+            fd = os.eventfd(0, os.EFD_NONBLOCK | os.EFD_CLOEXEC)
+            return fd, fd
+        read_fd, write_fd = os.pipe()
+        os.set_blocking(read_fd, False)
+        os.set_blocking(write_fd, False)
+        return read_fd, write_fd
+
+    def _wakeup(self):
+        try:
+            if self._wakeup_read_fd == self._wakeup_write_fd:
+                os.eventfd_write(self._wakeup_write_fd, 1)
+            else:
+                os.write(self._wakeup_write_fd, b'\0')
+        except BlockingIOError:
+            pass  # already signaled: counter (or pipe buffer) is full
+
+    def _on_wakeup(self):
+        try:
+            if self._wakeup_read_fd == self._wakeup_write_fd:
+                os.eventfd_read(self._wakeup_read_fd)
+            else:
+                while os.read(self._wakeup_read_fd, 4096):
+                    pass
+        except BlockingIOError:
+            pass
+
+        threadsafe_calls = self._threadsafe_calls
+        while threadsafe_calls:
+            callback, args = threadsafe_calls.popleft()
+            try:
+                callback(*args)
+            except:
+                if __debug__: self.log_exception()
 
     def make_connection(self, connection_info: ConnectionInfo=None, name=None)->Connection:
         new_connection = None
@@ -60,6 +169,9 @@ class NetIO(NetIOBase):
             self.connection_by_name[connection.connection_name] = connection
         self.connection_by_fileno[connection.conn.fileno()] = connection
 
+        if connection.read_data.max_read_size is None:
+            connection.read_data.max_read_size = self.max_read_size
+
         if connection.worker_obj.api is None:
             connection.worker_obj.api = self
         if connection.worker_obj.connection is None:
@@ -73,24 +185,32 @@ class NetIO(NetIOBase):
         self.method.set__should_be_closed(connection.conn)
 
     def on_accept_connection(self, connection):
-        new_conn = None
-        try:
-            conn_and_address_pair = connection.conn.accept()
-            new_conn, new_address = conn_and_address_pair
-            new_connection = self._construct_active_accepted_connection(connection, conn_and_address_pair)
-            self.add_connection(new_connection)
+        # Up to accept_batch_size connections per event. Edge-triggered IOMethod needs to drain the accept queue
+        #   until EAGAIN, so there is no limit for it
+        number_of_accepts_left = self.accept_batch_size
+        while self.method.edge_triggered or (number_of_accepts_left > 0):
+            number_of_accepts_left -= 1
+            new_conn = None
             try:
-                new_connection.worker_obj.on_connect()
-                self.check_is_connection_need_to_sent_data(new_connection)
+                conn_and_address_pair = connection.conn.accept()
+                self.stats.accept_calls += 1
+                new_conn, new_address = conn_and_address_pair
+                new_conn.setblocking(0)
+                new_connection = self._construct_active_accepted_connection(connection, conn_and_address_pair)
+                self.add_connection(new_connection)
+                try:
+                    new_connection.worker_obj.on_connect()
+                    self.check_is_connection_need_to_sent_data(new_connection)
+                except:
+                    if __debug__: self.log_exception()
+                    self._set_connection_to_be_closed(new_connection, ConnectionState.worker_fault)
+            except BlockingIOError:
+                self.stats.accept_calls += 1
+                break
             except:
                 if __debug__: self.log_exception()
-                self._set_connection_to_be_closed(new_connection, ConnectionState.worker_fault)
-        except BlockingIOError:
-            pass
-        except:
-            if __debug__: self.log_exception()
-            if new_conn is not None:
-                self.method.should_be_closed.add(new_conn)
+                if new_conn is not None:
+                    self.method.should_be_closed.add(new_conn)
 
     def on_connected(self, connection: Connection):
         connection.connection_state = ConnectionState.connected
@@ -101,46 +221,75 @@ class NetIO(NetIOBase):
             if __debug__: self.log_exception()
             self._set_connection_to_be_closed(connection, ConnectionState.worker_fault)
 
-    def on_read(self, connection: Connection):
+    def on_read(self, connection: Connection, drain=False):
+        is_new_data_was_read = False
+        is_eof = False
         try:
-            another_read_data_part = connection.conn.recv(1024)
-            if another_read_data_part:
-                connection.read_data += another_read_data_part
-                try:
-                    connection.worker_obj.on_read()
-                    self.check_is_connection_need_to_sent_data(connection)
-                except:
-                    if __debug__: self.log_exception()
-                    self._set_connection_to_be_closed(connection, ConnectionState.worker_fault)
-            else:
-                self._set_connection_to_be_closed(connection, ConnectionState.io_fault)
+            while True:
+                number_of_read_bytes = connection.read_data.recv_from(connection.conn)
+                self.stats.recv_calls += 1
+                if number_of_read_bytes:
+                    is_new_data_was_read = True
+                else:
+                    is_eof = True
+                    break
+                if not (self.method.edge_triggered or drain):
+                    break
         except BlockingIOError:
-            pass
+            self.stats.recv_calls += 1
         except:
             if __debug__: self.log_exception()
+            is_eof = True
+
+        if is_new_data_was_read:
+            try:
+                connection.worker_obj.on_read()
+                self.check_is_connection_need_to_sent_data(connection)
+            except:
+                if __debug__: self.log_exception()
+                self._set_connection_to_be_closed(connection, ConnectionState.worker_fault)
+                return
+        if is_eof:
             self._set_connection_to_be_closed(connection, ConnectionState.io_fault)
 
     def on_write(self, connection: Connection):
         try:
-            if connection.must_be_written_data:
-                nsent = connection.conn.send(connection.must_be_written_data)
-                connection.must_be_written_data = connection.must_be_written_data[nsent:]
-            if not connection.must_be_written_data:
+            while True:
+                output_buffer = connection.output_buffer
+                while output_buffer:
+                    nsent = connection.conn.sendmsg(output_buffer.get_chunks())
+                    self.stats.send_calls += 1
+                    output_buffer.consume(nsent)
+                    if not self.method.edge_triggered:
+                        break
+                if output_buffer.is_bounded:
+                    self._check_output_watermarks(connection)
+                if output_buffer:
+                    break
                 try:
                     connection.worker_obj.on_no_more_data_to_write()
                     self.check_is_connection_need_to_sent_data(connection)
                 except:
                     if __debug__: self.log_exception()
                     self._set_connection_to_be_closed(connection, ConnectionState.worker_fault)
+                    break
+                if (not self.method.edge_triggered) or (not connection.output_buffer) or \
+                        connection.force_write_call:
+                    # In the edge-triggered mode we need to write newly added data right now: there will be no
+                    # additional EPOLLOUT notification for an already writable socket
+                    break
         except BlockingIOError:
-            pass
+            self.stats.send_calls += 1
         except:
             if __debug__: self.log_exception()
             self._set_connection_to_be_closed(connection, ConnectionState.io_fault)
 
     def on_close(self, connection: Connection):
+        is_passive_connection = connection in self.passive_connections
         self._remove_connection_from_internal_structures(connection)
         connection.conn.close()
+        if is_passive_connection and (socket.AF_UNIX == connection.connection_info.socket_family):
+            self._remove_unix_socket_file(connection.connection_info.socket_address)
         connection.connection_state = ConnectionState.disconnected
         try:
             connection.worker_obj.on_connection_lost()
@@ -159,29 +308,43 @@ class NetIO(NetIOBase):
         new_worker_obj = copy.copy(base_passive_connection.worker_obj)
         new_worker_obj.api = None
         new_worker_obj.connection = None
+        base_connection_info = base_passive_connection.connection_info
         new_connection_info = ConnectionInfo(new_worker_obj,
                                              ConnectionType.active_accepted,
-                                             address, conn.family, conn.type, conn.proto)
+                                             address, conn.family, conn.type, conn.proto,
+                                             output_high_watermark=base_connection_info.output_high_watermark,
+                                             output_low_watermark=base_connection_info.output_low_watermark,
+                                             output_overflow_policy=base_connection_info.output_overflow_policy)
         new_connection = Connection(self._get_new_connection_id(), new_connection_info, conn_and_address_pair,
                                     ConnectionState.connected)
         return new_connection
 
     def _make_active_connected_connection(self, connection_info: ConnectionInfo=None, name=None)->Connection:
-        conn = None
+        conn = socket.socket(connection_info.socket_family, connection_info.socket_type,
+                             connection_info.socket_protocol, connection_info.socket_fileno)
         try:
-            conn = socket.socket(connection_info.socket_family, connection_info.socket_type,
-                                 connection_info.socket_protocol, connection_info.socket_fileno)
             conn.setblocking(0)
+            self._set_socket_options(conn, connection_info)
+        except:
+            conn.close()
+            raise
+        is_connection_failed = False
+        try:
             conn.connect(connection_info.socket_address)
         except (socket.error, OSError) as err:
             if err.errno not in {errno.EINPROGRESS, errno.EAGAIN}:
-                conn.close()
-                raise err
+                # AF_UNIX socket (and TCP one in some cases) fails synchronously (ENOENT, ECONNREFUSED, etc.). This is
+                #   processed as an asynchronous failure: connection will be closed by the loop and its
+                #   WorkerBase.on_connection_lost() will be called
+                is_connection_failed = True
         conn_and_address_pair = (conn, connection_info.socket_address)
         new_connection = Connection(self._get_new_connection_id(), connection_info, conn_and_address_pair,
                                     ConnectionState.waiting_for_connection, name)
         self.add_connection(new_connection)
-        self.method.set__need_write(new_connection.conn, True)
+        if is_connection_failed:
+            self._set_connection_to_be_closed(new_connection, ConnectionState.io_fault)
+        else:
+            self.method.set__need_write(new_connection.conn, True)
         return new_connection
 
     def _make_passive_connection(self, connection_info: ConnectionInfo=None, name=None)->Connection:
@@ -190,6 +353,9 @@ class NetIO(NetIOBase):
             conn = socket.socket(connection_info.socket_family, connection_info.socket_type,
                                  connection_info.socket_protocol, connection_info.socket_fileno)
             conn.setblocking(0)
+            self._set_socket_options(conn, connection_info)
+            if socket.AF_UNIX == connection_info.socket_family:
+                self._remove_stale_unix_socket_file(connection_info.socket_address)
             conn.bind(connection_info.socket_address)
             conn.listen(connection_info.backlog)
         except:
@@ -209,6 +375,41 @@ class NetIO(NetIOBase):
 
         return new_connection
 
+    @staticmethod
+    def _remove_stale_unix_socket_file(socket_address):
+        # Socket file is left after the crash (or after the kill) of the previous server. It should be removed before
+        #   bind(). But only if there is no live server on it: bind() will raise EADDRINUSE in this case
+        if not is_unix_socket_file_address(socket_address):
+            return
+        try:
+            if not stat.S_ISSOCK(os.stat(socket_address).st_mode):
+                return
+        except FileNotFoundError:
+            return
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(socket_address)
+        except ConnectionRefusedError:
+            NetIO._remove_unix_socket_file(socket_address)
+        except OSError:
+            pass
+        finally:
+            probe.close()
+
+    @staticmethod
+    def _remove_unix_socket_file(socket_address):
+        if not is_unix_socket_file_address(socket_address):
+            return
+        try:
+            os.unlink(socket_address)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def _set_socket_options(conn: socket.socket, connection_info: ConnectionInfo):
+        for level, option, value in connection_info.socket_options:
+            conn.setsockopt(level, option, value)
+
     def _remove_connection_from_internal_structures(self, connection: Connection):
         if connection in self.all_connections:
             self.all_connections.remove(connection)
@@ -228,13 +429,68 @@ class NetIO(NetIOBase):
         self.method.set__should_be_closed(connection.conn)
 
     def check_is_connection_need_to_sent_data(self, connection: Connection):
+        # Write-through mode: if output queue was empty (EPOLLOUT is not armed) we will try to send new data right now
+        #   and will arm EPOLLOUT only for the remainder. This saves one loop iteration of latency and two epoll_ctl
+        #   calls. Note that WorkerBase.on_no_more_data_to_write() is not called for the data that was sent this way.
+        if connection.must_be_written_data and (ConnectionState.connected == connection.connection_state):
+            write_through = connection.write_through
+            if write_through is None:
+                write_through = self.write_through
+            if write_through and (not self.method.get__need_write(connection.conn)):
+                self._write_through(connection)
+
+        if connection.output_buffer.is_bounded:
+            self._check_output_watermarks(connection)
+
         if connection.must_be_written_data or connection.force_write_call:
-            if not isinstance(connection.must_be_written_data, memoryview):
-                connection.must_be_written_data = memoryview(connection.must_be_written_data)
             self.method.set__need_write(connection.conn, True)
         else:
             self.method.set__need_write(connection.conn, False)
 
+    def _write_through(self, connection: Connection):
+        output_buffer = connection.output_buffer
+        try:
+            while output_buffer:
+                nsent = connection.conn.sendmsg(output_buffer.get_chunks())
+                self.stats.send_calls += 1
+                output_buffer.consume(nsent)
+        except BlockingIOError:
+            self.stats.send_calls += 1
+        except:
+            if __debug__: self.log_exception()
+            output_buffer.clear()
+            self._set_connection_to_be_closed(connection, ConnectionState.io_fault)
+
+    def _check_output_watermarks(self, connection: Connection):
+        # Reports changes of the paused state of the bounded output queue to the worker and closes the overflowed
+        #   connection (see BoundedOutputBuffer)
+        output_buffer = connection.output_buffer
+        if output_buffer.is_overflowed:
+            if ConnectionState.connected == connection.connection_state:
+                output_buffer.clear()
+                self._set_connection_to_be_closed(connection, ConnectionState.output_overflow)
+            return
+
+        if output_buffer.is_writing_paused == connection.is_writing_paused:
+            return
+        connection.is_writing_paused = output_buffer.is_writing_paused
+        try:
+            if connection.is_writing_paused:
+                connection.worker_obj.on_pause_writing()
+            else:
+                connection.worker_obj.on_resume_writing()
+        except:
+            if __debug__: self.log_exception()
+            self._set_connection_to_be_closed(connection, ConnectionState.worker_fault)
+
+    def broadcast(self, connections, data, droppable=False):
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        shared_data = memoryview(data)
+        for connection in connections:
+            connection.output_buffer.add(shared_data, droppable)
+            self.check_is_connection_need_to_sent_data(connection)
+
     def log_exception(self):
         if not self.need_to_print_exceptions_info:
             return
@@ -2,6 +2,9 @@ import socket
 import errno
 import copy
 import enum
+import os
+import itertools
+from collections import deque
 from contextlib import contextmanager
 
 """
@@ -48,6 +51,39 @@ class ConnectionState(enum.Enum):
     io_fault = 4  # there was some IO trouble
     waiting_for_disconnection = 5  # connection was marked as "should be closed" but was not closed yet
     disconnected = 6  # socket is closed
+    output_overflow = 7  # output queue has exceeded its high watermark (see OutputOverflowPolicy.disconnect)
+
+
+class OutputOverflowPolicy(enum.Enum):
+    drop_oldest = 0  # oldest droppable data is removed from the queue to make room for the new one
+    drop_newest = 1  # new droppable data is not added to the full queue
+    disconnect = 2  # slow consumer is disconnected
+
+
+def get_socket_family(socket_address):
+    '''
+    :param socket_address: socket address: path (str or bytes) for the AF_UNIX, (host, port) for the AF_INET,
+        (host, port, flowinfo, scope_id) or (host_with_colons, port) for the AF_INET6
+    :return: socket family
+    '''
+    if isinstance(socket_address, (str, bytes)):
+        return socket.AF_UNIX
+    if isinstance(socket_address, tuple):
+        if (4 == len(socket_address)) or ((2 == len(socket_address)) and (':' in str(socket_address[0]))):
+            return socket.AF_INET6
+    return socket.AF_INET
+
+
+def is_unix_socket_file_address(socket_address):
+    '''
+    :param socket_address: socket address
+    :return: True if it is a path of the AF_UNIX socket file (not an address in the abstract namespace)
+    '''
+    if isinstance(socket_address, str):
+        return bool(socket_address) and ('\0' != socket_address[0])
+    if isinstance(socket_address, bytes):
+        return bool(socket_address) and (0 != socket_address[0])
+    return False
 
 
 class ConnectionInfo:
@@ -55,31 +91,339 @@ class ConnectionInfo:
                  worker_obj,
                  connection_type: ConnectionType,
                  socket_address=None,
-                 socket_family=socket.AF_INET,
+                 socket_family=None,
                  socket_type=socket.SOCK_STREAM,
                  socket_protocol=0,
                  socket_fileno=None,
-                 backlog=0):
+                 backlog=0,
+                 socket_options=None,
+                 output_high_watermark=None,
+                 output_low_watermark=None,
+                 output_overflow_policy=OutputOverflowPolicy.drop_oldest):
         '''
         :param worker_obj: constructed worker object (see WorkerBase for more info). If this is a passive
             connection - it (worker_obj) will be inherited by the descendant active_accepted connections
             by copy.copy() call (see WorkerBase.__copy__() method for more info)
         :param connection_type: see ConnectionType() description
         :param socket_address:  see socket.bind()/socket.connect() docs
-        :param socket_family: see socket.socket() docs
+        :param socket_family: see socket.socket() docs. Will be derived from the socket_address if None (see
+            get_socket_family())
         :param socket_type: see socket.socket() docs
         :param socket_protocol: see socket.socket() docs
         :param socket_fileno: see socket.socket() docs
         :param backlog: see socket.listen() docs
+        :param socket_options: list of (level, option, value) tuples. They will be set by socket.setsockopt() before
+            bind() (or connect()) call. For example [(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)]
+        :param output_high_watermark: max number of bytes in the output queue of the connection (see
+            BoundedOutputBuffer). None - queue is unbounded. If this is a passive connection - watermarks and policy
+            will be inherited by the descendant active_accepted connections
+        :param output_low_watermark: WorkerBase.on_resume_writing() will be called when the paused output queue will
+            drain to this number of bytes. Quarter of the output_high_watermark if None
+        :param output_overflow_policy: what to do with the droppable data that does not fit into the output queue
+            (see OutputOverflowPolicy)
         '''
         self.worker_obj = worker_obj
         self.connection_type = connection_type
         self.socket_address = socket_address
-        self.socket_family = socket_family
+        self.socket_family = socket_family if socket_family is not None else get_socket_family(socket_address)
         self.socket_type = socket_type
         self.socket_protocol = socket_protocol
         self.socket_fileno = socket_fileno
         self.backlog = backlog
+        self.socket_options = socket_options or list()
+        self.output_high_watermark = output_high_watermark
+        self.output_low_watermark = output_low_watermark
+        self.output_overflow_policy = output_overflow_policy
+
+
+def _get_iov_max():
+    try:
+        return os.sysconf('SC_IOV_MAX')
+    except (ValueError, OSError, AttributeError):
+        return 1024
+
+
+IOV_MAX = _get_iov_max()  # max number of buffers for the single sendmsg() (writev) call
+
+
+class OutputBuffer:
+    '''
+    Output queue of the connection: list of memoryview chunks waiting to be sent. Added data is never concatenated
+    or copied (except mutable bytearray objects - see add()); partially sent chunk is replaced by the memoryview
+    slice of it's unsent remainder.
+    Is False when there is nothing to send; len() returns number of pending bytes.
+    '''
+    is_bounded = False  # see BoundedOutputBuffer
+    dropped_bytes = 0
+    dropped_messages = 0
+
+    def __init__(self, data=None):
+        self.chunks = deque()
+        self.size = 0
+        if data:
+            self.add(data)
+
+    def __bool__(self):
+        return self.size > 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, data, droppable=False):
+        '''
+        Appends data to the end of the queue. Only a reference to the data is stored - so you may add the same
+        immutable (bytes) object to any number of queues.
+        :param data: bytes-like object. bytearray will be copied since it can be changed by the caller later
+        :param droppable: unbounded queue never drops data (see BoundedOutputBuffer.add())
+        :return:
+        '''
+        chunk = self.get_chunk(data)
+        if chunk.nbytes:
+            self.chunks.append(chunk)
+            self.size += chunk.nbytes
+
+    @staticmethod
+    def get_chunk(data)->memoryview:
+        '''
+        :param data: bytes-like object
+        :return: byte-formatted memoryview of the data (of its immutable copy for the bytearray)
+        '''
+        if isinstance(data, bytearray):
+            data = bytes(data)
+        chunk = data if isinstance(data, memoryview) else memoryview(data)
+        if 'B' != chunk.format:
+            chunk = chunk.cast('B')
+        return chunk
+
+    def get_chunks(self, max_number_of_chunks=IOV_MAX)->list:
+        '''
+        :param max_number_of_chunks: max size of the result list
+        :return: list of the first chunks (ready to be used as a sendmsg() buffers)
+        '''
+        if len(self.chunks) <= max_number_of_chunks:
+            return list(self.chunks)
+        return list(itertools.islice(self.chunks, max_number_of_chunks))
+
+    def consume(self, number_of_bytes: int):
+        '''
+        Removes already sent data from the beginning of the queue
+        :param number_of_bytes: number of sent bytes
+        :return:
+        '''
+        self.size -= number_of_bytes
+        chunks = self.chunks
+        while number_of_bytes:
+            head = chunks[0]
+            if head.nbytes <= number_of_bytes:
+                chunks.popleft()
+                number_of_bytes -= head.nbytes
+            else:
+                chunks[0] = head[number_of_bytes:]
+                number_of_bytes = 0
+
+    def clear(self):
+        self.chunks.clear()
+        self.size = 0
+
+
+class BoundedOutputBuffer(OutputBuffer):
+    '''
+    Output queue with the high and low watermarks. Droppable data (whole chat lines for example) that does not fit
+    below the high watermark is handled by the overflow policy (see OutputOverflowPolicy). Data that is not droppable
+    (control messages, chunks of the compressed stream) is always queued. Each added chunk is a whole message: partially
+    sent chunk is never dropped, so the peer will never get a broken frame.
+    Writing is paused (is_writing_paused) when the queue reaches the high watermark (or when its data was dropped)
+    and is resumed when it drains to the low watermark. See NetIO.check_is_connection_need_to_sent_data() and
+    WorkerBase.on_pause_writing().
+    '''
+    is_bounded = True
+
+    def __init__(self, high_watermark, low_watermark=None, policy=OutputOverflowPolicy.drop_oldest):
+        '''
+        :param high_watermark: max number of bytes in the queue (for the droppable data)
+        :param low_watermark: writing is resumed at this number of bytes. Quarter of the high_watermark if None
+        :param policy: see OutputOverflowPolicy
+        '''
+        self.high_watermark = high_watermark
+        self.low_watermark = (high_watermark // 4) if low_watermark is None else low_watermark
+        self.policy = policy
+        self.droppable_flags = deque()  # one flag per chunk
+        self.is_head_partially_sent = False
+        self.is_writing_paused = False
+        self.is_overflowed = False  # OutputOverflowPolicy.disconnect: connection should be closed
+        self.dropped_bytes = 0
+        self.dropped_messages = 0
+        super().__init__()
+
+    def add(self, data, droppable=False):
+        '''
+        Appends data to the end of the queue (see OutputBuffer.add())
+        :param data: bytes-like object: whole message (or some number of whole messages)
+        :param droppable: data may be dropped by the overflow policy
+        :return:
+        '''
+        chunk = self.get_chunk(data)
+        chunk_size = chunk.nbytes
+        if not chunk_size:
+            return
+
+        if droppable and (self.size + chunk_size > self.high_watermark):
+            self.is_writing_paused = True
+            policy = self.policy
+            if OutputOverflowPolicy.drop_oldest == policy:
+                self._drop_oldest(self.size + chunk_size - self.high_watermark)
+                if self.size + chunk_size > self.high_watermark:
+                    # There is not enough droppable data in the queue
+                    policy = OutputOverflowPolicy.drop_newest
+            if OutputOverflowPolicy.drop_newest == policy:
+                self.dropped_bytes += chunk_size
+                self.dropped_messages += 1
+                return
+            if OutputOverflowPolicy.disconnect == policy:
+                self.is_overflowed = True
+
+        self.chunks.append(chunk)
+        self.droppable_flags.append(droppable)
+        self.size += chunk_size
+        if self.size >= self.high_watermark:
+            self.is_writing_paused = True
+
+    def _drop_oldest(self, number_of_bytes):
+        # Queue is consumed from its beginning: kept chunks (partially sent head and the data that is not droppable)
+        #   are usually only a few, so this is O(number of dropped chunks)
+        chunks = self.chunks
+        droppable_flags = self.droppable_flags
+        kept_chunks = list()
+        kept_flags = list()
+        if self.is_head_partially_sent:
+            kept_chunks.append(chunks.popleft())
+            kept_flags.append(droppable_flags.popleft())
+        while (number_of_bytes > 0) and chunks:
+            chunk = chunks.popleft()
+            droppable = droppable_flags.popleft()
+            if droppable:
+                number_of_bytes -= chunk.nbytes
+                self.size -= chunk.nbytes
+                self.dropped_bytes += chunk.nbytes
+                self.dropped_messages += 1
+            else:
+                kept_chunks.append(chunk)
+                kept_flags.append(droppable)
+        chunks.extendleft(reversed(kept_chunks))
+        droppable_flags.extendleft(reversed(kept_flags))
+
+    def consume(self, number_of_bytes: int):
+        self.size -= number_of_bytes
+        chunks = self.chunks
+        droppable_flags = self.droppable_flags
+        while number_of_bytes:
+            head = chunks[0]
+            if head.nbytes <= number_of_bytes:
+                chunks.popleft()
+                droppable_flags.popleft()
+                number_of_bytes -= head.nbytes
+                self.is_head_partially_sent = False
+            else:
+                chunks[0] = head[number_of_bytes:]
+                number_of_bytes = 0
+                self.is_head_partially_sent = True
+        if self.is_writing_paused and (self.size <= self.low_watermark):
+            self.is_writing_paused = False
+
+    def clear(self):
+        super().clear()
+        self.droppable_flags.clear()
+        self.is_head_partially_sent = False
+        self.is_writing_paused = False
+
+
+DEFAULT_ACCEPT_BATCH_SIZE = 64
+DEFAULT_MIN_READ_SIZE = 4096
+DEFAULT_MAX_READ_SIZE = 256 * 1024
+
+
+class InputBuffer:
+    '''
+    Input buffer of the connection: preallocated bytearray filled by the socket.recv_into() calls.
+    Unread (not consumed yet) data is placed between self.start and self.end offsets. Consumers should take data by
+    get_data() (zero-copy memoryview) and report processed bytes by consume(). Memory is compacted (unread data
+    is moved to the beginning of the buffer) only if it's cheaper than growing: when the consumed prefix is not
+    smaller than the unread data to be moved.
+    Read size is adaptive: it grows twice after each read that has filled the whole requested space and shrinks
+    twice after reads that got less than a quarter of it.
+    '''
+    def __init__(self, min_read_size=DEFAULT_MIN_READ_SIZE, max_read_size=None):
+        '''
+        :param min_read_size: initial (and minimal) recv size
+        :param max_read_size: max recv size (cap for the adaptive read size). If None - it will be set by the IO object
+            (see NetIO.max_read_size)
+        '''
+        self.min_read_size = min_read_size
+        self.max_read_size = max_read_size
+        self.read_size = min_read_size
+        self.buffer = bytearray(min_read_size)
+        self.start = 0
+        self.end = 0
+
+    def __bool__(self):
+        return self.end > self.start
+
+    def __len__(self):
+        return self.end - self.start
+
+    def get_data(self)->memoryview:
+        '''
+        Memoryview is valid until the next recv_from() call. Do not store it (or it's slices) for later use.
+        :return: unread data
+        '''
+        return memoryview(self.buffer)[self.start:self.end]
+
+    def consume(self, number_of_bytes: int):
+        '''
+        Marks data as processed
+        :param number_of_bytes: number of bytes from the beginning of the unread data
+        :return:
+        '''
+        self.start += number_of_bytes
+        if self.start >= self.end:
+            self.start = 0
+            self.end = 0
+
+    def recv_from(self, conn: socket.socket)->int:
+        '''
+        Reads data from the socket into the buffer
+        :param conn: socket
+        :return: number of read bytes (zero on EOF)
+        :raise BlockingIOError: if there is no data in nonblocking socket
+        '''
+        read_size = self.read_size
+        self._reserve(read_size)
+        with memoryview(self.buffer) as buffer_view:
+            number_of_bytes = conn.recv_into(buffer_view[self.end:self.end + read_size], read_size)
+        self.end += number_of_bytes
+
+        if number_of_bytes >= read_size:
+            self.read_size = min(read_size * 2, self.max_read_size or DEFAULT_MAX_READ_SIZE)
+        elif number_of_bytes < (read_size >> 2):
+            self.read_size = max(read_size >> 1, self.min_read_size)
+        return number_of_bytes
+
+    def _reserve(self, number_of_bytes: int):
+        buffer = self.buffer
+        if len(buffer) - self.end >= number_of_bytes:
+            return
+
+        unread_size = self.end - self.start
+        if (self.start >= unread_size) and (len(buffer) - unread_size >= number_of_bytes):
+            # compaction
+            buffer[:unread_size] = memoryview(buffer)[self.start:self.end]
+        else:
+            # growing. New bytearray is allocated: the old one may still be exported by some memoryview
+            new_buffer = bytearray(max(len(buffer) * 2, unread_size + number_of_bytes))
+            new_buffer[:unread_size] = memoryview(buffer)[self.start:self.end]
+            self.buffer = new_buffer
+        self.start = 0
+        self.end = unread_size
 
 
 class Connection:
@@ -109,17 +453,73 @@ class Connection:
         self.connection_state = connection_state
         self.connection_name = connection_name
         self.worker_obj = connection_info.worker_obj
-        self.read_data = b''  # already read data
-        self.must_be_written_data = memoryview(b'')  # this data should be written
+        self.read_data = InputBuffer()  # already read data
+        self.output_buffer = self._make_output_buffer()  # this data should be written
+        self.is_writing_paused = False  # last state reported to the worker (see WorkerBase.on_pause_writing())
         self.force_write_call = False
+        self.write_through = None  # None - use NetIO.write_through. See NetIO.check_is_connection_need_to_sent_data()
+
+    @property
+    def must_be_written_data(self)->OutputBuffer:
+        '''
+        Output queue. Is False when all data was sent
+        '''
+        return self.output_buffer
+
+    @must_be_written_data.setter
+    def must_be_written_data(self, data):
+        if isinstance(data, OutputBuffer):
+            self.output_buffer = data
+        else:
+            self.output_buffer = self._make_output_buffer(data)
 
-    def add_must_be_written_data(self, data):
+    def _make_output_buffer(self, data=None)->OutputBuffer:
+        connection_info = self.connection_info
+        if connection_info.output_high_watermark is None:
+            return OutputBuffer(data)
+        output_buffer = BoundedOutputBuffer(connection_info.output_high_watermark,
+                                            connection_info.output_low_watermark,
+                                            connection_info.output_overflow_policy)
+        if data:
+            output_buffer.add(data)
+        return output_buffer
+
+    def add_must_be_written_data(self, data, droppable=False):
         '''
-        Use this method to add data to output buffers
+        Use this method to add data to output buffers. Data is not copied: only the reference is stored
         :param data: some new output data to be send through this connection
+        :param droppable: data may be dropped if the output queue is full (see BoundedOutputBuffer.add())
         :return:
         '''
-        self.must_be_written_data = memoryview(bytes(self.must_be_written_data) + data)
+        self.output_buffer.add(data, droppable)
+
+
+class IOLoopStats:
+    '''
+    Counters of the IO loop activity. They are updated by the NetIOBase and IOMethodBase implementations and may be
+    used for diagnostics and benchmarking (for example to calculate number of syscalls per message).
+    '''
+    def __init__(self):
+        self.epoll_wait_calls = 0  # number of poll()-like calls (one per loop iteration)
+        self.epoll_ctl_calls = 0  # number of register()/modify()/unregister()-like calls
+        self.accept_calls = 0
+        self.recv_calls = 0
+        self.send_calls = 0
+        self.avoided_epoll_ctl_calls = 0  # modify() calls that were not made since registered mask was not changed
+
+    def get_number_of_syscalls(self):
+        '''
+        :return: total number of counted IO-related syscalls
+        '''
+        return self.epoll_wait_calls + self.epoll_ctl_calls + self.accept_calls + self.recv_calls + self.send_calls
+
+    def copy(self):
+        '''
+        :return: snapshot of the current counters values
+        '''
+        result = IOLoopStats()
+        result.__dict__.update(self.__dict__)
+        return result
 
 
 class NetIOUserApi:
@@ -135,6 +535,9 @@ class NetIOUserApi:
         self.connection_by_id = dict()
         self.connection_by_name = dict()
         self.connection_by_fileno = dict()
+        self.reader_by_fileno = dict()  # see add_reader()
+
+        self.stats = IOLoopStats()
 
     def start(self, destroy_on_finish=True):
         '''
@@ -194,6 +597,84 @@ class NetIOUserApi:
         '''
         raise NotImplementedError()
 
+    def time(self):
+        '''
+        :return: current time of the IO loop timers (monotonic clock, seconds)
+        '''
+        raise NotImplementedError()
+
+    def call_later(self, delay, callback, *args):
+        '''
+        Will schedule callback(*args) call from inside of the IO loop after the given delay.
+        If callback will add some data to the connection output buffer - it should make
+        check_is_connection_need_to_sent_data() call for that connection by itself.
+        :param delay: seconds
+        :param callback: callable
+        :param args: callback args
+        :return: timer handle (can be used in cancel_timer() call)
+        '''
+        raise NotImplementedError()
+
+    def call_at(self, when, callback, *args):
+        '''
+        Same as call_later() but with an absolute time
+        :param when: absolute time (see time())
+        :param callback: callable
+        :param args: callback args
+        :return: timer handle (can be used in cancel_timer() call)
+        '''
+        raise NotImplementedError()
+
+    def cancel_timer(self, timer_handle):
+        '''
+        Will cancel scheduled call. It is safe to cancel already expired or already cancelled timer
+        :param timer_handle: timer handle returned by call_later() or call_at()
+        :return:
+        '''
+        raise NotImplementedError()
+
+    def call_soon_threadsafe(self, callback, *args):
+        '''
+        The only method that can be called from the other threads. Will schedule callback(*args) call from inside of
+        the IO loop as soon as possible and will wake up the loop if it is waiting for the IO events.
+        :param callback: callable
+        :param args: callback args
+        :return:
+        '''
+        raise NotImplementedError()
+
+    def add_reader(self, fileno, callback):
+        '''
+        Will add some non-socket file descriptor (eventfd, pipe, etc.) to the IO loop checking list. callback() will be
+        called (without arguments) from inside of the IO loop each time when this file descriptor will be available
+        to read. Callback should read all available data: checks are level-triggered.
+        :param fileno: file descriptor
+        :param callback: callable
+        :return:
+        '''
+        raise NotImplementedError()
+
+    def remove_reader(self, fileno):
+        '''
+        Will remove file descriptor added by the add_reader(). Descriptor will not be closed
+        :param fileno: file descriptor
+        :return:
+        '''
+        raise NotImplementedError()
+
+    def broadcast(self, connections, data, droppable=False):
+        '''
+        Will add the same data to the output buffers of all given connections (and will make
+        check_is_connection_need_to_sent_data() call for each of them). Data is not copied: each output buffer holds
+        a reference to the one shared immutable buffer. So serialize and frame your message once and pass it here.
+        :param connections: iterable of target connections
+        :param data: bytes-like object
+        :param droppable: data may be dropped by the connections with the full output queue (see
+            BoundedOutputBuffer.add())
+        :return:
+        '''
+        raise NotImplementedError()
+
 
 class NetIOCallbacks:
     '''
@@ -208,7 +689,12 @@ class NetIOCallbacks:
     def on_connected(self, connection: Connection):
         raise NotImplementedError()
 
-    def on_read(self, connection: Connection):
+    def on_read(self, connection: Connection, drain=False):
+        '''
+        :param connection: connection
+        :param drain: read until EAGAIN or EOF even with the level-triggered IOMethod. Should be used when the peer
+            has closed the connection (EPOLLHUP): there will be no next iteration for the remaining data
+        '''
         raise NotImplementedError()
 
     def on_write(self, connection: Connection):
@@ -217,6 +703,9 @@ class NetIOCallbacks:
     def on_close(self, connection: Connection):
         raise NotImplementedError()
 
+    def on_reader_ready(self, fileno):
+        raise NotImplementedError()
+
 
 class NetIOBase(NetIOUserApi, NetIOCallbacks):
     '''
@@ -243,6 +732,7 @@ class WorkerBase:
     You can read input data from self.connection at any time (see "Caution" section of __init__ doc string) from any
     callback.
     You can write output data (to be send) to self.connection at any time (see "Caution") from any callback.
+    You can schedule delayed calls by self.api.call_later()/call_at() and cancel them by self.api.cancel_timer().
     '''
     def __init__(self, api: NetIOUserApi=None, connection: Connection=None):
         '''
@@ -280,6 +770,23 @@ class WorkerBase:
         '''
         pass
 
+    def on_pause_writing(self):
+        '''
+        Will be called when the output queue of the connection will reach its high watermark (see
+        ConnectionInfo.output_high_watermark): peer does not read data as fast as it is produced. Worker should stop
+        producing data for this connection until on_resume_writing() call. Droppable data that does not fit into the
+        queue is handled by the overflow policy meanwhile.
+        :return:
+        '''
+        pass
+
+    def on_resume_writing(self):
+        '''
+        Will be called when the paused output queue will drain to its low watermark
+        :return:
+        '''
+        pass
+
     def on_connection_lost(self):
         '''
         Will be called AFTER connection socket was actually closed and removed from IOMethod checking list.
@@ -332,15 +839,22 @@ class IOMethodBase:
     Base class for all IOMethod implementation (select, epoll, overlapped io, kqueue, etc.)
     All his methods are called by the NetIOBase instance.
     '''
+
+    # If True - readiness is reported only once per state change (edge-triggered). In this case NetIOBase should
+    # read, write and accept until EAGAIN on each event, since there will be no repeated notification for the data
+    # that is still waiting in the socket.
+    edge_triggered = False
+
     def __init__(self, interface: NetIOBase):
         self.interface = interface
         self.should_be_closed = set()
         pass
 
-    def loop_iteration(self):
+    def loop_iteration(self, timeout=1):
         '''
         Single IO loop iteration.
         This method holds all IOMethod logic.
+        :param timeout: max time (seconds) to wait for the IO events
         :return:
         '''
         raise NotImplementedError()
@@ -370,6 +884,29 @@ class IOMethodBase:
         '''
         raise NotImplementedError()
 
+    def get__need_write(self, conn: socket.socket)->bool:
+        '''
+        :param conn: target socket
+        :return: True if "socket available to write" checks are allowed (or will be allowed) for socket
+        '''
+        raise NotImplementedError()
+
+    def add_reader(self, fileno):
+        '''
+        Will add non-socket file descriptor to the "available to read" checks (level-triggered)
+        :param fileno: file descriptor
+        :return:
+        '''
+        raise NotImplementedError()
+
+    def remove_reader(self, fileno):
+        '''
+        Will remove file descriptor added by add_reader()
+        :param fileno: file descriptor
+        :return:
+        '''
+        raise NotImplementedError()
+
     def set__should_be_closed(self, conn: socket.socket):
         '''
         Mark socket as "should be closed"
@@ -0,0 +1,66 @@
+import select
+from net_io_abstract import *
+from net_io_method__epoll_lt import IOMethodEpollLT
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+class IOMethodEpollET(IOMethodEpollLT):
+    '''
+    Edge-triggered epoll. Each readiness change is reported only once, so NetIO drains reads, writes and accepts
+    until EAGAIN (see IOMethodBase.edge_triggered). EPOLLRDHUP is also requested: peer shutdown is processed by the
+    same read-draining code path (it will read all remaining data and then will get an EOF).
+    Interest mask cache (see IOMethodEpollLT.set__need_write()) treats EPOLLOUT as not registered as soon as the
+    EPOLLOUT event is received (before its callbacks): an edge can not be reused, so the next write interest should be
+    re-armed by modify().
+    '''
+    edge_triggered = True
+    base_event_mask = select.EPOLLIN | select.EPOLLRDHUP | select.EPOLLET
+
+    def loop_iteration(self, timeout=1):
+        # Connections may be set to be closed outside of the event callbacks (timers, failed connect() calls, etc.)
+        self._close_all()
+        self._apply_pending_masks()
+        events = self.epoll.poll(timeout)
+        self.stats.epoll_wait_calls += 1
+        for fileno, event in events:
+            connection = self.interface.connection_by_fileno.get(fileno)
+            if connection is None:
+                self.interface.on_reader_ready(fileno)
+                continue
+
+            if event & (select.EPOLLIN | select.EPOLLRDHUP):
+                # Read available or peer has closed its side of the connection. In both cases we need to drain
+                # the socket
+                if ConnectionType.passive == connection.connection_info.connection_type:
+                    self.interface.on_accept_connection(connection)
+                else:
+                    self.interface.on_read(connection)
+
+            if event & (select.EPOLLHUP | select.EPOLLERR):
+                # Some error. Connection should be closed
+                self.should_be_closed.add(connection.conn)
+            elif event & select.EPOLLOUT:
+                if fileno in self.registered_masks:
+                    # Edge was consumed: if the socket was drained without EAGAIN there will be no more EPOLLOUT
+                    # notifications. So set__need_write(True) calls (including the ones made by the callbacks below:
+                    # on_connect() may queue the data) should re-arm it by the real modify() call
+                    self.registered_masks[fileno] = self.base_event_mask
+                # Write available. We will not write data if an error occurred
+                if ConnectionState.waiting_for_connection == connection.connection_state:
+                    if not connection.conn.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                        # Connected successfully:
+                        self.interface.on_connected(connection)
+                    else:
+                        # Some connection error - will be closed:
+                        self.should_be_closed.add(connection.conn)
+                else:
+                    self.interface.on_write(connection)
+
+            self._close_all()
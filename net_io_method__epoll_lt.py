@@ -11,21 +11,35 @@ __author__ = 'ButenkoMS <gtalk@butenkoms.space>'
 
 
 class IOMethodEpollLT(IOMethodBase):
+    base_event_mask = select.EPOLLIN
+
     def __init__(self, interface: NetIOBase):
         super().__init__(interface)
         self.epoll = select.epoll()
+        self.stats = interface.stats
+        self.registered_masks = dict()  # event masks currently registered in the epoll: {fileno: mask}
+        self.pending_masks = dict()  # interest changes to be applied before the next poll: {fileno: mask}
 
-    def loop_iteration(self):
-        events = self.epoll.poll(1)
+    def loop_iteration(self, timeout=1):
+        # Connections may be set to be closed outside of the event callbacks (timers, failed connect() calls, etc.)
+        self._close_all()
+        self._apply_pending_masks()
+        events = self.epoll.poll(timeout)
+        self.stats.epoll_wait_calls += 1
         for fileno, event in events:
-            connection = self.interface.connection_by_fileno[fileno]
+            connection = self.interface.connection_by_fileno.get(fileno)
+            if connection is None:
+                self.interface.on_reader_ready(fileno)
+                continue
 
             if event & select.EPOLLIN:
                 # Read available. We can try to read even even if an error occurred
                 if ConnectionType.passive == connection.connection_info.connection_type:
                     self.interface.on_accept_connection(connection)
                 else:
-                    self.interface.on_read(connection)
+                    # Peer of the AF_UNIX socket (unlike TCP one) is reporting EPOLLHUP on close() even if there is
+                    #   still unread data. Connection will be closed right after this read, so it should read all
+                    self.interface.on_read(connection, bool(event & select.EPOLLHUP))
 
             if event & select.EPOLLHUP:
                 # Some error. Connection should be closed
@@ -60,16 +74,58 @@ class IOMethodEpollLT(IOMethodBase):
         self.epoll.close()
 
     def add_connection(self, conn: socket.socket):
-        self.epoll.register(conn.fileno(), select.EPOLLIN)
+        fileno = conn.fileno()
+        self.epoll.register(fileno, self.base_event_mask)
+        self.registered_masks[fileno] = self.base_event_mask
+        self.stats.epoll_ctl_calls += 1
 
     def remove_connection(self, conn: socket.socket):
-        self.epoll.unregister(conn.fileno())
+        fileno = conn.fileno()
+        self.epoll.unregister(fileno)
+        self.registered_masks.pop(fileno, None)
+        self.pending_masks.pop(fileno, None)
+        self.stats.epoll_ctl_calls += 1
+
+    def add_reader(self, fileno):
+        self.epoll.register(fileno, select.EPOLLIN)
+        self.stats.epoll_ctl_calls += 1
+
+    def remove_reader(self, fileno):
+        self.epoll.unregister(fileno)
+        self.stats.epoll_ctl_calls += 1
 
     def set__need_write(self, conn: socket.socket, state=True):
+        # Change is postponed until the end of the loop iteration: there can be several set__need_write() calls for
+        # the same socket during one iteration (after each worker callback, from broadcasts, etc.)
+        fileno = conn.fileno()
         if state:
-            self.epoll.modify(conn.fileno(), select.EPOLLIN | select.EPOLLOUT)
+            mask = self.base_event_mask | select.EPOLLOUT
+        else:
+            mask = self.base_event_mask
+        if self.pending_masks.get(fileno, self.registered_masks.get(fileno)) == mask:
+            self.stats.avoided_epoll_ctl_calls += 1
         else:
-            self.epoll.modify(conn.fileno(), select.EPOLLIN)
+            self.pending_masks[fileno] = mask
+
+    def get__need_write(self, conn: socket.socket)->bool:
+        fileno = conn.fileno()
+        return bool(self.pending_masks.get(fileno, self.registered_masks.get(fileno, 0)) & select.EPOLLOUT)
+
+    def _apply_pending_masks(self):
+        if not self.pending_masks:
+            return
+
+        pending_masks = self.pending_masks
+        self.pending_masks = dict()
+        registered_masks = self.registered_masks
+        for fileno, mask in pending_masks.items():
+            if registered_masks.get(fileno) == mask:
+                # was changed and than changed back during the same iteration
+                self.stats.avoided_epoll_ctl_calls += 1
+            else:
+                self.epoll.modify(fileno, mask)
+                registered_masks[fileno] = mask
+                self.stats.epoll_ctl_calls += 1
 
     def set__should_be_closed(self, conn: socket.socket):
         self.should_be_closed.add(conn)
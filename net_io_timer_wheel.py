@@ -0,0 +1,183 @@
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+TIMER_WHEEL_RESOLUTION = 0.001  # seconds per tick
+TIMER_WHEEL_SLOT_BITS = 8
+TIMER_WHEEL_NUMBER_OF_SLOTS = 1 << TIMER_WHEEL_SLOT_BITS
+TIMER_WHEEL_SLOT_MASK = TIMER_WHEEL_NUMBER_OF_SLOTS - 1
+TIMER_WHEEL_NUMBER_OF_LEVELS = 4  # 4 levels with 1 ms resolution are covering ~49.7 days. Longer timers are
+#   rescheduled from the top level until their expiration time will be in range
+
+
+class TimerHandle:
+    '''
+    Scheduled callback. Returned by the NetIOUserApi.call_later()/call_at()
+    '''
+    __slots__ = ('when', 'expiration_tick', 'callback', 'args', 'cancelled', 'slot', 'wheel')
+
+    def __init__(self, wheel, when, expiration_tick, callback, args):
+        '''
+        :param wheel: owner TimerWheel
+        :param when: expiration time (in the TimerWheel.time() units)
+        :param expiration_tick: expiration time in ticks
+        :param callback: callable
+        :param args: callback args
+        '''
+        self.wheel = wheel
+        self.when = when
+        self.expiration_tick = expiration_tick
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self.slot = None  # dict (used as an ordered set) which currently holds this timer
+
+    def cancel(self):
+        '''
+        Will cancel the timer. Safe to be called several times and after the timer expiration
+        :return:
+        '''
+        self.wheel.cancel(self)
+
+
+class TimerWheel:
+    '''
+    Hierarchical timer wheel. Level 0 has one slot per tick; each slot of the next level covers all slots of the
+    previous one. Timers are cascaded from the higher levels to the lower ones when their time is coming.
+    Schedule and cancel are O(1): each slot is a dict used as an ordered set, and each timer knows its slot.
+    '''
+    def __init__(self, time_function, resolution=TIMER_WHEEL_RESOLUTION):
+        '''
+        :param time_function: monotonic clock (time.monotonic for example)
+        :param resolution: seconds per tick
+        '''
+        self.time = time_function
+        self.resolution = resolution
+        self.origin = time_function()
+        self.current_tick = 0  # all timers with expiration_tick <= current_tick are already expired
+        self.number_of_timers = 0
+        self.levels = [[dict() for index in range(TIMER_WHEEL_NUMBER_OF_SLOTS)]
+                       for level in range(TIMER_WHEEL_NUMBER_OF_LEVELS)]
+
+    def __len__(self):
+        return self.number_of_timers
+
+    def call_at(self, when, callback, *args)->TimerHandle:
+        '''
+        :param when: absolute time (in the time_function units)
+        :param callback: callable
+        :param args: callback args
+        :return: TimerHandle
+        '''
+        # Rounding up: timer should never expire earlier than requested
+        expiration_tick = -int((self.origin - when) // self.resolution)
+        handle = TimerHandle(self, when, expiration_tick, callback, args)
+        self._add(handle)
+        self.number_of_timers += 1
+        return handle
+
+    def call_later(self, delay, callback, *args)->TimerHandle:
+        '''
+        :param delay: delay in seconds
+        :param callback: callable
+        :param args: callback args
+        :return: TimerHandle
+        '''
+        return self.call_at(self.time() + delay, callback, *args)
+
+    def cancel(self, handle: TimerHandle):
+        if handle.cancelled:
+            return
+        handle.cancelled = True
+        if handle.slot is not None:
+            del handle.slot[handle]
+            handle.slot = None
+            self.number_of_timers -= 1
+
+    def get_timeout(self, max_timeout):
+        '''
+        :param max_timeout: result will not be bigger than this value (seconds)
+        :return: time (seconds) until the nearest expiration or until the nearest cascade of the higher level timers
+            (it's cheap to find and it is never later than the real expiration)
+        '''
+        if not self.number_of_timers:
+            return max_timeout
+
+        current_tick = self.current_tick
+        ticks_until_now = int((self.time() - self.origin) // self.resolution) - current_tick
+        if ticks_until_now > 0:
+            return 0
+
+        max_ticks = min(TIMER_WHEEL_NUMBER_OF_SLOTS, int(max_timeout / self.resolution) + 1)
+        level0 = self.levels[0]
+        for delta in range(1, max_ticks + 1):
+            tick = current_tick + delta
+            index = tick & TIMER_WHEEL_SLOT_MASK
+            if (not index) or level0[index]:
+                return max(0, (tick * self.resolution + self.origin) - self.time())
+        return max_timeout
+
+    def get_expired(self)->list:
+        '''
+        Advances the wheel up to the current time
+        :return: list of expired TimerHandle objects (in order of expiration). They are removed from the wheel
+        '''
+        result = list()
+        now_tick = int((self.time() - self.origin) // self.resolution)
+        levels = self.levels
+        level0 = levels[0]
+        while self.current_tick < now_tick:
+            if not self.number_of_timers:
+                self.current_tick = now_tick
+                break
+
+            self.current_tick += 1
+            index = self.current_tick & TIMER_WHEEL_SLOT_MASK
+            if not index:
+                self._cascade(1)
+
+            slot = level0[index]
+            if slot:
+                level0[index] = dict()
+                for handle in slot:
+                    handle.slot = None
+                self.number_of_timers -= len(slot)
+                result.extend(slot)
+        return result
+
+    def _cascade(self, level):
+        if level >= TIMER_WHEEL_NUMBER_OF_LEVELS:
+            return
+
+        index = (self.current_tick >> (TIMER_WHEEL_SLOT_BITS * level)) & TIMER_WHEEL_SLOT_MASK
+        if not index:
+            self._cascade(level + 1)
+
+        slot = self.levels[level][index]
+        if slot:
+            self.levels[level][index] = dict()
+            for handle in slot:
+                self._add(handle)
+
+    def _add(self, handle: TimerHandle):
+        expiration_tick = handle.expiration_tick
+        current_tick = self.current_tick
+        if expiration_tick <= current_tick:
+            expiration_tick = current_tick + 1
+        delta = expiration_tick - current_tick
+
+        level = 0
+        while (delta >> (TIMER_WHEEL_SLOT_BITS * (level + 1))) and (level < TIMER_WHEEL_NUMBER_OF_LEVELS - 1):
+            level += 1
+        if delta >> (TIMER_WHEEL_SLOT_BITS * (level + 1)):
+            # too far: will be rescheduled from the last slot of the top level
+            expiration_tick = current_tick + (1 << (TIMER_WHEEL_SLOT_BITS * TIMER_WHEEL_NUMBER_OF_LEVELS)) - 1
+
+        index = (expiration_tick >> (TIMER_WHEEL_SLOT_BITS * level)) & TIMER_WHEEL_SLOT_MASK
+        slot = self.levels[level][index]
+        slot[handle] = None
+        handle.slot = slot
@@ -0,0 +1,143 @@
+import random
+import time
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Delays of the reconnections. DecorrelatedJitterBackoff gives the growing random delay after each failed connection, so
+the clients (or servers) that lost the same server do not retry it in lockstep. ConnectAttemptLimiter caps the rate
+of the connect attempts of the whole process: it is not exceeded even if many connections fail at once.
+CircuitBreaker keeps the server from connecting again and again to the dead peer: while its circuit is open there are
+no connect attempts at all, single trial connection is made after the backoff delay.
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+DEFAULT_RECONNECT_BASE_DELAY = 0.1  # seconds
+DEFAULT_RECONNECT_MAX_DELAY = 10.0  # seconds
+DEFAULT_MAX_CONNECT_ATTEMPTS_PER_SECOND = 10.0
+DEFAULT_CONNECT_ATTEMPTS_BURST = 10
+DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD = 1  # failed connect attempts in a row
+
+
+class DecorrelatedJitterBackoff:
+    '''
+    "Decorrelated jitter": each delay is random between the base delay and the triple of the previous delay, limited
+    by the max delay
+    '''
+    def __init__(self, base_delay=DEFAULT_RECONNECT_BASE_DELAY, max_delay=DEFAULT_RECONNECT_MAX_DELAY,
+                 random_generator=random):
+        '''
+        :param base_delay: min delay, seconds
+        :param max_delay: max delay, seconds. 0: there is no delay at all
+        :param random_generator: random.Random object (or the random module)
+        '''
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.random_generator = random_generator
+        self.delay = 0.0  # previous delay. 0: there were no failures since the last reset()
+
+    def get_next_delay(self):
+        '''
+        Should be called after each failure
+        :return: delay before the next try, seconds
+        '''
+        base_delay = min(self.base_delay, self.max_delay)
+        self.delay = min(self.max_delay, self.random_generator.uniform(base_delay, max(base_delay, 3 * self.delay)))
+        return self.delay
+
+    def reset(self):
+        '''
+        Should be called after the success
+        :return:
+        '''
+        self.delay = 0.0
+
+
+class ConnectAttemptLimiter:
+    '''
+    Rate limit of the connect attempts with the allowed burst ("generic cell rate algorithm"): attempts are not
+    rejected but are given the time when they may be made
+    '''
+    def __init__(self, max_attempts_per_second=DEFAULT_MAX_CONNECT_ATTEMPTS_PER_SECOND,
+                 burst=DEFAULT_CONNECT_ATTEMPTS_BURST, time_function=time.monotonic):
+        '''
+        :param max_attempts_per_second: long-term rate. None: there is no limit
+        :param burst: number of attempts that may be made at once after a quiet period
+        :param time_function: time source, seconds
+        '''
+        self.max_attempts_per_second = max_attempts_per_second
+        self.burst = burst
+        self.time_function = time_function
+        self.theoretical_arrival_time = None
+        self.number_of_delayed_attempts = 0
+
+    def reserve(self, delay=0.0):
+        '''
+        Reserves the next attempt
+        :param delay: attempt is wanted not earlier than after this delay, seconds
+        :return: delay after which the reserved attempt may be made, seconds
+        '''
+        if self.max_attempts_per_second is None:
+            return delay
+
+        now = self.time_function()
+        interval = 1 / self.max_attempts_per_second
+        wanted_time = now + delay
+        if self.theoretical_arrival_time is None:
+            self.theoretical_arrival_time = wanted_time
+        attempt_time = max(wanted_time, self.theoretical_arrival_time - (self.burst - 1) * interval)
+        self.theoretical_arrival_time = max(self.theoretical_arrival_time, attempt_time) + interval
+        if attempt_time > wanted_time:
+            self.number_of_delayed_attempts += 1
+        return attempt_time - now
+
+
+class CircuitState:
+    closed = 0  # connection is made when needed
+    open = 1  # connection is not made: peer is considered dead until the trial
+    half_open = 2  # single trial connection is made
+
+
+class CircuitBreaker:
+    '''
+    Circuit of one peer. Circuit is opened after the failure_threshold failures in a row (or after the failed trial)
+    for the delay given by the backoff. Owner makes the trial connection (see on_trial()) when the delay is over
+    '''
+    def __init__(self, failure_threshold=DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD, backoff=None):
+        '''
+        :param failure_threshold: number of the failures in a row that opens the circuit
+        :param backoff: DecorrelatedJitterBackoff object: gives the time the circuit stays open. Default one if None
+        '''
+        self.failure_threshold = failure_threshold
+        self.backoff = backoff or DecorrelatedJitterBackoff()
+        self.state = CircuitState.closed
+        self.number_of_failures = 0  # in a row
+
+    def is_open(self)->bool:
+        return CircuitState.open == self.state
+
+    def on_failure(self):
+        '''
+        :return: time the circuit will stay open (seconds) if it was opened by this failure; None otherwise
+        '''
+        self.number_of_failures += 1
+        if (CircuitState.half_open == self.state) or (self.number_of_failures >= self.failure_threshold):
+            self.state = CircuitState.open
+            return self.backoff.get_next_delay()
+        return None
+
+    def on_trial(self):
+        '''
+        Should be called right before the trial connection
+        :return:
+        '''
+        self.state = CircuitState.half_open
+
+    def on_success(self):
+        self.state = CircuitState.closed
+        self.number_of_failures = 0
+        self.backoff.reset()
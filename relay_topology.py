@@ -0,0 +1,151 @@
+import math
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Two-level relay topology of the big clusters (see Server.use_relay_topology). Servers are split into groups of the
+consecutive server_list entries; the first alive server of each group is its hub. Server sends its message to its own
+hub only, hub sends it to the members of its group and to the other hubs, other hubs - to the members of their
+groups. So each server keeps connections to its hub and (if it is a hub) to its group and other hubs instead of the
+connections to all servers.
+Each server uses its own view of the dead servers: server that lost its connection to the hub will use the next
+member of the group as a hub. Forwarding is chosen by the stage of the message (see RelayStage) and not by the own
+view, so the servers with different views still deliver the message to everyone; duplicates that may be caused by
+the different views are dropped by the DuplicateFilter.
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+RELAY_DUPLICATE_WINDOW = 4096  # number of the last sequences of each origin kept by the DuplicateFilter
+
+
+class RelayStage:
+    own = 0  # message of this server (was not received yet)
+    to_hub = 1  # from the member to the hub of its group
+    between_hubs = 2  # from the hub to the other hubs
+    to_member = 3  # from the hub to the members of its group: is not forwarded
+
+
+def get_default_relay_group_size(number_of_servers):
+    '''
+    :return: group size for which the hub sends (and the member receives) about the same number of copies: square
+        root of the number of servers
+    '''
+    return max(1, round(math.sqrt(number_of_servers)))
+
+
+class RelayTopology:
+    '''
+    Own view of the relay topology: servers are identified by their indexes in the server_list
+    '''
+    def __init__(self, number_of_servers, own_index, group_size=None):
+        '''
+        :param number_of_servers: length of the server_list
+        :param own_index: index of this server
+        :param group_size: number of servers in each group. See get_default_relay_group_size() if None
+        '''
+        self.number_of_servers = number_of_servers
+        self.own_index = own_index
+        self.group_size = group_size or get_default_relay_group_size(number_of_servers)
+        self.own_group = own_index // self.group_size
+        self.dead_servers = set()
+        self.number_of_rebuilds = 0
+
+        self.hubs = list()  # hub index of each group (None if all its servers are dead)
+        self.own_group_members = list()  # alive servers of the own group, including this server
+        self.rebuild()
+
+    def get_group_servers(self, group)->range:
+        first = group * self.group_size
+        return range(first, min(first + self.group_size, self.number_of_servers))
+
+    def rebuild(self):
+        self.number_of_rebuilds += 1
+        number_of_groups = (self.number_of_servers + self.group_size - 1) // self.group_size
+        self.hubs = list()
+        for group in range(number_of_groups):
+            hub = None
+            for index in self.get_group_servers(group):
+                if index not in self.dead_servers:
+                    hub = index
+                    break
+            self.hubs.append(hub)
+        self.own_group_members = [index for index in self.get_group_servers(self.own_group)
+                                  if index not in self.dead_servers]
+
+    def mark_dead(self, index)->bool:
+        '''
+        :return: True if topology was changed
+        '''
+        if (index == self.own_index) or (index in self.dead_servers):
+            return False
+        self.dead_servers.add(index)
+        self.rebuild()
+        return True
+
+    def mark_alive(self, index)->bool:
+        '''
+        :return: True if topology was changed
+        '''
+        if index not in self.dead_servers:
+            return False
+        self.dead_servers.remove(index)
+        self.rebuild()
+        return True
+
+    def get_destinations(self, origin, stage)->list:
+        '''
+        :param origin: index of the server that made the message
+        :param stage: RelayStage of the received message (RelayStage.own for the own message)
+        :return: list of (server index, stage) pairs: where the message should be forwarded
+        '''
+        own_index = self.own_index
+        if RelayStage.own == stage:
+            own_hub = self.hubs[self.own_group]
+            if own_hub != own_index:
+                return [(own_hub, RelayStage.to_hub)]
+        elif RelayStage.to_member == stage:
+            return list()
+
+        destinations = [(index, RelayStage.to_member) for index in self.own_group_members
+                        if (index != own_index) and (index != origin)]
+        if RelayStage.between_hubs != stage:
+            destinations.extend((hub, RelayStage.between_hubs) for group, hub in enumerate(self.hubs)
+                                if (group != self.own_group) and (hub is not None))
+        return destinations
+
+
+class DuplicateFilter:
+    '''
+    Remembers the last sequences of each origin. Sequences of the origin are growing, but may come out of order: the
+    message and its later copy may come through the different paths
+    '''
+    def __init__(self, window_size=RELAY_DUPLICATE_WINDOW):
+        self.window_size = window_size
+        self.sequences = dict()  # origin key -> (max sequence, set of the seen sequences within the window)
+        self.number_of_duplicates = 0
+
+    def is_new(self, key, sequence)->bool:
+        '''
+        :param key: origin of the message (any hashable)
+        :param sequence: sequence of the message
+        :return: False if the message was already seen (or is too old to be checked)
+        '''
+        max_sequence, seen = self.sequences.get(key, (None, None))
+        if (max_sequence is None) or (sequence > max_sequence + self.window_size):
+            # First message of the origin, or the origin was restarted
+            self.sequences[key] = (sequence, {sequence})
+            return True
+        if (sequence <= max_sequence - self.window_size) or (sequence in seen):
+            self.number_of_duplicates += 1
+            return False
+        seen.add(sequence)
+        if sequence > max_sequence:
+            self.sequences[key] = (sequence, seen)
+            if len(seen) > 2 * self.window_size:
+                lowest = sequence - self.window_size
+                self.sequences[key] = (sequence, {item for item in seen if item > lowest})
+        return True
@@ -1,10 +1,17 @@
 from net_io__linux import *
 from net_io_method__epoll_lt import *
+from net_io_method__epoll_et import *
 from transport_protocol import *
 from server_list_loader import load_server_list
+from shared_memory_ring import *
+from stream_compression import *
+from relay_topology import *
+from load_balancing import *
+from reconnect_backoff import *
 from transport_protocol_constants import *
-import marshal
+import multiprocessing
 import sys
+import time
 from multiprocessing import Process
 
 
@@ -16,25 +23,152 @@ Docstrings: http://www.python.org/dev/peps/pep-0257/
 __author__ = 'ButenkoMS <gtalk@butenkoms.space>'
 
 
+DEFAULT_BACKLOG = socket.SOMAXCONN  # will be truncated by the kernel to the net.core.somaxconn value anyway
+SHARED_MEMORY_INBOX_POLL_INTERVAL = 0.05  # doorbell may be lost in rare cases: see shared_memory_ring.py
+DEFAULT_INTER_SERVER_BATCH_DEADLINE = 0.001
+DEFAULT_INTER_SERVER_BATCH_SIZE = 16 * 1024
+DEFAULT_OUTPUT_HIGH_WATERMARK = 1024 * 1024
+DEFAULT_OUTPUT_LOW_WATERMARK = 256 * 1024
+DEFAULT_CLIENT_COUNT_GOSSIP_INTERVAL = 0.1
+DEFAULT_CLIENT_COUNT_GOSSIP_CHANGE = 0.25
+RELAY_RECONNECT_INTERVAL = 1.0  # relay topology tries to reconnect to the dead server this often
+DEFAULT_BOOTSTRAP_LOAD_TOLERANCE = 0.1
+BOOTSTRAP_LOAD_SLACK = 10  # clients: small differences of the loads are not worth a reconnection
+MAX_BOOTSTRAP_REDIRECTS = 1  # redirected client is accepted by the next server anyway: there will be no redirect loops
+
+SHARED_MEMORY_RPCS = {
+    RPCName.number_of_clients_changed,
+    RPCName.versioned_number_of_clients,
+    RPCName.broadcast_string,
+    RPCName.broadcast_batch,
+    RPCName.broadcast_channel_string,
+    RPCName.active_channels,
+    RPCName.relay,
+}
+
+# Messages between servers that may be dropped by the full output queue (see Server.output_high_watermark)
+DROPPABLE_SERVER_RPCS = {
+    RPCName.broadcast_string,
+    RPCName.broadcast_batch,
+    RPCName.broadcast_channel_string,
+}
+
+
 class GlobalDataForAllWorkers:
     def __init__(self):
         self.deployed_servers_addresses = dict()
         self.server_by_connection_id = dict()
-        self.clients_per_server = dict()
+        self.clients_per_server = ServerLoads()
 
-        self.number_of_clients = 0
+        self.number_of_clients = 0  # clients of this process only
+        self.client_count_versions = dict()  # server address -> version of its applied number of clients
+        self.client_connections = set()  # established connections of the own clients (after client_arrived)
         self.own_address = None
 
+        # Multi-process mode (see Server.number_of_processes). Siblings are the other processes of this cluster node
+        self.sibling_connections = list()
+        self.clients_per_sibling = dict()  # connection id -> number of clients of the sibling process
+
+        # Shared memory transport between co-located servers (see Server.use_shared_memory)
+        self.all_server_list = list()
+        self.shared_memory_inbox = None
+        self.shared_memory_host_id = None
+        self.shared_memory_outboxes = dict()  # server address -> SharedMemoryOutbox
+
+        # Compression of the inter-server links (see Server.use_compression)
+        self.compressions = list()  # names of the compressions this server is willing to use
+        self.compression_stats = CompressionStats()
+
+        # Coalescing of the client strings sent to other servers (see Server.inter_server_batch_deadline)
+        self.inter_server_batch_deadline = None
+        self.inter_server_batch_size = 0
+        self.pending_broadcast_strings = list()
+        self.pending_broadcast_size = 0
+        self.broadcast_batch_timer = None
+        self.number_of_broadcast_batches = 0
+        self.number_of_batched_strings = 0
+
+        # Bounded output queues of the client and server connections (see Server.output_high_watermark)
+        self.output_high_watermark = None
+        self.output_low_watermark = None
+        self.output_overflow_policy = OutputOverflowPolicy.drop_oldest
+        self.number_of_paused_connections = 0
+        self.dropped_output_bytes = 0  # by the already closed connections
+        self.dropped_output_messages = 0
+
+        # Chat channels. Lines of the channel are sent only to the servers (and siblings) with its subscribers
+        self.channel_connections = dict()  # channel -> set of connections of the own subscribed clients
+        self.channels_per_sibling = dict()  # connection id -> set of channels of the sibling process
+        self.channels_per_server = dict()  # server address -> set of channels of that server (see active_channels)
+        self.servers_per_channel = dict()  # channel -> set of addresses of the servers with its subscribers
+        self.node_channels = frozenset()  # channels of the whole cluster node (last sent to other servers)
+        self.number_of_channel_strings_to_servers = 0  # one per each destination server
+
+        # Coalescing of the number of clients updates (see Server.client_count_gossip_interval)
+        self.client_count_gossip_interval = None
+        self.client_count_gossip_change = 0.0
+        self.client_count_gossip_timer = None
+        self.is_number_of_own_clients_changed = False  # siblings were not notified yet
+        self.gossiped_number_of_clients = None  # number of node clients sent to other servers
+        self.client_count_version = 0
+        self.number_of_client_count_updates = 0  # number of updates sent (and printed) by this process
+        self.number_of_client_count_messages = 0  # messages to other servers
+
+        # Relay topology of the big clusters (see Server.use_relay_topology)
+        self.relay_topology = None
+        self.relay_worker = None  # handles the relayed messages as if they were received from their origin
+        self.server_indexes = dict()  # server address -> its index in the all_server_list
+        self.sibling_index = 0  # index of this process: relayed messages of the siblings have their own sequences
+        self.relay_sequence = 0
+        self.relay_duplicate_filter = DuplicateFilter()
+        self.relay_reconnect_timers = dict()  # address of the dead server -> timer of the reconnection
+        self.number_of_relayed_messages = 0  # copies of the own and forwarded messages sent to other servers
+
+        # Client bootstrap (see Server.bootstrap_load_tolerance)
+        self.bootstrap_load_tolerance = None
+        self.number_of_accepted_bootstraps = 0
+        self.number_of_bootstrap_redirects = 0
+
+        # Circuit breakers of the other servers (see Server.circuit_breaker_failure_threshold)
+        self.circuit_breakers = dict()  # server address -> CircuitBreaker. Empty if circuit breakers are not used
+        self.circuit_trial_timers = dict()  # server address -> timer of the trial connection
+        self.number_of_opened_circuits = 0
+        self.number_of_server_connect_attempts = 0
+        self.number_of_avoided_connect_attempts = 0  # connections to the servers with the open circuit were not made
+
+    def get_number_of_node_clients(self):
+        '''
+        :return: number of clients of the whole cluster node (this process and all its siblings)
+        '''
+        return self.number_of_clients + sum(self.clients_per_sibling.values())
+
 
 class MainWorker(WorkerBase):
     def __init__(self, global_data: GlobalDataForAllWorkers):
         super().__init__()
         self.global_data = global_data
         self.is_connection_to_the_server = False
+        self.is_connection_from_the_server = False  # accepted connection, made by the other server
+        self.is_connection_to_the_sibling = False
+        self.is_connection_to_the_parent_process = False
         self.server_address = None
         self.unknown__client_or_server_connection = True
         self.is_on_connect_was_called = False
+        self.channels = set()  # channels joined by the client of this connection
+
+        # Protocol version negotiation (see choose_protocol_version())
+        self.input_protocol_version = MIN_PROTOCOL_VERSION
+        self.output_protocol_version = MIN_PROTOCOL_VERSION
+        self.is_protocol_version_requested = False  # own connection: waiting for the chosen version
+        self.is_protocol_version_chosen = False  # accepted connection: chosen version was sent to the peer
 
+        # Streaming compression of the inter-server link (see stream_compression.py). Each direction is compressed
+        #   independently: by the server that sends broadcasts through this connection
+        self.stream_compressor = None
+        self.stream_decompressor = None
+        self.compressed_frame_decoder = None
+
+        self.frame_decoder = FrameDecoder()
         self.input_rpc_handlers = dict()
         self.prepare_input_rpc_handlers()
 
@@ -46,15 +180,26 @@ class MainWorker(WorkerBase):
             self.process__on_connect__as_an_active_connection()
 
     def on_read(self):
+        read_data = self.connection.read_data
+        data = read_data.get_data()
         try:
-            while True:
-                message, remaining_data = get_message(self.connection.read_data)
-                self.connection.read_data = remaining_data
+            for message in self.frame_decoder.feed(data):
                 self.input_message_handler(message)
-        except ThereIsNoMessages:
-            return
+        finally:
+            read_data.consume(len(data))
+
+    def on_pause_writing(self):
+        # Slow consumer: chat lines for it are dropped (or it will be disconnected) by the output_overflow_policy
+        self.global_data.number_of_paused_connections += 1
+
+    def on_resume_writing(self):
+        self.global_data.number_of_paused_connections -= 1
 
     def on_connection_lost(self):
+        if self.connection.is_writing_paused:
+            self.global_data.number_of_paused_connections -= 1
+        self.global_data.dropped_output_bytes += self.connection.output_buffer.dropped_bytes
+        self.global_data.dropped_output_messages += self.connection.output_buffer.dropped_messages
         if ConnectionType.passive == self.connection.connection_info.connection_type:
             self.process__on_connection_lost__as_passive_connection()
         else:
@@ -66,12 +211,16 @@ class MainWorker(WorkerBase):
     def process__on_connect__as_passive_connection(self):
         # this is passive socket.
         # send 'server arrived' message to other servers
-        self.connection.conn.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        # (right away: number of clients is sent without coalescing if it was never sent before)
+        self.global_data.gossiped_number_of_clients = None
         self.change_number_of_connected_clients(0)
 
     def process__on_connect__as_an_active_connection(self):
         if self.is_connection_to_the_server:
             print('SERVER ARRIVED: {}'.format(self.server_address))
+            self.close_circuit(self.server_address)
+            if self.global_data.relay_topology is not None:
+                self.mark_server_alive(self.server_address)
 
     def process__on_connection_lost__as_passive_connection(self):
         # This is was passive socket
@@ -81,18 +230,48 @@ class MainWorker(WorkerBase):
 
     def process__on_connection_lost__as_an_active_connection(self):
         # if active connection
-        if self.is_connection_to_the_server:
+        if self.is_connection_to_the_sibling:
+            self.process__on_connection_lost__as_connection_to_the_sibling()
+        elif self.is_connection_to_the_server:
             # if connection to the server
+            self.detach_shared_memory_outbox()
             self.unregister_current_connection_to_the_server()
             if self.is_on_connect_was_called:
                 # if on_connection_lost() was called NOT immediately after connection creation because of some error
                 # (peer is not accessible, etc.)
                 print('SERVER GONE: {}'.format(self.server_address))
+            else:
+                self.register_connection_failure(self.server_address)
+            if self.global_data.relay_topology is not None:
+                self.mark_server_dead(self.server_address)
+                if not self.is_on_connect_was_called:
+                    self.reroute_relay_messages()
+        elif self.is_connection_from_the_server:
+            self.detach_shared_memory_outbox()
         else:
             # if connection to the client
+            for channel in self.channels:
+                self.remove_channel_subscriber(channel)
+            self.channels.clear()
             if not self.unknown__client_or_server_connection:
+                self.global_data.client_connections.discard(self.connection)
                 self.change_number_of_connected_clients(-1)
 
+    def process__on_connection_lost__as_connection_to_the_sibling(self):
+        # Siblings are never reconnected: clients of the gone process will reconnect to the rest of the cluster by
+        # themselves
+        print('SIBLING GONE: {}'.format(self.connection.connection_id))
+        if self.is_connection_to_the_parent_process:
+            self.api.stop()
+            return
+
+        if self.connection in self.global_data.sibling_connections:
+            self.global_data.sibling_connections.remove(self.connection)
+        self.global_data.clients_per_sibling.pop(self.connection.connection_id, None)
+        self.change_number_of_connected_clients(0, notify_siblings=False)
+        if self.global_data.channels_per_sibling.pop(self.connection.connection_id, None):
+            self.change_active_channels(notify_siblings=False)
+
     @staticmethod
     def register_connection_as_a_connection_to_the_server(connection, address=None):
         worker_obj = connection.worker_obj
@@ -100,7 +279,8 @@ class MainWorker(WorkerBase):
         worker_obj.is_connection_to_the_server = True
         worker_obj.global_data.deployed_servers_addresses[worker_obj.server_address] = connection
         worker_obj.global_data.server_by_connection_id[connection.connection_id] = worker_obj.server_address
-        worker_obj.global_data.clients_per_server[worker_obj.server_address] = 0
+        # Number of clients may be already known: from the relayed messages (see Server.use_relay_topology)
+        worker_obj.global_data.clients_per_server.setdefault(worker_obj.server_address, 0)
 
     def register_current_connection_as_a_connection_to_the_server(self, address=None):
         self.register_connection_as_a_connection_to_the_server(self.connection, address)
@@ -116,163 +296,951 @@ class MainWorker(WorkerBase):
         if server_address is not None:
             if server_address in worker_obj.global_data.clients_per_server:
                 del worker_obj.global_data.clients_per_server[server_address]
+            # Server will send its channels again after the reconnection
+            worker_obj.set_server_channels(server_address, tuple())
+            worker_obj.global_data.client_count_versions.pop(server_address, None)
         connection.worker_obj.is_connection_to_the_server = False
 
     def unregister_current_connection_to_the_server(self):
         self.unregister_connection_to_the_server(self.connection)
 
-    def change_number_of_connected_clients(self, delta_num: int):
-        self.global_data.number_of_clients += delta_num
-        print('NUMBER OF OWN CONNECTED CLIENTS: {}'.format(self.global_data.number_of_clients))
-        self.global_data.clients_per_server[self.global_data.own_address] = self.global_data.number_of_clients
-        self.broadcast_request__to_servers__number_of_clients_changed()
+    def change_number_of_connected_clients(self, delta_num: int, notify_siblings=True):
+        '''
+        Updates are coalesced: other servers (and siblings) get the new number after the
+        client_count_gossip_interval, or right away if it differs significantly from the last sent one (see
+        Server.client_count_gossip_change)
+        :param delta_num: change of the number of own clients
+        :param notify_siblings: own number of clients should be sent to the siblings
+        :return:
+        '''
+        global_data = self.global_data
+        global_data.number_of_clients += delta_num
+        global_data.clients_per_server[global_data.own_address] = global_data.get_number_of_node_clients()
+        if notify_siblings:
+            global_data.is_number_of_own_clients_changed = True
+
+        if global_data.client_count_gossip_interval is None:
+            self.send_number_of_clients_update()
+            return
+
+        last_number = global_data.gossiped_number_of_clients
+        if (last_number is None) or (abs(global_data.get_number_of_node_clients() - last_number) >
+                                     last_number * global_data.client_count_gossip_change):
+            self.send_number_of_clients_update()
+        elif global_data.client_count_gossip_timer is None:
+            global_data.client_count_gossip_timer = self.api.call_later(global_data.client_count_gossip_interval,
+                                                                        self.send_number_of_clients_update)
+
+    def send_number_of_clients_update(self):
+        '''
+        Sends the current number of clients (accumulated by the change_number_of_connected_clients()) to the
+        siblings and to other servers
+        :return:
+        '''
+        global_data = self.global_data
+        if global_data.client_count_gossip_timer is not None:
+            self.api.cancel_timer(global_data.client_count_gossip_timer)
+            global_data.client_count_gossip_timer = None
+
+        global_data.number_of_client_count_updates += 1
+        print('NUMBER OF OWN CONNECTED CLIENTS: {}'.format(global_data.number_of_clients))
+        if global_data.is_number_of_own_clients_changed:
+            global_data.is_number_of_own_clients_changed = False
+            self.broadcast_request__to_siblings__number_of_clients()
+        number_of_node_clients = global_data.get_number_of_node_clients()
+        if (global_data.gossiped_number_of_clients is None) or \
+                (number_of_node_clients != global_data.gossiped_number_of_clients):
+            global_data.gossiped_number_of_clients = number_of_node_clients
+            self.broadcast_request__to_servers__number_of_clients_changed()
 
     def check_connection_to_the_server(self, address)->Connection:
         '''
         Check connection to the server. Reconnect if needed
         :param address: server address
-        :return: old or new connection to the server
+        :return: old or new connection to the server. None if the circuit of the server is open: it is considered dead
+            until the trial connection (see register_connection_failure())
         '''
         connection = self.global_data.deployed_servers_addresses[address]
         if connection is None:
+            circuit_breaker = self.global_data.circuit_breakers.get(address)
+            if (circuit_breaker is not None) and circuit_breaker.is_open():
+                self.global_data.number_of_avoided_connect_attempts += 1
+                return None
+
+            self.global_data.number_of_server_connect_attempts += 1
             new_worker_obj = MainWorker(self.global_data)
             new_worker_obj.is_connection_to_the_server = True
             new_worker_obj.server_address = address
-            new_connection_info = ConnectionInfo(new_worker_obj, ConnectionType.active_connected, address)
+            socket_options = None
+            if (self.global_data.inter_server_batch_deadline is not None) and \
+                    (socket.AF_UNIX != get_socket_family(address)):
+                # Strings are coalesced by the batching already (see broadcast_request__to_servers__client_string()):
+                #   Nagle's algorithm would only add delayed ACK stalls to the deadline
+                socket_options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
+            new_connection_info = ConnectionInfo(new_worker_obj, ConnectionType.active_connected, address,
+                                                 socket_options=socket_options,
+                                                 output_high_watermark=self.global_data.output_high_watermark,
+                                                 output_low_watermark=self.global_data.output_low_watermark,
+                                                 output_overflow_policy=self.global_data.output_overflow_policy)
             new_connection = self.api.make_connection(new_connection_info)
             self.global_data.deployed_servers_addresses[address] = new_connection
             connection = new_connection
             self.register_connection_as_a_connection_to_the_server(connection, address)
+            self.send_request__protocol_version(connection)
             self.send_request__server_arrived(connection)
+            if self.global_data.node_channels:
+                self.send_request__active_channels(connection)
         return connection
 
+    def register_connection_failure(self, address):
+        '''
+        Connection to the server was failed. Circuit of the server may be opened: there will be no new connections to
+        it (and no messages for it) until the trial connection made by the timer
+        :param address: server address
+        :return:
+        '''
+        global_data = self.global_data
+        circuit_breaker = global_data.circuit_breakers.get(address)
+        if circuit_breaker is None:
+            return
+
+        delay = circuit_breaker.on_failure()
+        if delay is None:
+            return
+
+        global_data.number_of_opened_circuits += 1
+        print('SERVER CIRCUIT IS OPEN FOR {:.2f} SECONDS: {}'.format(delay, address))
+        timer = global_data.circuit_trial_timers.pop(address, None)
+        if timer is not None:
+            self.api.cancel_timer(timer)
+        global_data.circuit_trial_timers[address] = self.api.call_later(delay, self.on_circuit_trial_timer, address)
+
+    def on_circuit_trial_timer(self, address):
+        global_data = self.global_data
+        global_data.circuit_trial_timers.pop(address, None)
+        global_data.circuit_breakers[address].on_trial()
+        # Connection is closed by the success (see close_circuit()) or opened again by the failure
+        self.check_connection_to_the_server(address)
+
+    def close_circuit(self, address):
+        '''
+        Server is alive: connections to it are made when needed
+        :param address: server address
+        :return:
+        '''
+        global_data = self.global_data
+        circuit_breaker = global_data.circuit_breakers.get(address)
+        if circuit_breaker is None:
+            return
+
+        circuit_breaker.on_success()
+        timer = global_data.circuit_trial_timers.pop(address, None)
+        if timer is not None:
+            self.api.cancel_timer(timer)
+
+    def attach_shared_memory_outbox(self, address, host_id, inbox_name):
+        '''
+        Will send messages to the co-located server through its shared memory inbox
+        :param address: server address
+        :param host_id: host id of the server (see get_host_id())
+        :param inbox_name: name of its inbox
+        :return:
+        '''
+        if (self.global_data.shared_memory_host_id is None) or (self.global_data.shared_memory_host_id != host_id):
+            return
+
+        self.detach_shared_memory_outbox(address, only_own=False)
+        producer_index = self.global_data.all_server_list.index(self.global_data.own_address)
+        try:
+            outbox = SharedMemoryOutbox(inbox_name, producer_index)
+        except (OSError, ValueError):
+            # Server is gone already or it is the different one. Messages will be sent through the TCP connection
+            print('SHARED MEMORY INBOX IS NOT AVAILABLE: {}'.format(address))
+            return
+        outbox.connection_id = self.connection.connection_id
+        self.global_data.shared_memory_outboxes[address] = outbox
+        print('SHARED MEMORY INBOX ATTACHED: {}'.format(address))
+
+    def detach_shared_memory_outbox(self, address=None, only_own=True):
+        '''
+        :param address: server address. Address of the current connection will be used if None
+        :param only_own: detach only if the outbox was attached by the current connection (server_arrived message
+            from the restarted server may come before the loss of the old connection will be detected)
+        :return:
+        '''
+        address = address or self.server_address
+        outbox = self.global_data.shared_memory_outboxes.get(address)
+        if outbox is None:
+            return
+        if only_own and (outbox.connection_id != self.connection.connection_id):
+            return
+
+        del self.global_data.shared_memory_outboxes[address]
+        outbox.close()
+
+    @staticmethod
+    def send_request__protocol_version(connection):
+        connection.worker_obj.is_protocol_version_requested = True
+        bin_message = encode_rpc__protocol_version(MIN_PROTOCOL_VERSION, PROTOCOL_VERSION)
+        connection.add_must_be_written_data(pack_message(bin_message))
+
     def send_request__server_arrived(self, connection):
-        message = {
-            FieldName.name: RPCName.server_arrived,
-            FieldName.address: self.global_data.own_address
-        }
-        bin_message = marshal.dumps(message)
+        shared_memory_inbox = None
+        if self.global_data.shared_memory_inbox is not None:
+            shared_memory_inbox = (self.global_data.shared_memory_host_id, self.global_data.shared_memory_inbox.name)
+        bin_message = encode_rpc(RPCName.server_arrived, self.global_data.own_address, shared_memory_inbox,
+                                 self.global_data.compressions, version=connection.worker_obj.output_protocol_version)
         packed_message = pack_message(bin_message)
         connection.add_must_be_written_data(packed_message)
         self.api.check_is_connection_need_to_sent_data(connection)
 
+    def send_request__active_channels(self, connection):
+        bin_message = encode_rpc(RPCName.active_channels, sorted(self.global_data.node_channels),
+                                 version=connection.worker_obj.output_protocol_version)
+        connection.add_must_be_written_data(pack_message(bin_message))
+        self.api.check_is_connection_need_to_sent_data(connection)
+
+    def start_stream_compression(self, peer_compressions):
+        '''
+        Messages to the server will be sent through the current connection compressed
+        :param peer_compressions: names of the compressions the server is willing to use
+        :return:
+        '''
+        name = choose_compression(peer_compressions)
+        if name is None:
+            return
+
+        bin_message = encode_rpc(RPCName.stream_compression, name, version=self.output_protocol_version)
+        self.connection.add_must_be_written_data(pack_message(bin_message))
+        compressor_class, decompressor_class = STREAM_COMPRESSIONS[name]
+        self.stream_compressor = compressor_class(self.global_data.compression_stats)
+        print('STREAM COMPRESSION: {}: {}'.format(self.server_address, name))
+
     def broadcast_request__to_servers__server_arrived(self):
         for address in self.global_data.deployed_servers_addresses:
             self.check_connection_to_the_server(address)
 
+    # Broadcasts are encoded once, by the PROTOCOL_VERSION: there is only one version supported for now. Connections
+    #   should be grouped by their output_protocol_version when MIN_PROTOCOL_VERSION will be less than PROTOCOL_VERSION
+
     def broadcast_request__to_servers__number_of_clients_changed(self):
-        for address in self.global_data.deployed_servers_addresses:
-            connection = self.check_connection_to_the_server(address)
-            message = {
-                FieldName.name: RPCName.number_of_clients_changed,
-                FieldName.clients: self.global_data.number_of_clients
-            }
-            bin_message = marshal.dumps(message)
-            packed_message = pack_message(bin_message)
-            connection.add_must_be_written_data(packed_message)
-            self.api.check_is_connection_need_to_sent_data(connection)
+        # Version is a system-wide monotonic time (microseconds): versions of the sibling processes are comparable,
+        #   so other servers will ignore a stale number sent by one sibling after the newer number sent by another.
+        global_data = self.global_data
+        global_data.client_count_version = max(global_data.client_count_version + 1, time.monotonic_ns() // 1000)
+        bin_message = encode_rpc(RPCName.versioned_number_of_clients, global_data.get_number_of_node_clients(),
+                                 global_data.client_count_version)
+        global_data.number_of_client_count_messages += self.broadcast_to_all_servers(bin_message)
 
     def broadcast_request__to_servers__client_string(self, client_string):
-        for address in self.global_data.deployed_servers_addresses:
-            connection = self.check_connection_to_the_server(address)
-            message = {
-                FieldName.name: RPCName.broadcast_string,
-                FieldName.string: client_string
-            }
-            bin_message = marshal.dumps(message)
-            packed_message = pack_message(bin_message)
-            connection.add_must_be_written_data(packed_message)
-            self.api.check_is_connection_need_to_sent_data(connection)
+        global_data = self.global_data
+        if not global_data.deployed_servers_addresses:
+            return
 
-    def broadcast_request__to_own_clients__client_string(self, client_string):
-        for connection in self.api.all_connections:
-            if ConnectionState.connected != connection.connection_state:
-                continue
-            if connection.worker_obj.is_connection_to_the_server:
+        if global_data.inter_server_batch_deadline is None:
+            bin_message = encode_rpc(RPCName.broadcast_string, client_string)
+            self.broadcast_to_all_servers(bin_message, droppable=True)
+            return
+
+        global_data.pending_broadcast_strings.append(client_string)
+        global_data.pending_broadcast_size += len(client_string)
+        if global_data.pending_broadcast_size >= global_data.inter_server_batch_size:
+            self.broadcast_request__to_servers__pending_strings()
+        elif global_data.broadcast_batch_timer is None:
+            global_data.broadcast_batch_timer = self.api.call_later(global_data.inter_server_batch_deadline,
+                                                                    self.broadcast_request__to_servers__pending_strings)
+
+    def broadcast_request__to_servers__pending_strings(self):
+        '''
+        Flushes strings accumulated by the broadcast_request__to_servers__client_string(): by the size threshold or by
+        the deadline timer
+        :return:
+        '''
+        global_data = self.global_data
+        if global_data.broadcast_batch_timer is not None:
+            self.api.cancel_timer(global_data.broadcast_batch_timer)
+            global_data.broadcast_batch_timer = None
+        strings = global_data.pending_broadcast_strings
+        if not strings:
+            return
+
+        global_data.pending_broadcast_strings = list()
+        global_data.pending_broadcast_size = 0
+        if 1 == len(strings):
+            bin_message = encode_rpc(RPCName.broadcast_string, strings[0])
+        else:
+            bin_message = encode_rpc(RPCName.broadcast_batch, strings)
+            global_data.number_of_broadcast_batches += 1
+            global_data.number_of_batched_strings += len(strings)
+        self.broadcast_to_all_servers(bin_message, droppable=True)
+
+    def broadcast_request__to_servers__active_channels(self):
+        if not self.global_data.deployed_servers_addresses:
+            return
+
+        bin_message = encode_rpc(RPCName.active_channels, sorted(self.global_data.node_channels))
+        self.broadcast_to_all_servers(bin_message)
+
+    def broadcast_request__to_servers__channel_string(self, channel, client_string):
+        addresses = self.global_data.servers_per_channel.get(channel)
+        if not addresses:
+            return
+
+        bin_message = encode_rpc(RPCName.broadcast_channel_string, channel, client_string)
+        self.global_data.number_of_channel_strings_to_servers += self.broadcast_to_all_servers(
+            bin_message, droppable=True, addresses=addresses)
+
+    def broadcast_to_all_servers(self, bin_message, droppable=False, addresses=None):
+        '''
+        Sends message to the co-located servers through their shared memory inboxes and to all other servers (and to
+        the co-located ones with the full inbox) through the TCP connections
+        Compressed connections get their own chunk of the compressed stream with this message (so each batch is
+        flushed by the compressor)
+        :param bin_message: serialized message (one of the SHARED_MEMORY_RPCS)
+        :param droppable: message may be dropped by the server connection with the full output queue. Chunks of the
+            compressed stream are never dropped: the rest of the stream could not be decompressed without them
+        :param addresses: addresses of the destination servers. All servers if None: through the relay topology if it
+            is used (see relay_to_all_servers()). Servers with the open circuit are skipped
+        :return: number of the sent copies
+        '''
+        if (addresses is None) and (self.global_data.relay_topology is not None):
+            return self.relay_to_all_servers(bin_message, droppable)
+
+        outboxes = self.global_data.shared_memory_outboxes
+        packed_message = pack_message(bin_message)
+        connections = list()
+        if addresses is None:
+            server_connections = self.get_connections_to_all_servers()
+        else:
+            server_connections = [connection for connection in map(self.check_connection_to_the_server, addresses)
+                                  if connection is not None]
+        for connection in server_connections:
+            if outboxes and (ConnectionState.connected == connection.connection_state):
+                outbox = outboxes.get(connection.worker_obj.server_address)
+                if (outbox is not None) and outbox.put(bin_message):
+                    continue
+            compressor = connection.worker_obj.stream_compressor
+            if compressor is not None:
+                bin_chunk = encode_rpc(RPCName.compressed, compressor.compress(packed_message))
+                connection.add_must_be_written_data(pack_message(bin_chunk))
+                self.api.check_is_connection_need_to_sent_data(connection)
                 continue
-            if connection == self.connection:
+            connections.append(connection)
+        if connections:
+            self.api.broadcast(connections, packed_message, droppable)
+        return len(server_connections)
+
+    def relay_to_all_servers(self, bin_message, droppable=False)->int:
+        '''
+        Sends own message to all other servers through the relay topology (see relay_topology.py)
+        :param bin_message: serialized message (one of the SHARED_MEMORY_RPCS)
+        :param droppable: see broadcast_to_all_servers()
+        :return: number of the sent copies
+        '''
+        global_data = self.global_data
+        # Sequences are started from the current time: duplicate filters of other servers will not take messages of
+        #   the restarted server for the already seen ones
+        global_data.relay_sequence = max(global_data.relay_sequence + 1, time.time_ns() // 1000)
+        return self.forward_relay_message(global_data.relay_topology.own_index, global_data.sibling_index,
+                                          global_data.relay_sequence, RelayStage.own, bin_message, droppable)
+
+    def forward_relay_message(self, origin, sibling, sequence, stage, bin_message, droppable)->int:
+        '''
+        Sends message to the next servers of the relay topology
+        :param origin: index of the server that made the message
+        :param sibling: index of the process of that server
+        :param sequence: sequence of the message
+        :param stage: RelayStage of the received message (RelayStage.own for the own message)
+        :param bin_message: serialized relayed message
+        :param droppable: see broadcast_to_all_servers()
+        :return: number of the sent copies
+        '''
+        global_data = self.global_data
+        addresses_per_stage = dict()
+        destinations = global_data.relay_topology.get_destinations(origin, stage)
+        for index, next_stage in destinations:
+            addresses_per_stage.setdefault(next_stage, list()).append(global_data.all_server_list[index])
+        for next_stage, addresses in addresses_per_stage.items():
+            relay_message = encode_rpc(RPCName.relay, origin, sibling, sequence, next_stage, bin_message)
+            self.broadcast_to_all_servers(relay_message, droppable, addresses)
+        global_data.number_of_relayed_messages += len(destinations)
+        return len(destinations)
+
+    def mark_server_dead(self, address):
+        '''
+        Relay topology will not use the server until the connection to it will be established again. Reconnection is
+        tried each RELAY_RECONNECT_INTERVAL
+        :param address: address of the server with the lost (or failed) connection
+        :return:
+        '''
+        global_data = self.global_data
+        if global_data.relay_topology.mark_dead(global_data.server_indexes[address]):
+            print('RELAY TOPOLOGY REBUILT: SERVER IS DEAD: {}'.format(address))
+        if address not in global_data.relay_reconnect_timers:
+            global_data.relay_reconnect_timers[address] = self.api.call_later(
+                RELAY_RECONNECT_INTERVAL, self.reconnect_to_the_dead_server, address)
+
+    def mark_server_alive(self, address):
+        global_data = self.global_data
+        if global_data.relay_topology.mark_alive(global_data.server_indexes[address]):
+            print('RELAY TOPOLOGY REBUILT: SERVER IS ALIVE: {}'.format(address))
+        timer = global_data.relay_reconnect_timers.pop(address, None)
+        if timer is not None:
+            self.api.cancel_timer(timer)
+
+    def reroute_relay_messages(self):
+        '''
+        Connection to the server (which is already marked dead) was never established: relayed messages queued for it
+        are sent to the server that replaces it in the rebuilt topology. Messages for the server which was gone after
+        the connection are lost (as with the full mesh)
+        :return:
+        '''
+        global_data = self.global_data
+        topology = global_data.relay_topology
+        dead_group = global_data.server_indexes[self.server_address] // topology.group_size
+        frame_decoder = FrameDecoder()
+        for message in frame_decoder.feed(b''.join(self.connection.output_buffer.chunks)):
+            rpc_name, fields = decode_rpc(message)
+            if RPCName.relay != rpc_name:
                 continue
+            origin, sibling, sequence, stage, bin_message = fields
+            bin_message = bytes(bin_message)
+            droppable = decode_rpc(bin_message)[0] in DROPPABLE_SERVER_RPCS
+            if RelayStage.to_hub == stage:
+                # Own message: to the next hub of the own group (or to everyone if this server is the hub now)
+                self.forward_relay_message(origin, sibling, sequence, RelayStage.own, bin_message, droppable)
+            elif (RelayStage.between_hubs == stage) and (topology.hubs[dead_group] is not None):
+                relay_message = encode_rpc(RPCName.relay, origin, sibling, sequence, stage, bin_message)
+                self.broadcast_to_all_servers(relay_message, droppable,
+                                              (global_data.all_server_list[topology.hubs[dead_group]],))
+                global_data.number_of_relayed_messages += 1
+
+    def reconnect_to_the_dead_server(self, address):
+        global_data = self.global_data
+        global_data.relay_reconnect_timers.pop(address, None)
+        if global_data.server_indexes[address] in global_data.relay_topology.dead_servers:
+            # Will be marked alive when connected, or dead again (with the next try) when failed
+            self.check_connection_to_the_server(address)
+
+    def broadcast_request__to_own_clients__client_string(self, client_string):
+        bin_message = encode_rpc(RPCName.print_string, client_string)
+        packed_message = pack_message(bin_message)
+        self.api.broadcast(self.get_connections_to_own_clients(), packed_message, droppable=True)
+
+    def broadcast_request__to_own_clients__channel_string(self, channel, client_string):
+        subscribers = self.global_data.channel_connections.get(channel)
+        if not subscribers:
+            return
+
+        current_connection = self.connection
+        connections = [connection for connection in subscribers
+                       if (connection is not current_connection) and
+                       (ConnectionState.connected == connection.connection_state)]
+        bin_message = encode_rpc(RPCName.print_channel_string, channel, client_string)
+        packed_message = pack_message(bin_message)
+        self.api.broadcast(connections, packed_message, droppable=True)
+
+    def broadcast_request__to_siblings__channel_string(self, channel, client_string):
+        channels_per_sibling = self.global_data.channels_per_sibling
+        if not channels_per_sibling:
+            return
+
+        connections = [connection for connection in self.global_data.sibling_connections
+                       if channel in channels_per_sibling.get(connection.connection_id, tuple())]
+        if not connections:
+            return
+        bin_message = encode_rpc(RPCName.sibling_channel_string, channel, client_string)
+        packed_message = pack_message(bin_message)
+        self.api.broadcast(connections, packed_message)
+
+    def broadcast_request__to_siblings__channels(self):
+        if not self.global_data.sibling_connections:
+            return
+
+        bin_message = encode_rpc(RPCName.sibling_channels, sorted(self.global_data.channel_connections))
+        packed_message = pack_message(bin_message)
+        self.api.broadcast(self.global_data.sibling_connections, packed_message)
+
+    def change_active_channels(self, notify_siblings=True):
+        '''
+        Should be called when some channel of this process (or of its sibling) got the first subscriber or lost
+        the last one. Other servers are notified only if the set of channels of the whole node was changed
+        :param notify_siblings: send own channels to the siblings
+        :return:
+        '''
+        global_data = self.global_data
+        if notify_siblings:
+            self.broadcast_request__to_siblings__channels()
+        node_channels = frozenset(global_data.channel_connections).union(*global_data.channels_per_sibling.values())
+        if node_channels != global_data.node_channels:
+            global_data.node_channels = node_channels
+            self.broadcast_request__to_servers__active_channels()
+
+    def remove_channel_subscriber(self, channel):
+        channel_connections = self.global_data.channel_connections
+        subscribers = channel_connections.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard(self.connection)
+        if not subscribers:
+            del channel_connections[channel]
+            self.change_active_channels()
+
+    def set_server_channels(self, address, channels):
+        '''
+        Updates channels of the other server and the channel -> servers index
+        :param address: server address
+        :param channels: all channels with subscribers on that server
+        :return:
+        '''
+        global_data = self.global_data
+        new_channels = set(channels)
+        old_channels = global_data.channels_per_server.get(address, set())
+        for channel in old_channels - new_channels:
+            addresses = global_data.servers_per_channel[channel]
+            addresses.discard(address)
+            if not addresses:
+                del global_data.servers_per_channel[channel]
+        for channel in new_channels - old_channels:
+            global_data.servers_per_channel.setdefault(channel, set()).add(address)
+        if new_channels:
+            global_data.channels_per_server[address] = new_channels
+        else:
+            global_data.channels_per_server.pop(address, None)
+
+    def broadcast_request__to_siblings__client_string(self, client_string):
+        if not self.global_data.sibling_connections:
+            return
+
+        bin_message = encode_rpc(RPCName.sibling_string, client_string)
+        packed_message = pack_message(bin_message)
+        self.api.broadcast(self.global_data.sibling_connections, packed_message)
+
+    def broadcast_request__to_siblings__number_of_clients(self):
+        if not self.global_data.sibling_connections:
+            return
+
+        bin_message = encode_rpc(RPCName.sibling_number_of_clients, self.global_data.number_of_clients)
+        packed_message = pack_message(bin_message)
+        self.api.broadcast(self.global_data.sibling_connections, packed_message)
+
+    def get_connections_to_all_servers(self)->list:
+        '''
+        Checks (and reconnects if needed) connections to all servers
+        :return: list of connections to all other servers except the ones with the open circuit
+        '''
+        addresses = self.global_data.deployed_servers_addresses
+        return [connection for connection in map(self.check_connection_to_the_server, addresses)
+                if connection is not None]
 
-            message = {
-                FieldName.name: RPCName.print_string,
-                FieldName.string: client_string
-            }
-            bin_message = marshal.dumps(message)
-            packed_message = pack_message(bin_message)
-            connection.add_must_be_written_data(packed_message)
-            self.api.check_is_connection_need_to_sent_data(connection)
-
-    def input_message_handler(self, message: bytes):
-        message = marshal.loads(message)
-        if message[FieldName.name] in self.input_rpc_handlers:
+    def get_connections_to_own_clients(self)->list:
+        '''
+        :return: list of connections to all own clients except the current connection
+        '''
+        # Index is maintained by rpc_input__client_arrived() and on_connection_lost(): passive socket, server and
+        #   sibling links are not scanned for each chat line
+        current_connection = self.connection
+        return [connection for connection in self.global_data.client_connections
+                if (connection is not current_connection) and
+                (ConnectionState.connected == connection.connection_state)]
+
+    def input_message_handler(self, message):
+        try:
+            rpc_name, fields = decode_rpc(message, self.input_protocol_version)
+        except WrongRPCMessage as err:
+            print('WRONG RPC: {}'.format(err))
+            return
+
+        if rpc_name in self.input_rpc_handlers:
             # run an appropriate rpc handler
-            self.input_rpc_handlers[message[FieldName.name]](message)
+            self.input_rpc_handlers[rpc_name](*fields)
         else:
-            print('WRONG RPC: {}'.format(message))
+            print('WRONG RPC: {}'.format(rpc_name))
 
     def prepare_input_rpc_handlers(self):
         self.input_rpc_handlers = {
             RPCName.server_arrived: self.rpc_input__server_arrived,
             RPCName.number_of_clients_changed: self.rpc_input__number_of_clients_changed,
+            RPCName.versioned_number_of_clients: self.rpc_input__versioned_number_of_clients,
             RPCName.client_string: self.rpc_input__client_string,
             RPCName.give_me_best_server: self.rpc_input__give_me_best_server,
             RPCName.give_me_clients_per_server: self.rpc_input__give_me_clients_per_server,
             RPCName.broadcast_string: self.rpc_input__broadcast_string,
             RPCName.client_arrived: self.rpc_input__client_arrived,
+            RPCName.sibling_string: self.rpc_input__sibling_string,
+            RPCName.sibling_number_of_clients: self.rpc_input__sibling_number_of_clients,
+            RPCName.protocol_version: self.rpc_input__protocol_version,
+            RPCName.broadcast_batch: self.rpc_input__broadcast_batch,
+            RPCName.stream_compression: self.rpc_input__stream_compression,
+            RPCName.compressed: self.rpc_input__compressed,
+            RPCName.join_channel: self.rpc_input__join_channel,
+            RPCName.leave_channel: self.rpc_input__leave_channel,
+            RPCName.channel_string: self.rpc_input__channel_string,
+            RPCName.broadcast_channel_string: self.rpc_input__broadcast_channel_string,
+            RPCName.sibling_channel_string: self.rpc_input__sibling_channel_string,
+            RPCName.active_channels: self.rpc_input__active_channels,
+            RPCName.sibling_channels: self.rpc_input__sibling_channels,
+            RPCName.relay: self.rpc_input__relay,
+            RPCName.client_bootstrap: self.rpc_input__client_bootstrap,
         }
 
-    def rpc_input__server_arrived(self, message):
-        address = message[FieldName.address]
+    def rpc_input__protocol_version(self, min_version, max_version):
+        if self.is_protocol_version_requested:
+            # Response to the own request: both fields are the version chosen by the peer. Peer will encode the rest
+            # of its messages by it
+            if not (MIN_PROTOCOL_VERSION <= max_version <= PROTOCOL_VERSION):
+                print('INCOMPATIBLE PROTOCOL VERSION OF THE PEER: {}'.format(max_version))
+                self.api.remove_connection(self.connection)
+                return
+            self.is_protocol_version_requested = False
+            self.input_protocol_version = max_version
+            # Confirmation: the rest of the own messages will be encoded by the chosen version
+            bin_message = encode_rpc__protocol_version(max_version, max_version)
+            self.connection.add_must_be_written_data(pack_message(bin_message))
+            self.output_protocol_version = max_version
+        elif self.is_protocol_version_chosen:
+            # Confirmation of the chosen version
+            self.input_protocol_version = max_version
+        else:
+            # Request from the connected peer
+            version = choose_protocol_version(min_version, max_version)
+            if version is None:
+                print('INCOMPATIBLE PROTOCOL VERSIONS OF THE PEER: {}..{}'.format(min_version, max_version))
+                self.api.remove_connection(self.connection)
+                return
+            self.is_protocol_version_chosen = True
+            bin_message = encode_rpc__protocol_version(version, version)
+            self.connection.add_must_be_written_data(pack_message(bin_message))
+            self.output_protocol_version = version
+
+    def rpc_input__server_arrived(self, address, shared_memory_inbox, compressions):
         if address in self.global_data.deployed_servers_addresses:
             if self.unknown__client_or_server_connection:
                 self.unknown__client_or_server_connection = False
+            need_to_reply = False
+            need_to_send_channels = False
+            if not self.is_connection_to_the_server:
+                # Other server will send its number of clients through this connection
+                self.is_connection_from_the_server = True
+                self.server_address = address
+                # Other server may compress its messages only if it knows own compressions
+                need_to_reply = bool(self.global_data.compressions)
+                # Other server may be just restarted: it does not know own channels yet
+                need_to_send_channels = bool(self.global_data.node_channels)
+            if shared_memory_inbox is not None:
+                host_id, inbox_name = shared_memory_inbox
+                self.attach_shared_memory_outbox(address, host_id, inbox_name)
+            if self.global_data.relay_topology is not None:
+                self.mark_server_alive(address)
+            self.close_circuit(address)
             if self.global_data.deployed_servers_addresses[address] is None:
                 self.register_current_connection_as_a_connection_to_the_server(address)
                 print('SERVER ARRIVED: {}'.format(address))
+                if self.global_data.shared_memory_inbox is not None:
+                    # There will be no own connection to this server, so it will not get the inbox name otherwise
+                    need_to_reply = True
+            if need_to_reply:
+                self.send_request__server_arrived(self.connection)
+            if need_to_send_channels:
+                self.send_request__active_channels(self.connection)
+            if compressions and self.global_data.compressions and self.is_connection_to_the_server and \
+                    (self.stream_compressor is None):
+                self.start_stream_compression(compressions)
         else:
             self.api.remove_connection(self.connection)
 
-    def rpc_input__client_arrived(self, message):
+    def rpc_input__stream_compression(self, name):
+        # The rest of the messages from the other server will be compressed (see start_stream_compression())
+        if name not in STREAM_COMPRESSIONS:
+            print('UNSUPPORTED STREAM COMPRESSION: {}'.format(name))
+            self.api.remove_connection(self.connection)
+            return
+        compressor_class, decompressor_class = STREAM_COMPRESSIONS[name]
+        self.stream_decompressor = decompressor_class(self.global_data.compression_stats)
+        self.compressed_frame_decoder = FrameDecoder()
+
+    def rpc_input__compressed(self, bin_chunk):
+        if self.stream_decompressor is None:
+            print('WRONG RPC: compressed data before the stream_compression')
+            self.api.remove_connection(self.connection)
+            return
+        data = self.stream_decompressor.decompress(bin_chunk)
+        for message in self.compressed_frame_decoder.feed(data):
+            self.input_message_handler(message)
+
+    def rpc_input__relay(self, origin, sibling, sequence, stage, bin_message):
+        global_data = self.global_data
+        if (global_data.relay_topology is None) or not (0 <= origin < len(global_data.all_server_list)):
+            print('WRONG RPC: relay from {}'.format(self.server_address))
+            return
+        if (global_data.relay_topology.own_index == origin) or \
+                (not global_data.relay_duplicate_filter.is_new((origin, sibling), sequence)):
+            return
+
+        # Copy: message may be a view of the shared memory inbox record, which will be reused after this call
+        bin_message = bytes(bin_message)
+        try:
+            rpc_name, fields = decode_rpc(bin_message)
+        except WrongRPCMessage as err:
+            print('WRONG RELAYED RPC: {}'.format(err))
+            return
+        if (rpc_name not in SHARED_MEMORY_RPCS) or (RPCName.relay == rpc_name):
+            print('WRONG RELAYED RPC: {}'.format(rpc_name))
+            return
+        self.forward_relay_message(origin, sibling, sequence, stage, bin_message, rpc_name in DROPPABLE_SERVER_RPCS)
+        relay_worker = global_data.relay_worker
+        relay_worker.server_address = global_data.all_server_list[origin]
+        relay_worker.input_rpc_handlers[rpc_name](*fields)
+
+    def rpc_input__client_arrived(self):
         if self.unknown__client_or_server_connection:
             self.unknown__client_or_server_connection = False
+        self.global_data.client_connections.add(self.connection)
         self.change_number_of_connected_clients(1)
 
-    def rpc_input__number_of_clients_changed(self, message):
+    def rpc_input__client_bootstrap(self, number_of_redirects):
+        # Single round trip instead of give_me_clients_per_server and the reconnection by the client itself
+        global_data = self.global_data
+        redirect_address = None
+        if (global_data.bootstrap_load_tolerance is not None) and (number_of_redirects < MAX_BOOTSTRAP_REDIRECTS):
+            redirect_address = self.get_bootstrap_redirect_address()
+        if redirect_address is None:
+            global_data.number_of_accepted_bootstraps += 1
+            self.rpc_input__client_arrived()
+            bin_message = encode_rpc(RPCName.client_accepted, version=self.output_protocol_version)
+        else:
+            global_data.number_of_bootstrap_redirects += 1
+            bin_message = encode_rpc(RPCName.best_server, redirect_address, version=self.output_protocol_version)
+        self.connection.add_must_be_written_data(pack_message(bin_message))
+
+    def get_bootstrap_redirect_address(self):
+        '''
+        :return: server for the new client if this server is loaded more than the least loaded one (with the
+            Server.bootstrap_load_tolerance); None if the client should be accepted
+        '''
+        clients_per_server = self.global_data.clients_per_server
+        own_address = self.global_data.own_address
+        own_load = clients_per_server.get(own_address, 0)
+        least_loaded_address = clients_per_server.get_least_loaded()
+        if least_loaded_address is None:
+            return None
+        least_load = clients_per_server[least_loaded_address]
+        if own_load <= least_load * (1 + self.global_data.bootstrap_load_tolerance) + BOOTSTRAP_LOAD_SLACK:
+            return None
+        # Not always the least loaded one: all clients that come at once would be redirected to the same server
+        address = choose_server(clients_per_server, own_address)
+        if (address == own_address) or (clients_per_server[address] >= own_load):
+            address = least_loaded_address
+        return address
+
+    def rpc_input__number_of_clients_changed(self, clients):
         if self.server_address is not None:
-            self.global_data.clients_per_server[self.server_address] = message[FieldName.clients]
+            self.global_data.clients_per_server[self.server_address] = clients
+
+    def rpc_input__versioned_number_of_clients(self, clients, version):
+        # The same server may send updates through its TCP connection, through the shared memory inbox and from
+        #   each of its processes: they may come in the wrong order
+        if self.server_address is None:
+            return
+        if version <= self.global_data.client_count_versions.get(self.server_address, -1):
+            return
+        self.global_data.client_count_versions[self.server_address] = version
+        self.global_data.clients_per_server[self.server_address] = clients
 
-    def rpc_input__client_string(self, message):
-        client_string = message[FieldName.string]
+    def rpc_input__client_string(self, client_string):
         self.broadcast_request__to_servers__client_string(client_string)
+        self.broadcast_request__to_siblings__client_string(client_string)
         self.broadcast_request__to_own_clients__client_string(client_string)
 
-    def rpc_input__give_me_best_server(self, message):
-        best_server_address = min(self.global_data.clients_per_server, key=self.global_data.clients_per_server.get)
-        message = {
-            FieldName.name: RPCName.best_server,
-            FieldName.address: best_server_address
-        }
-        bin_message = marshal.dumps(message)
+    def rpc_input__give_me_best_server(self):
+        best_server_address = self.global_data.clients_per_server.get_least_loaded()
+        bin_message = encode_rpc(RPCName.best_server, best_server_address, version=self.output_protocol_version)
         packed_message = pack_message(bin_message)
         self.connection.add_must_be_written_data(packed_message)
 
-    def rpc_input__give_me_clients_per_server(self, message):
-        message = {
-            FieldName.name: RPCName.clients_per_server,
-            FieldName.clients_per_server: self.global_data.clients_per_server
-        }
-        bin_message = marshal.dumps(message)
+    def rpc_input__give_me_clients_per_server(self):
+        bin_message = encode_rpc(RPCName.clients_per_server, self.global_data.clients_per_server,
+                                 version=self.output_protocol_version)
         packed_message = pack_message(bin_message)
         self.connection.add_must_be_written_data(packed_message)
 
-    def rpc_input__broadcast_string(self, message):
-        client_string = message[FieldName.string]
+    def rpc_input__broadcast_string(self, client_string):
+        # Other server sends each string to only one process of this node
+        self.broadcast_request__to_siblings__client_string(client_string)
         self.broadcast_request__to_own_clients__client_string(client_string)
 
+    def rpc_input__broadcast_batch(self, client_strings):
+        for client_string in client_strings:
+            self.rpc_input__broadcast_string(client_string)
+
+    def rpc_input__sibling_string(self, client_string):
+        self.broadcast_request__to_own_clients__client_string(client_string)
+
+    def rpc_input__sibling_number_of_clients(self, clients):
+        self.global_data.clients_per_sibling[self.connection.connection_id] = clients
+        self.change_number_of_connected_clients(0, notify_siblings=False)
+
+    def rpc_input__join_channel(self, channel):
+        if channel in self.channels:
+            return
+        self.channels.add(channel)
+        subscribers = self.global_data.channel_connections.get(channel)
+        if subscribers is None:
+            subscribers = self.global_data.channel_connections[channel] = set()
+            subscribers.add(self.connection)
+            self.change_active_channels()
+        else:
+            subscribers.add(self.connection)
+
+    def rpc_input__leave_channel(self, channel):
+        if channel not in self.channels:
+            return
+        self.channels.remove(channel)
+        self.remove_channel_subscriber(channel)
+
+    def rpc_input__channel_string(self, channel, client_string):
+        self.broadcast_request__to_servers__channel_string(channel, client_string)
+        self.broadcast_request__to_siblings__channel_string(channel, client_string)
+        self.broadcast_request__to_own_clients__channel_string(channel, client_string)
+
+    def rpc_input__broadcast_channel_string(self, channel, client_string):
+        # Other server sends each string to only one process of this node
+        self.broadcast_request__to_siblings__channel_string(channel, client_string)
+        self.broadcast_request__to_own_clients__channel_string(channel, client_string)
+
+    def rpc_input__sibling_channel_string(self, channel, client_string):
+        self.broadcast_request__to_own_clients__channel_string(channel, client_string)
+
+    def rpc_input__active_channels(self, channels):
+        if self.server_address is not None:
+            self.set_server_channels(self.server_address, channels)
+
+    def rpc_input__sibling_channels(self, channels):
+        self.global_data.channels_per_sibling[self.connection.connection_id] = set(channels)
+        self.change_active_channels(notify_siblings=False)
+
+
+class SharedMemoryInboxReader:
+    '''
+    Processes messages written by the co-located servers into the own shared memory inbox. Messages are handled by
+    the MainWorker (without connection) as if they were received from the producer TCP connection
+    '''
+    def __init__(self, global_data: GlobalDataForAllWorkers, api: NetIOUserApi, inbox: SharedMemoryInbox):
+        self.global_data = global_data
+        self.api = api
+        self.inbox = inbox
+        self.worker_obj = MainWorker(global_data)
+        self.worker_obj.api = api
+        self.worker_obj.is_connection_from_the_server = True
+        self.worker_obj.unknown__client_or_server_connection = False
+        self.poll_timer = None
+
+    def start(self):
+        self.api.add_reader(self.inbox.doorbell_fd, self.on_doorbell)
+        self.poll_timer = self.api.call_later(SHARED_MEMORY_INBOX_POLL_INTERVAL, self.on_poll_timer)
+
+    def on_doorbell(self):
+        self.inbox.drain_doorbell()
+        self.read_all_records()
+
+    def on_poll_timer(self):
+        self.read_all_records()
+        self.poll_timer = self.api.call_later(SHARED_MEMORY_INBOX_POLL_INTERVAL, self.on_poll_timer)
+
+    def read_all_records(self):
+        worker_obj = self.worker_obj
+        for producer_index, record in self.inbox.get_records():
+            try:
+                rpc_name, fields = decode_rpc(record)
+            except WrongRPCMessage as err:
+                print('WRONG SHARED MEMORY RPC: {}'.format(err))
+                continue
+            finally:
+                record.release()
+            if rpc_name in SHARED_MEMORY_RPCS:
+                worker_obj.server_address = self.global_data.all_server_list[producer_index]
+                worker_obj.input_rpc_handlers[rpc_name](*fields)
+            else:
+                print('WRONG SHARED MEMORY RPC: {}'.format(rpc_name))
+
 
 class Server(Process):
-    def __init__(self, own_server_address, all_server_list: list=None):
+    def __init__(self, own_server_address, all_server_list: list=None, transport=IOMethodEpollLT,
+                 write_through=False, backlog=DEFAULT_BACKLOG, accept_batch_size=DEFAULT_ACCEPT_BATCH_SIZE,
+                 number_of_processes=1, use_shared_memory=False,
+                 inter_server_batch_deadline=DEFAULT_INTER_SERVER_BATCH_DEADLINE,
+                 inter_server_batch_size=DEFAULT_INTER_SERVER_BATCH_SIZE, use_compression=False,
+                 output_high_watermark=DEFAULT_OUTPUT_HIGH_WATERMARK,
+                 output_low_watermark=DEFAULT_OUTPUT_LOW_WATERMARK,
+                 output_overflow_policy=OutputOverflowPolicy.drop_oldest,
+                 client_count_gossip_interval=DEFAULT_CLIENT_COUNT_GOSSIP_INTERVAL,
+                 client_count_gossip_change=DEFAULT_CLIENT_COUNT_GOSSIP_CHANGE,
+                 use_relay_topology=False, relay_group_size=None,
+                 bootstrap_load_tolerance=DEFAULT_BOOTSTRAP_LOAD_TOLERANCE,
+                 circuit_breaker_failure_threshold=DEFAULT_CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+                 peer_reconnect_max_delay=DEFAULT_RECONNECT_MAX_DELAY):
+        '''
+        :param own_server_address: address of this server (one of the all_server_list items). (host, port) tuple
+            for TCP or path string for the AF_UNIX socket (see get_socket_family())
+        :param all_server_list: addresses of all cluster servers. Will be loaded from server_list.txt if not provided
+        :param transport: IOMethod class to be used by the NetIO (IOMethodEpollLT, IOMethodEpollET, etc.)
+        :param write_through: see NetIO.write_through
+        :param backlog: listen() backlog of the server socket. Big enough backlog prevents SYN drops when thousands of
+            clients are reconnecting at once (after the other server's fault for example)
+        :param accept_batch_size: see NetIO.accept_batch_size
+        :param number_of_processes: number of worker processes (siblings) for this address. All of them are listening
+            the same address (SO_REUSEPORT), so the kernel will balance incoming connections between them. Siblings
+            are exchanging client strings and number of clients through the socketpair() connections and look like
+            a single server for clients and other servers. Server address should be a TCP one in this case
+        :param use_shared_memory: messages from the co-located servers will be received through the shared memory
+            inbox (see shared_memory_ring.py) instead of TCP connections. Servers on the other hosts (and servers
+            which are not using the shared memory) will still use TCP. Can not be used with number_of_processes > 1:
+            one inbox per server address
+        :param inter_server_batch_deadline: client strings are sent to other servers in batches (one frame and one
+            send per batch instead of per string). Batch is flushed when it reaches the inter_server_batch_size or
+            after this deadline (seconds) since its first string. None: no batching - each string is sent right away
+        :param inter_server_batch_size: flush threshold: total length of the batched strings
+        :param use_compression: messages to other servers will be compressed (LZ4 if python-lz4 is installed, zlib
+            otherwise: see stream_compression.py) if they are using compression too. Each batch is a separately
+            flushed chunk of the per-connection compressed stream. Saves bandwidth between sites at the cost of CPU
+        :param output_high_watermark: max number of queued output bytes per client (and per server) connection. Chat
+            lines for the slow consumer that do not fit are handled by the output_overflow_policy, so a client which
+            does not read can not make server to run out of memory. None: output queues are unbounded
+        :param output_low_watermark: see ConnectionInfo.output_low_watermark
+        :param output_overflow_policy: drop the oldest queued chat lines, drop the new ones or disconnect the slow
+            consumer (see OutputOverflowPolicy). Control messages are never dropped
+        :param client_count_gossip_interval: changes of the number of clients are coalesced: other servers get one
+            message per this interval (seconds) instead of one per each connected or disconnected client (thousands of
+            them during the mass reconnect). None: each change is sent right away
+        :param client_count_gossip_change: relative change of the number of clients (since the last sent one) which is
+            sent right away without waiting for the interval
+        :param use_relay_topology: messages to all servers (chat lines, numbers of clients, channels) are sent through
+            the two-level relay topology instead of the full mesh (see relay_topology.py): each server sends each
+            message to a few other servers and keeps a few connections instead of connecting to all servers. All
+            cluster servers should use the same server list and relay settings. Channel lines are still sent directly
+            to the servers with subscribers
+        :param relay_group_size: number of servers in each group of the relay topology. None: square root of the
+            number of servers
+        :param bootstrap_load_tolerance: new client (see client_bootstrap RPC) is accepted if this server has no more
+            clients than the least loaded one plus this share (and plus BOOTSTRAP_LOAD_SLACK clients), otherwise it is
+            redirected to a less loaded server. None: clients are always accepted
+        :param circuit_breaker_failure_threshold: number of the failed connections in a row to the other server that
+            opens its circuit: server is skipped by broadcasts and there are no connect attempts until the trial
+            connection. Trial is made after the growing random delay (see DecorrelatedJitterBackoff). Server that
+            connects to this one closes its circuit right away. None: circuit breakers are not used
+        :param peer_reconnect_max_delay: max time the circuit stays open, seconds
+        '''
         super().__init__()
+        if (number_of_processes > 1) and (socket.AF_UNIX == get_socket_family(own_server_address)):
+            raise ValueError('SO_REUSEPORT is not supported for the AF_UNIX sockets: use TCP address for the '
+                             'multi-process server')
+
+        self.transport = transport
+        self.write_through = write_through
+        self.backlog = backlog
+        self.accept_batch_size = accept_batch_size
+        self.number_of_processes = number_of_processes
+        self.use_shared_memory = use_shared_memory and (1 == number_of_processes) and (shared_memory is not None)
         self.own_server_address = own_server_address
         self.all_server_list = all_server_list
         if self.all_server_list is None:
@@ -280,19 +1248,127 @@ class Server(Process):
 
         self.global_data = GlobalDataForAllWorkers()
         self.global_data.own_address = self.own_server_address
+        self.global_data.all_server_list = self.all_server_list
+        self.global_data.inter_server_batch_deadline = inter_server_batch_deadline
+        self.global_data.inter_server_batch_size = inter_server_batch_size
+        if use_compression:
+            self.global_data.compressions = get_supported_compressions()
+        self.global_data.output_high_watermark = output_high_watermark
+        self.global_data.output_low_watermark = output_low_watermark
+        self.global_data.output_overflow_policy = output_overflow_policy
+        self.global_data.client_count_gossip_interval = client_count_gossip_interval
+        self.global_data.client_count_gossip_change = client_count_gossip_change
+        self.global_data.bootstrap_load_tolerance = bootstrap_load_tolerance
         for address in self.all_server_list:
             if address == self.own_server_address:
                 continue
             self.global_data.deployed_servers_addresses[address] = None
+            if circuit_breaker_failure_threshold is not None:
+                self.global_data.circuit_breakers[address] = CircuitBreaker(
+                    circuit_breaker_failure_threshold, DecorrelatedJitterBackoff(max_delay=peer_reconnect_max_delay))
+        self.global_data.server_indexes = {address: index for index, address in enumerate(self.all_server_list)}
+        if use_relay_topology:
+            self.global_data.relay_topology = RelayTopology(len(self.all_server_list),
+                                                            self.global_data.server_indexes[self.own_server_address],
+                                                            relay_group_size)
 
     def run(self):
-        io = NetIO(IOMethodEpollLT)
+        # One socketpair() per each pair of siblings
+        sockets_by_pair = dict()
+        for index in range(self.number_of_processes):
+            for sibling_index in range(index + 1, self.number_of_processes):
+                sockets_by_pair[(index, sibling_index)] = socket.socketpair()
+
+        context = multiprocessing.get_context('fork')
+        processes = list()
+        for index in range(1, self.number_of_processes):
+            process = context.Process(target=self.run_sibling, args=(index, sockets_by_pair))
+            process.start()
+            processes.append(process)
+        try:
+            self.run_sibling(0, sockets_by_pair)
+        finally:
+            for process in processes:
+                process.join()
+
+    def run_sibling(self, index, sockets_by_pair: dict):
+        '''
+        Runs IO loop of one of the server processes
+        :param index: sibling index. Sibling 0 is the parent process: all others will stop when it will be gone
+        :param sockets_by_pair: {(index_a, index_b): (socket_of_a, socket_of_b)} where index_a < index_b
+        '''
+        sibling_sockets = dict()
+        for (index_a, index_b), (socket_a, socket_b) in sockets_by_pair.items():
+            if index == index_a:
+                sibling_sockets[index_b] = socket_a
+                socket_b.close()
+            elif index == index_b:
+                sibling_sockets[index_a] = socket_b
+                socket_a.close()
+            else:
+                socket_a.close()
+                socket_b.close()
+
+        self.global_data.sibling_index = index
+        io = NetIO(self.transport)
+        io.write_through = self.write_through
+        io.accept_batch_size = self.accept_batch_size
+        if self.use_shared_memory:
+            self.global_data.shared_memory_inbox = SharedMemoryInbox(get_inbox_name(self.own_server_address),
+                                                                     len(self.all_server_list))
+            self.global_data.shared_memory_host_id = get_host_id()
+        try:
+            self.run_io_loop(io, sibling_sockets)
+        finally:
+            for outbox in self.global_data.shared_memory_outboxes.values():
+                outbox.close()
+            self.global_data.shared_memory_outboxes.clear()
+            if self.global_data.shared_memory_inbox is not None:
+                self.global_data.shared_memory_inbox.destroy()
+                self.global_data.shared_memory_inbox = None
+
+    def run_io_loop(self, io, sibling_sockets: dict):
         with net_io(io) as io:
-            worker_for_main_passive_socket = MainWorker(self.global_data)
+            if self.global_data.shared_memory_inbox is not None:
+                SharedMemoryInboxReader(self.global_data, io, self.global_data.shared_memory_inbox).start()
+            if self.global_data.relay_topology is not None:
+                relay_worker = MainWorker(self.global_data)
+                relay_worker.api = io
+                relay_worker.is_connection_from_the_server = True
+                relay_worker.unknown__client_or_server_connection = False
+                self.global_data.relay_worker = relay_worker
+
+            for sibling_index, sibling_socket in sibling_sockets.items():
+                sibling_socket.setblocking(0)
+                worker_obj = MainWorker(self.global_data)
+                worker_obj.is_connection_to_the_sibling = True
+                worker_obj.is_connection_to_the_parent_process = (0 == sibling_index)
+                worker_obj.unknown__client_or_server_connection = False
+                # Siblings run the same code: there is nothing to negotiate
+                worker_obj.input_protocol_version = worker_obj.output_protocol_version = PROTOCOL_VERSION
+                connection_info = ConnectionInfo(worker_obj, ConnectionType.active_accepted,
+                                                 socket_family=socket.AF_UNIX)
+                connection = Connection(('sibling', sibling_index), connection_info, (sibling_socket, None),
+                                        ConnectionState.connected)
+                io.add_connection(connection)
+                self.global_data.sibling_connections.append(connection)
+
+            # Options should be set before bind(): SO_REUSEPORT has no effect on already bound socket
+            socket_options = list()
+            if socket.AF_UNIX != get_socket_family(self.own_server_address):
+                socket_options.append((socket.SOL_SOCKET, socket.SO_REUSEADDR, 1))
+                if self.number_of_processes > 1:
+                    socket_options.append((socket.SOL_SOCKET, socket.SO_REUSEPORT, 1))
+            global_data = self.global_data
+            worker_for_main_passive_socket = MainWorker(global_data)
             main_passive_connection_info = ConnectionInfo(worker_for_main_passive_socket,
                                                           ConnectionType.passive,
                                                           self.own_server_address,
-                                                          backlog=10)
+                                                          backlog=self.backlog,
+                                                          socket_options=socket_options,
+                                                          output_high_watermark=global_data.output_high_watermark,
+                                                          output_low_watermark=global_data.output_low_watermark,
+                                                          output_overflow_policy=global_data.output_overflow_policy)
             io.make_connection(main_passive_connection_info, 'server')
 
 
@@ -309,7 +1385,16 @@ def main():
             index += 1
         server_number = int(input('ENTER SERVER NUMBER:'))
 
-    server = Server(all_server_list[server_number], all_server_list)
+    backlog = DEFAULT_BACKLOG
+    if len(sys.argv) > 2:
+        backlog = int(sys.argv[2])
+
+    number_of_processes = 1
+    if len(sys.argv) > 3:
+        number_of_processes = int(sys.argv[3])
+
+    server = Server(all_server_list[server_number], all_server_list, backlog=backlog,
+                    number_of_processes=number_of_processes)
     server.run()
 
 if __name__ == '__main__':
@@ -0,0 +1,324 @@
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+try:
+    from multiprocessing import shared_memory, resource_tracker
+except ImportError:
+    shared_memory = None  # CPython < 3.8: shared memory transport is not available
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Intra-host message transport for co-located processes.
+Each consumer owns an inbox: shared memory segment with one single-producer ring per producer index. So any number
+of processes may write into the inbox concurrently without locks: each of them writes only to its own ring and moves
+only its own write position, and only the consumer moves read positions.
+Doorbell is a named pipe (FIFO): unlike eventfd it can be opened by the unrelated processes. Producer rings it only
+when its ring was empty, so the busy consumer is not woken for each record.
+
+Ring layout: [write position: 8 bytes, cache line padding][read position: 8 bytes, cache line padding][data]
+Record: [length: 4 bytes][data]. Positions are never wrapped: offset is (position & (capacity - 1)). Records are
+never split: if there is not enough space before the end of the data area, producer skips the tail (and marks it
+by the RING_PADDING_RECORD length, if there is enough space for a record header).
+Positions are published by plain stores, so records are published in order on CPUs with the total store order
+(x86, x86-64). There are no memory barriers in Python, so the doorbell may be lost in rare cases (store of the
+consumer read position and the store of the producer write position may be reordered with the following loads).
+Consumer should poll its inbox periodically anyway.
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+INBOX_HEADER_STRUCT = struct.Struct('<III')  # magic, number of producers, ring capacity
+INBOX_MAGIC = 0x52494e47
+INBOX_HEADER_SIZE = 64
+RING_POSITION_STRUCT = struct.Struct('<Q')
+RING_READ_POSITION_OFFSET = 64
+RING_HEADER_SIZE = 128
+RING_RECORD_HEADER_STRUCT = struct.Struct('<I')  # record length
+RING_PADDING_RECORD = 0xFFFFFFFF
+DEFAULT_RING_CAPACITY = 256 * 1024  # per producer. Should be a power of two
+SHARED_MEMORY_HAS_TRACK_PARAMETER = sys.version_info >= (3, 13)
+
+
+class SharedMemoryIsNotAvailable(Exception):
+    pass
+
+
+def get_host_id()->str:
+    '''
+    :return: identificator of the current host (and of its current boot). Processes may share the memory only if
+        their host ids are equal
+    '''
+    try:
+        with open('/proc/sys/kernel/random/boot_id', 'r') as file:
+            boot_id = file.read().strip()
+    except OSError:
+        boot_id = ''
+    return '{}/{}'.format(socket.gethostname(), boot_id)
+
+
+def get_inbox_name(address)->str:
+    '''
+    :param address: server address
+    :return: name of the shared memory inbox of this server
+    '''
+    return 'chat_inbox_' + ''.join(char if char.isalnum() else '_' for char in str(address))
+
+
+def get_doorbell_path(inbox_name)->str:
+    return os.path.join(tempfile.gettempdir(), inbox_name + '.doorbell')
+
+
+def create_shared_memory(name, size):
+    '''
+    Creates shared memory segment which is not registered in the resource tracker. Segments are removed by their
+    owners explicitly (see SharedMemoryInbox). Resource tracker is shared by all processes forked from the same
+    parent, and its registrations are not reference counted: one process would unregister segments of the others
+    :param name: segment name
+    :param size: segment size
+    :return: SharedMemory object
+    '''
+    if SHARED_MEMORY_HAS_TRACK_PARAMETER:
+        return shared_memory.SharedMemory(name=name, create=True, size=size, track=False)
+    result = shared_memory.SharedMemory(name=name, create=True, size=size)
+    resource_tracker.unregister(result._name, 'shared_memory')
+    return result
+
+
+def attach_shared_memory(name):
+    '''
+    Attaches existing shared memory segment without registering it in the resource tracker (see
+    create_shared_memory())
+    :param name: segment name
+    :return: SharedMemory object
+    '''
+    if SHARED_MEMORY_HAS_TRACK_PARAMETER:
+        return shared_memory.SharedMemory(name=name, track=False)
+    result = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(result._name, 'shared_memory')
+    return result
+
+
+def unlink_shared_memory(shared_memory_obj):
+    if not SHARED_MEMORY_HAS_TRACK_PARAMETER:
+        # SharedMemory.unlink() unregisters segment unconditionally
+        resource_tracker.register(shared_memory_obj._name, 'shared_memory')
+    shared_memory_obj.unlink()
+
+
+class SharedMemoryInbox:
+    '''
+    Consumer side. Creates the inbox and its doorbell (stale ones, left by the crashed process with the same name,
+    are removed).
+    Doorbell fd should be registered in the IO loop (see NetIOUserApi.add_reader()): call drain_doorbell() and
+    get_records() on its readiness.
+    '''
+    def __init__(self, name, number_of_producers, capacity=DEFAULT_RING_CAPACITY):
+        '''
+        :param name: inbox name (see get_inbox_name())
+        :param number_of_producers: producer indexes are in the range(number_of_producers)
+        :param capacity: capacity of each ring. Should be a power of two
+        '''
+        if shared_memory is None:
+            raise SharedMemoryIsNotAvailable()
+        if capacity & (capacity - 1):
+            raise ValueError('Ring capacity should be a power of two')
+
+        self.name = name
+        self.number_of_producers = number_of_producers
+        self.capacity = capacity
+        self.number_of_records = 0
+        self.number_of_doorbells = 0
+
+        try:
+            stale_shared_memory = attach_shared_memory(name)
+            stale_shared_memory.close()
+            unlink_shared_memory(stale_shared_memory)
+        except FileNotFoundError:
+            pass
+        size = INBOX_HEADER_SIZE + number_of_producers * (RING_HEADER_SIZE + capacity)
+        self.shared_memory = create_shared_memory(name, size)
+        self.buffer = self.shared_memory.buf
+        self.buffer[:INBOX_HEADER_SIZE + number_of_producers * RING_HEADER_SIZE] = \
+            bytes(INBOX_HEADER_SIZE + number_of_producers * RING_HEADER_SIZE)
+        self.ring_offsets = [INBOX_HEADER_SIZE + index * (RING_HEADER_SIZE + capacity)
+                             for index in range(number_of_producers)]
+        self.read_positions = [0] * number_of_producers
+        # Header is written last: producers will not attach to the partially initialized inbox
+        INBOX_HEADER_STRUCT.pack_into(self.buffer, 0, INBOX_MAGIC, number_of_producers, capacity)
+
+        self.doorbell_path = get_doorbell_path(name)
+        try:
+            os.unlink(self.doorbell_path)
+        except FileNotFoundError:
+            pass
+        os.mkfifo(self.doorbell_path, 0o600)
+        self.doorbell_fd = os.open(self.doorbell_path, os.O_RDONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+        # Own writer end: FIFO without writers is always readable (EOF) and will spin the level-triggered loop
+        self._doorbell_keepalive_fd = os.open(self.doorbell_path, os.O_WRONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+
+    def drain_doorbell(self):
+        try:
+            while os.read(self.doorbell_fd, 4096):
+                self.number_of_doorbells += 1
+        except BlockingIOError:
+            pass
+
+    def get_records(self):
+        '''
+        Generator. Yields all published records. Records are memoryviews of the shared memory: they are valid only
+        until the next item will be requested (space will be reused by the producer after that)
+        :return: (producer_index, memoryview) tuples
+        '''
+        buffer = self.buffer
+        capacity = self.capacity
+        mask = capacity - 1
+        record_header_size = RING_RECORD_HEADER_STRUCT.size
+        there_are_new_records = True
+        while there_are_new_records:
+            there_are_new_records = False
+            for producer_index, ring_offset in enumerate(self.ring_offsets):
+                write_position = RING_POSITION_STRUCT.unpack_from(buffer, ring_offset)[0]
+                position = self.read_positions[producer_index]
+                if position == write_position:
+                    continue
+
+                there_are_new_records = True
+                data_offset = ring_offset + RING_HEADER_SIZE
+                while position < write_position:
+                    offset = position & mask
+                    tail = capacity - offset
+                    if tail < record_header_size:
+                        position += tail
+                        continue
+                    length = RING_RECORD_HEADER_STRUCT.unpack_from(buffer, data_offset + offset)[0]
+                    if RING_PADDING_RECORD == length:
+                        position += tail
+                        continue
+                    start = data_offset + offset + record_header_size
+                    self.number_of_records += 1
+                    yield producer_index, buffer[start:start + length]
+                    position += record_header_size + length
+                    self._set_read_position(producer_index, position)
+                if position != self.read_positions[producer_index]:
+                    # Padding at the end of the ring
+                    self._set_read_position(producer_index, position)
+
+    def _set_read_position(self, producer_index, position):
+        self.read_positions[producer_index] = position
+        RING_POSITION_STRUCT.pack_into(self.buffer, self.ring_offsets[producer_index] + RING_READ_POSITION_OFFSET,
+                                       position)
+
+    def destroy(self):
+        os.close(self.doorbell_fd)
+        os.close(self._doorbell_keepalive_fd)
+        try:
+            os.unlink(self.doorbell_path)
+        except FileNotFoundError:
+            pass
+        self.buffer = None
+        try:
+            self.shared_memory.close()
+        except BufferError:
+            pass  # some record is still referenced: memory will be unmapped by the garbage collector
+        try:
+            unlink_shared_memory(self.shared_memory)
+        except FileNotFoundError:
+            pass
+
+
+class SharedMemoryOutbox:
+    '''
+    Producer side: writes records into the own ring of the other process inbox.
+    Raises FileNotFoundError (or other OSError) if there is no such inbox or if its owner is not running.
+    '''
+    def __init__(self, inbox_name, producer_index):
+        '''
+        :param inbox_name: inbox name (see get_inbox_name())
+        :param producer_index: index of this producer. Only one process at a time should use each index
+        '''
+        if shared_memory is None:
+            raise SharedMemoryIsNotAvailable()
+
+        self.inbox_name = inbox_name
+        self.number_of_records = 0
+        self.number_of_rejected_records = 0
+        self.number_of_doorbells = 0
+
+        doorbell_path = get_doorbell_path(inbox_name)
+        if not stat.S_ISFIFO(os.stat(doorbell_path).st_mode):
+            raise FileNotFoundError(doorbell_path)
+        # ENXIO if there is no consumer
+        self.doorbell_fd = os.open(doorbell_path, os.O_WRONLY | os.O_NONBLOCK | os.O_CLOEXEC)
+        try:
+            self.shared_memory = attach_shared_memory(inbox_name)
+            self.buffer = self.shared_memory.buf
+            magic, number_of_producers, capacity = INBOX_HEADER_STRUCT.unpack_from(self.buffer, 0)
+            if (INBOX_MAGIC != magic) or (producer_index >= number_of_producers):
+                raise ValueError('Wrong inbox {}'.format(inbox_name))
+        except:
+            os.close(self.doorbell_fd)
+            raise
+        self.capacity = capacity
+        self.ring_offset = INBOX_HEADER_SIZE + producer_index * (RING_HEADER_SIZE + capacity)
+        self.data_offset = self.ring_offset + RING_HEADER_SIZE
+        self.write_position = RING_POSITION_STRUCT.unpack_from(self.buffer, self.ring_offset)[0]
+
+    def put(self, data)->bool:
+        '''
+        :param data: bytes-like object
+        :return: False if there is not enough free space in the ring (data should be sent by some other way)
+        '''
+        capacity = self.capacity
+        record_header_size = RING_RECORD_HEADER_STRUCT.size
+        size = record_header_size + len(data)
+        write_position = self.write_position
+        read_position = RING_POSITION_STRUCT.unpack_from(self.buffer, self.ring_offset + RING_READ_POSITION_OFFSET)[0]
+        offset = write_position & (capacity - 1)
+        tail = capacity - offset
+        padding = tail if tail < size else 0
+        if (write_position + padding + size) - read_position > capacity:
+            self.number_of_rejected_records += 1
+            return False
+
+        new_write_position = write_position + padding
+        if padding:
+            if tail >= record_header_size:
+                RING_RECORD_HEADER_STRUCT.pack_into(self.buffer, self.data_offset + offset, RING_PADDING_RECORD)
+            offset = 0
+        start = self.data_offset + offset
+        RING_RECORD_HEADER_STRUCT.pack_into(self.buffer, start, len(data))
+        self.buffer[start + record_header_size:start + size] = data
+        new_write_position += size
+        RING_POSITION_STRUCT.pack_into(self.buffer, self.ring_offset, new_write_position)
+        self.write_position = new_write_position
+        self.number_of_records += 1
+
+        # Read position should be loaded again after the publication of the record: consumer could read everything
+        # and fall asleep while this record was written
+        read_position = RING_POSITION_STRUCT.unpack_from(self.buffer, self.ring_offset + RING_READ_POSITION_OFFSET)[0]
+        if read_position == write_position:
+            # Consumer has read everything before this record: it may be sleeping
+            self.ring_doorbell()
+        return True
+
+    def ring_doorbell(self):
+        try:
+            os.write(self.doorbell_fd, b'\0')
+            self.number_of_doorbells += 1
+        except (BlockingIOError, BrokenPipeError):
+            pass  # already signaled or consumer is gone (connection loss will be detected by TCP)
+
+    def close(self):
+        os.close(self.doorbell_fd)
+        self.buffer = None
+        try:
+            self.shared_memory.close()
+        except BufferError:
+            pass  # some record is still referenced: memory will be unmapped by the garbage collector
@@ -0,0 +1,208 @@
+import time
+import zlib
+try:
+    import lz4.block as lz4_block
+except ImportError:
+    lz4_block = None  # python-lz4 is not installed: only zlib is available
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Streaming compression of the inter-server links. Compressor turns each portion of the outgoing stream (one batch of
+framed messages) into a self-delimited chunk, which can be decompressed as soon as it is received: zlib chunks end
+with the sync flush and LZ4 chunks are independent blocks. Both compressors keep the context between chunks (zlib
+window and LZ4 dictionary of the previous data), so repeating words of the chat lines are compressed across chunks.
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+ZLIB_COMPRESSION_LEVEL = 1
+LZ4_DICTIONARY_SIZE = 64 * 1024  # LZ4 can not reference data farther than 64 KB back
+
+
+class CompressionStats:
+    '''
+    Counters of the compressors and decompressors (may be shared by all of them)
+    '''
+    def __init__(self):
+        self.uncompressed_bytes = 0
+        self.compressed_bytes = 0
+        self.compression_time = 0.0  # CPU time, seconds
+        self.decompressed_bytes = 0
+        self.decompression_time = 0.0
+
+    def get_compression_ratio(self):
+        '''
+        :return: uncompressed size / compressed size
+        '''
+        if not self.compressed_bytes:
+            return None
+        return self.uncompressed_bytes / self.compressed_bytes
+
+    def get_compression_time_per_mb(self):
+        '''
+        :return: CPU time (seconds) per each MB of the uncompressed data
+        '''
+        if not self.uncompressed_bytes:
+            return None
+        return self.compression_time * 1024 * 1024 / self.uncompressed_bytes
+
+    def get_decompression_time_per_mb(self):
+        '''
+        :return: CPU time (seconds) per each MB of the decompressed data
+        '''
+        if not self.decompressed_bytes:
+            return None
+        return self.decompression_time * 1024 * 1024 / self.decompressed_bytes
+
+
+class StreamCompressorBase:
+    name = None
+
+    def __init__(self, stats: CompressionStats=None):
+        self.stats = stats or CompressionStats()
+
+    def compress(self, data)->bytes:
+        '''
+        :param data: next portion of the stream
+        :return: chunk which can be decompressed right away by the peer's decompressor
+        '''
+        start_time = time.process_time()
+        chunk = self._compress(data)
+        stats = self.stats
+        stats.compression_time += time.process_time() - start_time
+        stats.uncompressed_bytes += len(data)
+        stats.compressed_bytes += len(chunk)
+        return chunk
+
+    def _compress(self, data)->bytes:
+        raise NotImplementedError()
+
+
+class StreamDecompressorBase:
+    name = None
+
+    def __init__(self, stats: CompressionStats=None):
+        self.stats = stats or CompressionStats()
+
+    def decompress(self, chunk)->bytes:
+        '''
+        :param chunk: chunk made by the compress() of the peer's compressor
+        :return: decompressed portion of the stream
+        '''
+        start_time = time.process_time()
+        data = self._decompress(chunk)
+        stats = self.stats
+        stats.decompression_time += time.process_time() - start_time
+        stats.decompressed_bytes += len(data)
+        return data
+
+    def _decompress(self, chunk)->bytes:
+        raise NotImplementedError()
+
+
+class StreamCompressorZlib(StreamCompressorBase):
+    name = 'zlib'
+
+    def __init__(self, stats: CompressionStats=None, level=ZLIB_COMPRESSION_LEVEL):
+        super().__init__(stats)
+        self.compressor = zlib.compressobj(level)
+
+    def _compress(self, data)->bytes:
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class StreamDecompressorZlib(StreamDecompressorBase):
+    name = 'zlib'
+
+    def __init__(self, stats: CompressionStats=None):
+        super().__init__(stats)
+        self.decompressor = zlib.decompressobj()
+
+    def _decompress(self, chunk)->bytes:
+        return self.decompressor.decompress(chunk)
+
+
+class LZ4Dictionary:
+    '''
+    Tail of the stream data for the LZ4 block (de)compression. It is trimmed rarely (when it is twice as big as
+    needed): small chunks should not copy the whole dictionary each time
+    '''
+    def __init__(self):
+        self.data = bytearray()
+
+    def get_view(self)->memoryview:
+        '''
+        :return: memoryview of the last LZ4_DICTIONARY_SIZE bytes. Should be released before the next add() call
+        '''
+        return memoryview(self.data)[-LZ4_DICTIONARY_SIZE:]
+
+    def add(self, data):
+        self.data += data
+        if len(self.data) > 2 * LZ4_DICTIONARY_SIZE:
+            del self.data[:-LZ4_DICTIONARY_SIZE]
+
+
+class StreamCompressorLZ4(StreamCompressorBase):
+    '''
+    Each chunk is the LZ4 block, compressed with the tail of the previous data as a dictionary (python-lz4 frame
+    decompressor can not return the data of the incomplete frame, so the frame API can not be used for the stream)
+    '''
+    name = 'lz4'
+
+    def __init__(self, stats: CompressionStats=None):
+        super().__init__(stats)
+        self.dictionary = LZ4Dictionary()
+
+    def _compress(self, data)->bytes:
+        dictionary_view = self.dictionary.get_view()
+        try:
+            chunk = lz4_block.compress(data, dict=dictionary_view)
+        finally:
+            dictionary_view.release()
+        self.dictionary.add(data)
+        return chunk
+
+
+class StreamDecompressorLZ4(StreamDecompressorBase):
+    name = 'lz4'
+
+    def __init__(self, stats: CompressionStats=None):
+        super().__init__(stats)
+        self.dictionary = LZ4Dictionary()
+
+    def _decompress(self, chunk)->bytes:
+        dictionary_view = self.dictionary.get_view()
+        try:
+            data = lz4_block.decompress(chunk, dict=dictionary_view)
+        finally:
+            dictionary_view.release()
+        self.dictionary.add(data)
+        return data
+
+
+STREAM_COMPRESSIONS = dict()  # name -> (compressor class, decompressor class). In order of preference
+if lz4_block is not None:
+    STREAM_COMPRESSIONS[StreamCompressorLZ4.name] = (StreamCompressorLZ4, StreamDecompressorLZ4)
+STREAM_COMPRESSIONS[StreamCompressorZlib.name] = (StreamCompressorZlib, StreamDecompressorZlib)
+
+
+def get_supported_compressions()->list:
+    '''
+    :return: names of the available compressions in order of preference
+    '''
+    return list(STREAM_COMPRESSIONS)
+
+
+def choose_compression(peer_compressions)->str:
+    '''
+    :param peer_compressions: names of the compressions supported by the peer
+    :return: most preferable compression supported by both sides; None if there is no such compression
+    '''
+    for name in STREAM_COMPRESSIONS:
+        if name in peer_compressions:
+            return name
+    return None
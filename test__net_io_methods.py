@@ -0,0 +1,205 @@
+from net_io__linux import *
+from net_io_method__epoll_lt import *
+from net_io_method__epoll_et import *
+import os
+import socket
+import tempfile
+import time
+import unittest
+
+
+"""
+Module Docstring
+Docstrings: http://www.python.org/dev/peps/pep-0257/
+
+Loop-level tests of the IOMethods: real sockets, NetIO loop iterations are made by the test itself.
+Usage: "python -m unittest test__net_io_methods" (or pytest)
+"""
+
+__author__ = 'ButenkoMS <gtalk@butenkoms.space>'
+
+
+LOOP_TIMEOUT = 5  # seconds
+POLL_TIMEOUT = 0.01
+BIG_DATA_SIZE = 16 * 1024 * 1024  # bigger than the socket buffers: there will be EAGAIN
+
+
+class WriterOnConnect(WorkerBase):
+    '''
+    Queues the data in its own on_connect(); collects the data it gets
+    '''
+    def __init__(self, data: bytes):
+        super().__init__()
+        self.data = data
+        self.received = b''
+        self.is_connection_lost = False
+
+    def on_connect(self):
+        self.connection.add_must_be_written_data(self.data)
+
+    def on_read(self):
+        read_data = self.connection.read_data
+        data = read_data.get_data()
+        self.received += bytes(data)
+        read_data.consume(len(data))
+
+    def on_connection_lost(self):
+        self.is_connection_lost = True
+
+    def __copy__(self):
+        return type(self)(self.data)
+
+
+class IOMethodTestsMixin:
+    io_method = None
+
+    def setUp(self):
+        self.io = NetIO(self.io_method)
+        self.peers = list()
+
+    def tearDown(self):
+        for peer in self.peers:
+            peer.close()
+        self.io.destroy()
+
+    def run_loop_until(self, condition, action=None):
+        '''
+        Makes loop iterations until condition() will be True
+        :param condition: callable
+        :param action: callable, is called after each iteration
+        :return:
+        '''
+        deadline = time.monotonic() + LOOP_TIMEOUT
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail('Loop timeout')
+            self.io.method.loop_iteration(POLL_TIMEOUT)
+            if action is not None:
+                action()
+
+    def make_listening_peer(self)->socket.socket:
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        listener.setblocking(False)
+        self.peers.append(listener)
+        return listener
+
+    def make_connected_worker(self, data)->tuple:
+        '''
+        :return: tuple of (worker of the active connected connection, accepted peer socket)
+        '''
+        listener = self.make_listening_peer()
+        worker = WriterOnConnect(data)
+        self.io.make_connection(ConnectionInfo(worker, ConnectionType.active_connected, listener.getsockname()))
+        accepted = list()
+
+        def accept():
+            try:
+                peer, address = listener.accept()
+            except BlockingIOError:
+                return
+            peer.setblocking(False)
+            self.peers.append(peer)
+            accepted.append(peer)
+
+        self.run_loop_until(lambda: accepted and (ConnectionState.connected == worker.connection.connection_state),
+                            accept)
+        return worker, accepted[0]
+
+    def receive(self, peer: socket.socket, size)->bytes:
+        received = bytearray()
+
+        def read():
+            try:
+                while True:
+                    data = peer.recv(1024 * 1024)
+                    if not data:
+                        break
+                    received.extend(data)
+            except BlockingIOError:
+                pass
+
+        self.run_loop_until(lambda: len(received) >= size, read)
+        return bytes(received)
+
+    def test_write_on_connect__active_connected(self):
+        worker, peer = self.make_connected_worker(b'hello')
+        self.assertEqual(b'hello', self.receive(peer, len(b'hello')))
+
+    def test_write_on_connect__active_accepted(self):
+        listener = self.io.make_connection(ConnectionInfo(WriterOnConnect(b'hello'), ConnectionType.passive,
+                                                          ('127.0.0.1', 0), backlog=1))
+        peer = socket.create_connection(listener.conn.getsockname())
+        peer.setblocking(False)
+        self.peers.append(peer)
+        self.assertEqual(b'hello', self.receive(peer, len(b'hello')))
+
+    def test_big_write_on_connect(self):
+        # Output is sent by parts: each EAGAIN needs the EPOLLOUT to be armed (re-armed by the edge-triggered method)
+        data = bytes(range(256)) * (BIG_DATA_SIZE // 256)
+        worker, peer = self.make_connected_worker(data)
+        self.assertEqual(data, self.receive(peer, len(data)))
+        self.run_loop_until(lambda: not (self.io.method.get__need_write(worker.connection.conn) or
+                                         self.io.method.pending_masks))
+        self.assertEqual(self.io_method.base_event_mask,
+                         self.io.method.registered_masks[worker.connection.conn.fileno()])
+
+    def test_writes_after_connect(self):
+        worker, peer = self.make_connected_worker(b'')
+        received = b''
+        for index in range(3):
+            # Write interest is armed each time: after the previous write was completed
+            worker.connection.add_must_be_written_data(b'line %d;' % index)
+            self.io.check_is_connection_need_to_sent_data(worker.connection)
+            received += self.receive(peer, len(b'line 0;'))
+        self.assertEqual(b'line 0;line 1;line 2;', received)
+
+    def test_big_read_and_eof(self):
+        # Whole data is in the socket before the first read: edge-triggered method should drain it until EAGAIN
+        worker, peer = self.make_connected_worker(b'')
+        data = b'x' * (1024 * 1024)
+        peer.setblocking(True)
+        peer.sendall(data)
+        peer.close()
+        self.peers.remove(peer)
+        self.run_loop_until(lambda: worker.is_connection_lost)
+        self.assertEqual(data, worker.received)
+
+    def test_need_write_mask_cache(self):
+        worker, peer = self.make_connected_worker(b'')
+        method = self.io.method
+        conn = worker.connection.conn
+        self.run_loop_until(lambda: not (method.get__need_write(conn) or method.pending_masks))
+        avoided_epoll_ctl_calls = self.io.stats.avoided_epoll_ctl_calls
+        epoll_ctl_calls = self.io.stats.epoll_ctl_calls
+        method.set__need_write(conn, True)
+        method.set__need_write(conn, True)
+        method.set__need_write(conn, False)
+        self.assertEqual(avoided_epoll_ctl_calls + 1, self.io.stats.avoided_epoll_ctl_calls)
+        self.assertFalse(method.get__need_write(conn))
+        # Interest was changed and changed back during the same iteration: there is no modify() call
+        method.loop_iteration(0)
+        self.assertEqual(epoll_ctl_calls, self.io.stats.epoll_ctl_calls)
+
+    def test_connect_failed_right_away(self):
+        # AF_UNIX connect() fails synchronously: it should be processed as an asynchronous connection failure
+        with tempfile.TemporaryDirectory() as directory:
+            worker = WriterOnConnect(b'hello')
+            self.io.make_connection(ConnectionInfo(worker, ConnectionType.active_connected,
+                                                   os.path.join(directory, 'missing.sock')))
+            self.run_loop_until(lambda: worker.is_connection_lost)
+            self.assertEqual(ConnectionState.disconnected, worker.connection.connection_state)
+            self.assertFalse(self.io.all_connections)
+
+
+class TestIOMethodEpollLT(IOMethodTestsMixin, unittest.TestCase):
+    io_method = IOMethodEpollLT
+
+
+class TestIOMethodEpollET(IOMethodTestsMixin, unittest.TestCase):
+    io_method = IOMethodEpollET
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,7 @@
+from transport_protocol_constants import *
+import functools
+import struct
+
 """
 Module Docstring
 Docstrings: http://www.python.org/dev/peps/pep-0257/
@@ -7,6 +11,7 @@ __author__ = 'ButenkoMS <gtalk@butenkoms.space>'
 
 
 MESSAGE_SIZE_LEN = 4
+MESSAGE_SIZE_STRUCT = struct.Struct('<I')
 
 
 class ThereIsNoMessages(Exception):
@@ -51,3 +56,452 @@ def pack_message(message: bytes)->bytes:
     '''
     packed_message = len(message).to_bytes(MESSAGE_SIZE_LEN, 'little') + message
     return packed_message
+
+
+class FrameDecoder:
+    '''
+    Incremental (streaming) decoder of the framed messages (see pack_message()).
+    Feed it with the received data portions - it will yield all complete messages in a single pass. Messages are
+    zero-copy memoryview slices of the fed data. Only an incomplete frame at the end of the fed data is copied (to
+    the internal buffer) to be completed by the next feed() calls.
+    Caution: yielded memoryviews are valid until the fed data will be changed by it's owner (for example until the
+    next recv into the connection's InputBuffer) - so use or copy them right away.
+    '''
+    def __init__(self):
+        self._pending = bytearray()  # incomplete frame (including its size header)
+
+    def __len__(self):
+        '''
+        :return: number of bytes of the incomplete frame, waiting for it's remaining data
+        '''
+        return len(self._pending)
+
+    def feed(self, data):
+        '''
+        Generator. Should be iterated until the end: tail of the data is saved after the last complete message only.
+        :param data: bytes-like object (bytes, bytearray, memoryview)
+        :return: complete messages (memoryview objects)
+        '''
+        data = memoryview(data)
+        if 'B' != data.format:
+            data = data.cast('B')
+        data_size = data.nbytes
+        offset = 0
+
+        pending = self._pending
+        if pending:
+            # complete the frame that was started by the previous data portions
+            if len(pending) < MESSAGE_SIZE_LEN:
+                offset = min(MESSAGE_SIZE_LEN - len(pending), data_size)
+                pending += data[:offset]
+                if len(pending) < MESSAGE_SIZE_LEN:
+                    return
+            frame_size = MESSAGE_SIZE_LEN + MESSAGE_SIZE_STRUCT.unpack_from(pending)[0]
+            number_of_bytes_to_take = min(frame_size - len(pending), data_size - offset)
+            pending += data[offset:offset + number_of_bytes_to_take]
+            offset += number_of_bytes_to_take
+            if len(pending) < frame_size:
+                return
+            self._pending = bytearray()  # new object: the old one is exported by the yielded memoryview
+            yield memoryview(pending)[MESSAGE_SIZE_LEN:]
+
+        unpack_size = MESSAGE_SIZE_STRUCT.unpack_from
+        while data_size - offset >= MESSAGE_SIZE_LEN:
+            message_begin = offset + MESSAGE_SIZE_LEN
+            message_end = message_begin + unpack_size(data, offset)[0]
+            if message_end > data_size:
+                break
+            yield data[message_begin:message_end]
+            offset = message_end
+
+        if offset < data_size:
+            self._pending = bytearray(data[offset:])
+
+
+# Binary RPC codec.
+# Each message is a one-byte RPCName tag followed by the fixed-layout fields of this RPC (see RPC_FIELDS): integers
+#   are packed by the precompiled struct.Struct objects, strings are length-prefixed UTF-8.
+# Peers negotiate the protocol version on connect (see choose_protocol_version()). Until then both sides use the
+#   MIN_PROTOCOL_VERSION. The protocol_version RPC itself has the same layout in all versions.
+PROTOCOL_VERSION = 1
+MIN_PROTOCOL_VERSION = 1
+
+# Address kinds
+ADDRESS_KIND__HOST_PORT = 0  # ('host', port)
+ADDRESS_KIND__PATH = 1  # AF_UNIX path string
+ADDRESS_KIND__BYTES_PATH = 2  # AF_UNIX path bytes (abstract namespace for example)
+ADDRESS_KIND__IPV6 = 3  # ('host', port, flowinfo, scope_id)
+
+STRING_LENGTH_STRUCT = struct.Struct('<I')
+ADDRESS_STRUCT = struct.Struct('<BHI')  # kind, port, length of host or path
+ADDRESS_IPV6_STRUCT = struct.Struct('<II')  # flowinfo, scope_id
+CLIENTS_STRUCT = struct.Struct('<i')
+
+PROTOCOL_VERSION_STRUCT = struct.Struct('<BBB')  # RPC name, min version, max version
+
+RPC_STRUCTS_V1 = {
+    # RPC name, has inbox, number of compressions; address; [host id, inbox name]; compression names
+    RPCName.server_arrived: struct.Struct('<BBB'),
+    RPCName.number_of_clients_changed: struct.Struct('<Bi'),  # RPC name, clients
+    RPCName.broadcast_string: struct.Struct('<BI'),  # RPC name, string length; string
+    RPCName.print_string: struct.Struct('<BI'),
+    RPCName.client_string: struct.Struct('<BI'),
+    RPCName.give_me_best_server: struct.Struct('<B'),  # RPC name
+    RPCName.best_server: struct.Struct('<B'),  # RPC name; address
+    RPCName.give_me_clients_per_server: struct.Struct('<B'),
+    RPCName.clients_per_server: struct.Struct('<BI'),  # RPC name, number of servers; (address, clients) pairs
+    RPCName.client_arrived: struct.Struct('<B'),
+    RPCName.sibling_string: struct.Struct('<BI'),
+    RPCName.sibling_number_of_clients: struct.Struct('<Bi'),
+    RPCName.protocol_version: PROTOCOL_VERSION_STRUCT,
+    RPCName.broadcast_batch: struct.Struct('<BI'),  # RPC name, number of strings; length-prefixed strings
+    RPCName.stream_compression: struct.Struct('<BI'),  # RPC name, string length; compression name
+    RPCName.compressed: struct.Struct('<B'),  # RPC name; compressed data up to the end of the message
+    RPCName.join_channel: struct.Struct('<BI'),  # RPC name, string length; channel
+    RPCName.leave_channel: struct.Struct('<BI'),
+    RPCName.channel_string: struct.Struct('<BI'),  # RPC name, channel length; channel, string up to the end
+    RPCName.print_channel_string: struct.Struct('<BI'),
+    RPCName.broadcast_channel_string: struct.Struct('<BI'),
+    RPCName.sibling_channel_string: struct.Struct('<BI'),
+    RPCName.active_channels: struct.Struct('<BI'),  # RPC name, number of channels; length-prefixed channels
+    RPCName.sibling_channels: struct.Struct('<BI'),
+    RPCName.versioned_number_of_clients: struct.Struct('<Biq'),  # RPC name, clients, version
+    # RPC name, origin server index, sibling index, sequence, stage; relayed message up to the end
+    RPCName.relay: struct.Struct('<BHHqB'),
+    RPCName.client_bootstrap: struct.Struct('<BB'),  # RPC name, number of redirects
+    RPCName.client_accepted: struct.Struct('<B'),
+}
+
+
+class WrongRPCMessage(Exception):
+    pass
+
+
+def choose_protocol_version(min_version: int, max_version: int):
+    '''
+    :param min_version: min protocol version supported by the peer
+    :param max_version: max protocol version supported by the peer
+    :return: the highest version supported by both sides; None if there is no such version
+    '''
+    version = min(max_version, PROTOCOL_VERSION)
+    if version < max(min_version, MIN_PROTOCOL_VERSION):
+        return None
+    return version
+
+
+def pack_string(string: str)->bytes:
+    bin_string = string.encode('utf-8')
+    return STRING_LENGTH_STRUCT.pack(len(bin_string)) + bin_string
+
+
+def unpack_string(data, offset)->tuple:
+    '''
+    :param data: memoryview of the message
+    :param offset: offset of the length-prefixed string
+    :return: tuple of (string, offset_after_the_string)
+    '''
+    begin = offset + STRING_LENGTH_STRUCT.size
+    end = begin + STRING_LENGTH_STRUCT.unpack_from(data, offset)[0]
+    if end > len(data):
+        raise WrongRPCMessage('String is out of the message bounds')
+    return data[begin:end].tobytes().decode(), end
+
+
+@functools.lru_cache(maxsize=1024)
+def pack_address(address)->bytes:
+    '''
+    Cached: cluster has a small fixed set of server addresses
+    :param address: server address (see get_socket_family())
+    :return: packed address
+    '''
+    if isinstance(address, str):
+        bin_host = address.encode('utf-8')
+        return ADDRESS_STRUCT.pack(ADDRESS_KIND__PATH, 0, len(bin_host)) + bin_host
+    if isinstance(address, bytes):
+        return ADDRESS_STRUCT.pack(ADDRESS_KIND__BYTES_PATH, 0, len(address)) + address
+    bin_host = address[0].encode('utf-8')
+    if 4 == len(address):
+        return ADDRESS_STRUCT.pack(ADDRESS_KIND__IPV6, address[1], len(bin_host)) + bin_host + \
+            ADDRESS_IPV6_STRUCT.pack(address[2], address[3])
+    return ADDRESS_STRUCT.pack(ADDRESS_KIND__HOST_PORT, address[1], len(bin_host)) + bin_host
+
+
+def unpack_address(data, offset)->tuple:
+    '''
+    :param data: memoryview of the message
+    :param offset: offset of the packed address
+    :return: tuple of (address, offset_after_the_address)
+    '''
+    kind, port, length = ADDRESS_STRUCT.unpack_from(data, offset)
+    begin = offset + ADDRESS_STRUCT.size
+    end = begin + length
+    if end > len(data):
+        raise WrongRPCMessage('Address is out of the message bounds')
+    if ADDRESS_KIND__HOST_PORT == kind:
+        return (data[begin:end].tobytes().decode(), port), end
+    if ADDRESS_KIND__PATH == kind:
+        return data[begin:end].tobytes().decode(), end
+    if ADDRESS_KIND__BYTES_PATH == kind:
+        return bytes(data[begin:end]), end
+    if ADDRESS_KIND__IPV6 == kind:
+        flowinfo, scope_id = ADDRESS_IPV6_STRUCT.unpack_from(data, end)
+        host = data[begin:end].tobytes().decode()
+        return (host, port, flowinfo, scope_id), end + ADDRESS_IPV6_STRUCT.size
+    raise WrongRPCMessage('Unknown address kind: {}'.format(kind))
+
+
+class RPCCodecV1:
+    '''
+    Encoders and decoders of the version 1 RPC messages. Decoders take the whole message (memoryview) and return the
+    tuple of RPC fields (see RPC_FIELDS)
+    '''
+    version = 1
+
+    def __init__(self):
+        self.structs = RPC_STRUCTS_V1
+        self.encoders = dict()
+        self.decoders = dict()
+        for rpc_name in (RPCName.give_me_best_server, RPCName.give_me_clients_per_server, RPCName.client_arrived,
+                         RPCName.client_accepted):
+            self.encoders[rpc_name] = self.make_encoder__no_fields(rpc_name)
+            self.decoders[rpc_name] = self.decode__no_fields
+        for rpc_name in (RPCName.broadcast_string, RPCName.print_string, RPCName.client_string,
+                         RPCName.sibling_string, RPCName.stream_compression, RPCName.join_channel,
+                         RPCName.leave_channel):
+            self.encoders[rpc_name] = self.make_encoder__string(rpc_name)
+            self.decoders[rpc_name] = self.make_decoder__string(rpc_name)
+        for rpc_name in (RPCName.channel_string, RPCName.print_channel_string, RPCName.broadcast_channel_string,
+                         RPCName.sibling_channel_string):
+            self.encoders[rpc_name] = self.make_encoder__channel_string(rpc_name)
+            self.decoders[rpc_name] = self.make_decoder__channel_string(rpc_name)
+        for rpc_name in (RPCName.broadcast_batch, RPCName.active_channels, RPCName.sibling_channels):
+            self.encoders[rpc_name] = self.make_encoder__strings(rpc_name)
+            self.decoders[rpc_name] = self.make_decoder__strings(rpc_name)
+        for rpc_name in (RPCName.number_of_clients_changed, RPCName.sibling_number_of_clients,
+                         RPCName.client_bootstrap):
+            self.encoders[rpc_name] = self.make_encoder__clients(rpc_name)
+            self.decoders[rpc_name] = self.make_decoder__clients(rpc_name)
+        self.encoders[RPCName.versioned_number_of_clients] = \
+            self.make_encoder__clients(RPCName.versioned_number_of_clients)
+        self.decoders[RPCName.versioned_number_of_clients] = \
+            self.make_decoder__clients(RPCName.versioned_number_of_clients)
+        self.encoders[RPCName.server_arrived] = self.encode__server_arrived
+        self.decoders[RPCName.server_arrived] = self.decode__server_arrived
+        self.encoders[RPCName.best_server] = self.encode__best_server
+        self.decoders[RPCName.best_server] = self.decode__best_server
+        self.encoders[RPCName.clients_per_server] = self.encode__clients_per_server
+        self.decoders[RPCName.clients_per_server] = self.decode__clients_per_server
+        self.encoders[RPCName.compressed] = self.encode__compressed
+        self.decoders[RPCName.compressed] = self.decode__compressed
+        self.encoders[RPCName.relay] = self.encode__relay
+        self.decoders[RPCName.relay] = self.decode__relay
+        self.encoders[RPCName.protocol_version] = encode_rpc__protocol_version
+        self.decoders[RPCName.protocol_version] = decode_rpc__protocol_version
+
+    def make_encoder__no_fields(self, rpc_name):
+        bin_message = self.structs[rpc_name].pack(rpc_name)
+
+        def encode():
+            return bin_message
+        return encode
+
+    @staticmethod
+    def decode__no_fields(data):
+        if 1 != len(data):
+            raise WrongRPCMessage('Unexpected data after the RPC name')
+        return tuple()
+
+    def make_encoder__string(self, rpc_name):
+        pack = self.structs[rpc_name].pack
+
+        def encode(string):
+            bin_string = string.encode('utf-8')
+            return pack(rpc_name, len(bin_string)) + bin_string
+        return encode
+
+    def make_decoder__string(self, rpc_name):
+        rpc_struct = self.structs[rpc_name]
+        unpack_from = rpc_struct.unpack_from
+        header_size = rpc_struct.size
+
+        def decode(data):
+            if unpack_from(data)[1] != len(data) - header_size:
+                raise WrongRPCMessage('Wrong string length')
+            return data[header_size:].tobytes().decode(),
+        return decode
+
+    def make_encoder__channel_string(self, rpc_name):
+        pack = self.structs[rpc_name].pack
+
+        def encode(channel, string):
+            bin_channel = channel.encode('utf-8')
+            return pack(rpc_name, len(bin_channel)) + bin_channel + string.encode('utf-8')
+        return encode
+
+    def make_decoder__channel_string(self, rpc_name):
+        rpc_struct = self.structs[rpc_name]
+        unpack_from = rpc_struct.unpack_from
+        header_size = rpc_struct.size
+
+        def decode(data):
+            end = header_size + unpack_from(data)[1]
+            if end > len(data):
+                raise WrongRPCMessage('Channel is out of the message bounds')
+            return data[header_size:end].tobytes().decode(), data[end:].tobytes().decode()
+        return decode
+
+    def make_encoder__clients(self, rpc_name):
+        pack = self.structs[rpc_name].pack
+
+        def encode(*fields):
+            return pack(rpc_name, *fields)
+        return encode
+
+    def make_decoder__clients(self, rpc_name):
+        unpack = self.structs[rpc_name].unpack
+
+        def decode(data):
+            return unpack(data)[1:]
+        return decode
+
+    def encode__server_arrived(self, address, shared_memory_inbox=None, compressions=None):
+        compressions = compressions or tuple()
+        parts = [self.structs[RPCName.server_arrived].pack(RPCName.server_arrived, shared_memory_inbox is not None,
+                                                           len(compressions)),
+                 pack_address(address)]
+        if shared_memory_inbox is not None:
+            host_id, inbox_name = shared_memory_inbox
+            parts.append(pack_string(host_id))
+            parts.append(pack_string(inbox_name))
+        for name in compressions:
+            parts.append(pack_string(name))
+        return b''.join(parts)
+
+    def decode__server_arrived(self, data):
+        rpc_struct = self.structs[RPCName.server_arrived]
+        rpc_name, has_inbox, number_of_compressions = rpc_struct.unpack_from(data)
+        address, offset = unpack_address(data, rpc_struct.size)
+        shared_memory_inbox = None
+        if has_inbox:
+            host_id, offset = unpack_string(data, offset)
+            inbox_name, offset = unpack_string(data, offset)
+            shared_memory_inbox = (host_id, inbox_name)
+        compressions = list()
+        for index in range(number_of_compressions):
+            name, offset = unpack_string(data, offset)
+            compressions.append(name)
+        return address, shared_memory_inbox, compressions
+
+    def encode__best_server(self, address):
+        return self.structs[RPCName.best_server].pack(RPCName.best_server) + pack_address(address)
+
+    def decode__best_server(self, data):
+        address, offset = unpack_address(data, self.structs[RPCName.best_server].size)
+        return address,
+
+    def encode__clients_per_server(self, clients_per_server: dict):
+        parts = [self.structs[RPCName.clients_per_server].pack(RPCName.clients_per_server, len(clients_per_server))]
+        for address, clients in clients_per_server.items():
+            parts.append(pack_address(address))
+            parts.append(CLIENTS_STRUCT.pack(clients))
+        return b''.join(parts)
+
+    def decode__clients_per_server(self, data):
+        rpc_struct = self.structs[RPCName.clients_per_server]
+        number_of_servers = rpc_struct.unpack_from(data)[1]
+        offset = rpc_struct.size
+        clients_per_server = dict()
+        for index in range(number_of_servers):
+            address, offset = unpack_address(data, offset)
+            clients_per_server[address] = CLIENTS_STRUCT.unpack_from(data, offset)[0]
+            offset += CLIENTS_STRUCT.size
+        return clients_per_server,
+
+    def encode__compressed(self, chunk):
+        return self.structs[RPCName.compressed].pack(RPCName.compressed) + chunk
+
+    def decode__compressed(self, data):
+        return data[self.structs[RPCName.compressed].size:],
+
+    def encode__relay(self, origin, sibling, sequence, stage, bin_message):
+        return self.structs[RPCName.relay].pack(RPCName.relay, origin, sibling, sequence, stage) + bin_message
+
+    def decode__relay(self, data):
+        rpc_struct = self.structs[RPCName.relay]
+        return rpc_struct.unpack_from(data)[1:] + (data[rpc_struct.size:],)
+
+    def make_encoder__strings(self, rpc_name):
+        pack = self.structs[rpc_name].pack
+
+        def encode(strings):
+            parts = [pack(rpc_name, len(strings))]
+            pack_length = STRING_LENGTH_STRUCT.pack
+            for string in strings:
+                bin_string = string.encode('utf-8')
+                parts.append(pack_length(len(bin_string)))
+                parts.append(bin_string)
+            return b''.join(parts)
+        return encode
+
+    def make_decoder__strings(self, rpc_name):
+        rpc_struct = self.structs[rpc_name]
+
+        def decode(data):
+            number_of_strings = rpc_struct.unpack_from(data)[1]
+            offset = rpc_struct.size
+            strings = list()
+            for index in range(number_of_strings):
+                string, offset = unpack_string(data, offset)
+                strings.append(string)
+            return strings,
+        return decode
+
+
+def encode_rpc__protocol_version(min_version: int, max_version: int)->bytes:
+    return PROTOCOL_VERSION_STRUCT.pack(RPCName.protocol_version, min_version, max_version)
+
+
+def decode_rpc__protocol_version(data)->tuple:
+    return PROTOCOL_VERSION_STRUCT.unpack(data)[1:]
+
+
+RPC_CODECS = {
+    RPCCodecV1.version: RPCCodecV1(),
+}
+
+RPC_ENCODERS = {version: codec.encoders for version, codec in RPC_CODECS.items()}
+RPC_DECODERS = {version: codec.decoders for version, codec in RPC_CODECS.items()}
+
+
+def encode_rpc(rpc_name, *fields, version=PROTOCOL_VERSION)->bytes:
+    '''
+    Serializes RPC message (without framing: see pack_message())
+    :param rpc_name: one of RPCName values
+    :param fields: RPC fields in the order of RPC_FIELDS[rpc_name]
+    :param version: protocol version
+    :return: serialized message
+    '''
+    return RPC_ENCODERS[version][rpc_name](*fields)
+
+
+def decode_rpc(data, version=PROTOCOL_VERSION)->tuple:
+    '''
+    Deserializes RPC message
+    :param data: serialized message (bytes-like object)
+    :param version: protocol version
+    :return: tuple of (rpc_name, tuple_of_fields). Fields are in the order of RPC_FIELDS[rpc_name]
+    :raise WrongRPCMessage: when the message is broken or its RPC is unknown
+    '''
+    if memoryview is not type(data):
+        data = memoryview(data)
+    try:
+        rpc_name = data[0]
+        decoder = RPC_DECODERS[version][rpc_name]
+    except IndexError as err:
+        raise WrongRPCMessage('Empty message') from err
+    except KeyError as err:
+        raise WrongRPCMessage('Unknown RPC: {}'.format(data[0])) from err
+    try:
+        return rpc_name, decoder(data)
+    except (struct.error, UnicodeDecodeError) as err:
+        raise WrongRPCMessage('Broken {} RPC message: {}'.format(rpc_name, err)) from err
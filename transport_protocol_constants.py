@@ -12,6 +12,21 @@ class FieldName:
     clients = 2
     string = 3
     clients_per_server = 4
+    shared_memory_inbox = 5
+    min_protocol_version = 6
+    max_protocol_version = 7
+    strings = 8
+    compressions = 9
+    compression = 10
+    data = 11
+    channel = 12
+    channels = 13
+    version = 14
+    origin = 15
+    sibling = 16
+    sequence = 17
+    stage = 18
+    number_of_redirects = 19
 
 
 class RPCName:
@@ -25,24 +40,91 @@ class RPCName:
     give_me_clients_per_server = 8
     clients_per_server = 9
     client_arrived = 10
+    sibling_string = 11
+    sibling_number_of_clients = 12
+    protocol_version = 13  # layout of this RPC is the same in all protocol versions (see transport_protocol.py)
+    broadcast_batch = 14  # several broadcast_string messages in one frame
+    stream_compression = 15  # compression chosen by the receiving server (see stream_compression.py)
+    compressed = 16  # chunk of the compressed stream of framed messages
+    join_channel = 17
+    leave_channel = 18
+    channel_string = 19  # chat line for the subscribers of the channel
+    print_channel_string = 20
+    broadcast_channel_string = 21
+    sibling_channel_string = 22
+    active_channels = 23  # all channels with subscribers on the server (cluster node)
+    sibling_channels = 24  # channels with subscribers on the sibling process
+    versioned_number_of_clients = 25  # number_of_clients_changed with the version of the counter
+    relay = 26  # message of the other server, forwarded by the relay topology (see relay_topology.py)
+    client_bootstrap = 27  # client_arrived if the server is not overloaded, otherwise redirect (best_server response)
+    client_accepted = 28  # response to the client_bootstrap: client is counted as arrived
+
+# Positional fields of each RPC, in the order of their encoding by the binary codec (see transport_protocol.py)
+RPC_FIELDS = {
+    RPCName.server_arrived: (FieldName.address, FieldName.shared_memory_inbox, FieldName.compressions),
+    RPCName.number_of_clients_changed: (FieldName.clients,),
+    RPCName.broadcast_string: (FieldName.string,),
+    RPCName.print_string: (FieldName.string,),
+    RPCName.client_string: (FieldName.string,),
+    RPCName.give_me_best_server: (),
+    RPCName.best_server: (FieldName.address,),
+    RPCName.give_me_clients_per_server: (),
+    RPCName.clients_per_server: (FieldName.clients_per_server,),
+    RPCName.client_arrived: (),
+    RPCName.sibling_string: (FieldName.string,),
+    RPCName.sibling_number_of_clients: (FieldName.clients,),
+    RPCName.protocol_version: (FieldName.min_protocol_version, FieldName.max_protocol_version),
+    RPCName.broadcast_batch: (FieldName.strings,),
+    RPCName.stream_compression: (FieldName.compression,),
+    RPCName.compressed: (FieldName.data,),
+    RPCName.join_channel: (FieldName.channel,),
+    RPCName.leave_channel: (FieldName.channel,),
+    RPCName.channel_string: (FieldName.channel, FieldName.string),
+    RPCName.print_channel_string: (FieldName.channel, FieldName.string),
+    RPCName.broadcast_channel_string: (FieldName.channel, FieldName.string),
+    RPCName.sibling_channel_string: (FieldName.channel, FieldName.string),
+    RPCName.active_channels: (FieldName.channels,),
+    RPCName.sibling_channels: (FieldName.channels,),
+    RPCName.versioned_number_of_clients: (FieldName.clients, FieldName.version),
+    RPCName.relay: (FieldName.origin, FieldName.sibling, FieldName.sequence, FieldName.stage, FieldName.data),
+    RPCName.client_bootstrap: (FieldName.number_of_redirects,),
+    RPCName.client_accepted: (),
+}
 
 RPC_REQUESTS_ONLY_FROM_SERVER = {
     RPCName.server_arrived,
     RPCName.number_of_clients_changed,
     RPCName.broadcast_string,
     RPCName.print_string,
+    RPCName.sibling_string,
+    RPCName.broadcast_batch,
+    RPCName.sibling_number_of_clients,
+    RPCName.stream_compression,
+    RPCName.compressed,
+    RPCName.print_channel_string,
+    RPCName.broadcast_channel_string,
+    RPCName.sibling_channel_string,
+    RPCName.active_channels,
+    RPCName.sibling_channels,
+    RPCName.versioned_number_of_clients,
+    RPCName.relay,
 }
 
 RPC_RESPONSES_ONLY_FROM_SERVER = {
     RPCName.best_server,
     RPCName.clients_per_server,
+    RPCName.client_accepted,
 }
 
 RPC_REQUESTS_ONLY_FROM_CLIENT = {
     RPCName.client_string,
     RPCName.give_me_best_server,
     RPCName.give_me_clients_per_server,
-    RPCName.client_arrived
+    RPCName.client_arrived,
+    RPCName.join_channel,
+    RPCName.leave_channel,
+    RPCName.channel_string,
+    RPCName.client_bootstrap,
 }
 
 RPC_RESPONSES_ONLY_FROM_CLIENT = {